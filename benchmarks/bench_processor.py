@@ -0,0 +1,217 @@
+# benchmarks/bench_processor.py
+#
+# 性能基准：生成合成目录，分别计时发现、后缀扫描、模式 A/B 命名、冲突解析与文件移动。
+#
+# 用法示例:
+#   python benchmarks/bench_processor.py --sizes 1000,10000,100000 --output bench.json
+#   python benchmarks/bench_processor.py --cross-dir /dev/shm --compare old.json
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# 允许直接以脚本方式运行 (仓库根目录加入导入路径)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.processor import FileProcessor  # noqa: E402
+from src.utils import NameRegistry, get_available_extensions, get_unique_path  # noqa: E402
+
+# 合成文件只使用少数几种大小，使模式 B "按大小" 产生大量重名冲突
+SYNTHETIC_SIZES = [0, 512, 1024, 2048, 4096, 10 * 1024, 100 * 1024, 1024 * 1024]
+SYNTHETIC_EXTENSIONS = ['.jpg', '.png', '.txt', '.pdf', '.JPG']
+# 旧版 get_unique_path 逐个 exists() 探测为 O(n²)，只在小规模下对比
+LEGACY_PROBE_LIMIT = 2000
+
+# --- 数据生成 ---
+
+def generate_tree(folder: Path, count: int) -> None:
+    """生成 count 个文件；用 truncate 建立稀疏文件，大规模时也无需真正写入数据"""
+    folder.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        ext = SYNTHETIC_EXTENSIONS[i % len(SYNTHETIC_EXTENSIONS)]
+        size = SYNTHETIC_SIZES[(i * 7) % len(SYNTHETIC_SIZES)]
+        with open(folder / f"IMG_{i:07d}{ext}", 'wb') as f:
+            if size:
+                f.truncate(size)
+
+
+def is_cross_device(a: Path, b: Path) -> bool:
+    return os.stat(a).st_dev != os.stat(b).st_dev
+
+# --- 计时 ---
+
+def timed(func: Callable[[], Any], repeat: int) -> float:
+    """返回多次运行中的最短耗时 (秒)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def record(results: List[Dict[str, Any]], bench: str, files: int, seconds: float, **extra: Any) -> None:
+    entry = dict(bench=bench, files=files, seconds=round(seconds, 6),
+                 files_per_sec=round(files / seconds, 1) if seconds > 0 else None, **extra)
+    results.append(entry)
+    label = f"{bench} (workers={extra['workers']})" if 'workers' in extra else bench
+    print(f"  {label:<32} {files:>9} 文件  {seconds:>9.4f}s  {entry['files_per_sec'] or '-':>12} 文件/秒", flush=True)
+
+
+def bench_size(root: Path, count: int, repeat: int, cross_root: Optional[Path],
+               workers_list: List[int], results: List[Dict[str, Any]]) -> None:
+    source = root / f"src_{count}"
+    generate_tree(source, count)
+    output = root / f"out_{count}"
+
+    record(results, 'discovery', count, timed(lambda: FileProcessor(str(source), str(output), []), repeat))
+    record(results, 'discovery_filtered', count,
+           timed(lambda: FileProcessor(str(source), str(output), ['.jpg']), repeat))
+    record(results, 'get_available_extensions', count, timed(lambda: get_available_extensions(str(source)), repeat))
+
+    processor = FileProcessor(str(source), str(output), [])
+    record(results, 'plan_mode_a', count, timed(
+        lambda: processor.plan('a', {'target': 'img', 'replace': 'PIC', 'scope': '1'}), repeat))
+    record(results, 'plan_mode_b_sequence', count, timed(
+        lambda: processor.plan('b', {'type': 'sequence', 'start_num': 1}), repeat))
+    record(results, 'plan_mode_b_size', count, timed(lambda: processor.plan('b', {'type': 'size'}), repeat))
+
+    # 冲突解析：全部文件争用 len(SYNTHETIC_SIZES) 个名字
+    names = [f"{i % len(SYNTHETIC_SIZES)}KB.jpg" for i in range(count)]
+
+    def resolve_with_registry():
+        registry = NameRegistry(output)
+        for name in names:
+            registry.reserve(name)
+
+    record(results, 'conflict_registry', count, timed(resolve_with_registry, repeat))
+
+    if count <= LEGACY_PROBE_LIMIT:
+        legacy_dir = root / f"legacy_{count}"
+
+        def resolve_with_probing():
+            # 与旧版行为一致：每分配一个名字就在磁盘上占位
+            shutil.rmtree(legacy_dir, ignore_errors=True)
+            legacy_dir.mkdir()
+            for name in names:
+                get_unique_path(legacy_dir / name).touch()
+
+        record(results, 'conflict_get_unique_path', count, timed(resolve_with_probing, 1))
+        shutil.rmtree(legacy_dir, ignore_errors=True)
+
+    # 移动：同一文件系统与跨设备，每次运行前重新生成源目录
+    targets = [('same_fs', root)]
+    if cross_root is not None:
+        targets.append(('cross_device' if is_cross_device(root, cross_root) else 'second_dir', cross_root))
+
+    for label, target_root in targets:
+        for workers in workers_list:
+            move_source = root / f"move_src_{count}"
+            move_output = target_root / f"move_out_{count}"
+            elapsed = float('inf')
+            for _ in range(repeat):
+                shutil.rmtree(move_source, ignore_errors=True)
+                shutil.rmtree(move_output, ignore_errors=True)
+                generate_tree(move_source, count)
+                mover = FileProcessor(str(move_source), str(move_output), [])
+                plan = mover.plan('b', {'type': 'size'})
+                start = time.perf_counter()
+                mover.execute(plan, lambda msg: None, workers=workers)
+                elapsed = min(elapsed, time.perf_counter() - start)
+            record(results, f'move_{label}', count, elapsed, workers=workers)
+            shutil.rmtree(move_source, ignore_errors=True)
+            shutil.rmtree(move_output, ignore_errors=True)
+
+    shutil.rmtree(source, ignore_errors=True)
+
+# --- 结果对比 ---
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], baseline_path: str) -> None:
+    """与之前保存的结果逐项对比，比值 > 1 表示变慢"""
+    def key(entry: Dict[str, Any]):
+        return entry['bench'], entry['files'], entry.get('workers')
+
+    old = {key(entry): entry for entry in baseline.get('results', [])}
+    print(f"\n与 {baseline_path} 对比 (当前耗时 / 基线耗时):")
+    for entry in results:
+        previous = old.get(key(entry))
+        if not previous or not previous['seconds']:
+            continue
+        ratio = entry['seconds'] / previous['seconds']
+        flag = "  ⚠️ 变慢" if ratio > 1.10 else ""
+        workers = f"workers={entry['workers']}" if 'workers' in entry else ''
+        print(f"  {entry['bench']:<32} {entry['files']:>9} {workers:<10} {ratio:6.2f}x{flag}")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=Path(__file__).resolve().parent, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="FileProcessor 性能基准")
+    parser.add_argument('--sizes', default='1000,10000', help="逗号分隔的文件数量，例如 1000,10000,100000,1000000")
+    parser.add_argument('--repeat', type=int, default=3, help="每项重复次数 (取最短耗时)")
+    parser.add_argument('--work-dir', help="生成数据的目录 (默认系统临时目录)")
+    parser.add_argument('--cross-dir', help="跨设备移动的目标目录，例如 tmpfs 挂载点 /dev/shm")
+    parser.add_argument('--workers', default='1,4', help="移动基准使用的并发数列表")
+    parser.add_argument('--output', default='bench_results.json', help="结果 JSON 文件")
+    parser.add_argument('--compare', help="与之前的结果 JSON 对比")
+    args = parser.parse_args(argv)
+
+    # 先读取基线，允许 --output 与 --compare 指向同一文件
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    workers_list = [int(w) for w in args.workers.split(',') if w.strip()]
+    results: List[Dict[str, Any]] = []
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        root = Path(tmp)
+        cross_tmp = tempfile.mkdtemp(dir=args.cross_dir) if args.cross_dir else None
+        try:
+            for count in sizes:
+                print(f"\n=== {count} 个文件 ===")
+                bench_size(root, count, args.repeat, Path(cross_tmp) if cross_tmp else None, workers_list, results)
+        finally:
+            if cross_tmp:
+                shutil.rmtree(cross_tmp, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_revision': git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sizes': sizes,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+
+    if baseline is not None:
+        compare(results, baseline, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
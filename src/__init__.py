@@ -1,3 +1,8 @@
 # src/__init__.py
 
-# 此文件为空
\ No newline at end of file
+# 只导出与界面无关的核心 API；GUI 请显式导入 src.gui (会加载 tkinter)
+from .processor import FileProcessor, RenameOp
+from .logsink import LogRecord
+from .utils import get_available_extensions, parse_extensions
+
+__all__ = ['FileProcessor', 'RenameOp', 'LogRecord', 'get_available_extensions', 'parse_extensions']
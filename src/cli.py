@@ -0,0 +1,411 @@
+# src/cli.py
+
+import argparse
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+
+# 注意：本模块用于无界面环境 (cron、容器)，不得导入 tkinter 或 gui 模块
+# 监视模式 (ctypes、select) 与多任务调度只在对应子命令中按需导入，不拖慢其它子命令的启动
+from .processor import FileProcessor
+from .rules import compile_rules
+from .journal import undo_journal
+from .dirindex import DirectoryIndex, default_index
+from .sorting import DEFAULT_SORT, sort_choices
+from .dedupe import DEFAULT_HASH_CACHE
+from .stats import RunStats
+from .logsink import FileSink, LogRecord, message
+from .utils import get_available_extensions, parse_extensions
+
+if TYPE_CHECKING:
+    from .scheduler import Job
+
+# --- 命令行入口 (python -m src) ---
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src", description="文件批量处理器 (命令行版)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help="按模式 A/B 处理源目录中的文件")
+    run.add_argument('source', help="源文件目录")
+    run.add_argument('output', nargs='?', help="输出结果目录 (--in-place 时省略)")
+    run.add_argument('--mode', choices=['a', 'b', 'c', 'rules'], required=True,
+                     help="a: 字符替换/删除; b: 重新命名 (大小/序列); c: 重复文件检测; rules: 自定义规则链")
+    run.add_argument('--ext', default='', help="扩展名筛选，用逗号分隔 (如 '*.jpg, png')，留空处理所有文件")
+    run.add_argument('--recursive', action='store_true', help="递归处理子目录，并在输出目录中保持相同的目录结构")
+    run.add_argument('--in-place', action='store_true', help="原地改名：文件留在源目录中只改名字，不移动数据")
+    add_sort_argument(run)
+
+    add_mode_arguments(run)
+
+    run.add_argument('--dry-run', action='store_true', help="仅预演，不移动任何文件")
+    run.add_argument('--workers', type=int, default=1, help="并发移动的工作线程数")
+    run.add_argument('--processes', action='store_true', help="使用进程池代替线程池")
+    run.add_argument('--verify', action='store_true', help="跨设备复制时校验内容后再删除源文件")
+    run.add_argument('--journal', help="可恢复的任务日志路径 (已存在时从中断处续跑)")
+    run.add_argument('--jsonl', action='store_true', help="以 JSON lines 格式输出进度与日志")
+    run.add_argument('--stats-json', help="把分阶段计时与计数写入该 JSON 文件")
+    add_log_file_arguments(run)
+    add_index_argument(run)
+
+    batch = subparsers.add_parser('batch', help="按任务清单并发处理多个源目录 (按设备限制并发数)")
+    batch.add_argument('jobs', help="任务清单 JSON 文件: [{\"source\", \"output\", \"mode\", \"config\", \"ext\", "
+                                    "\"recursive\", \"in_place\", \"sort\", \"journal\"}, ...]")
+    batch.add_argument('--per-device', type=int, default=1, help="每个设备上同时运行的任务数")
+    batch.add_argument('--device-limit', action='append', default=[], metavar='PATH=N',
+                       help="为 PATH 所在设备单独指定并发任务数，可重复")
+    batch.add_argument('--max-jobs', type=int, default=4, help="同时运行的任务总数上限")
+    batch.add_argument('--dry-run', action='store_true', help="仅预演，不移动任何文件")
+    batch.add_argument('--workers', type=int, default=1, help="每个任务并发移动的工作线程数")
+    batch.add_argument('--verify', action='store_true', help="跨设备复制时校验内容后再删除源文件")
+    batch.add_argument('--jsonl', action='store_true', help="以 JSON lines 格式输出日志")
+    batch.add_argument('--stats-json', help="把所有任务合计的计时与计数写入该 JSON 文件")
+    add_log_file_arguments(batch)
+    add_index_argument(batch)
+
+    watch = subparsers.add_parser('watch', help="监视源目录，把写入完成的新文件分批处理 (序号跨批接续)")
+    watch.add_argument('source', help="源文件目录")
+    watch.add_argument('output', nargs='?', help="输出结果目录 (--in-place 时省略)")
+    watch.add_argument('--mode', choices=['a', 'b', 'c', 'rules'], required=True,
+                       help="a: 字符替换/删除; b: 重新命名 (大小/序列); c: 重复文件检测; rules: 自定义规则链")
+    watch.add_argument('--ext', default='', help="扩展名筛选，用逗号分隔，留空处理所有文件")
+    watch.add_argument('--in-place', action='store_true', help="原地改名：文件留在源目录中只改名字")
+    add_sort_argument(watch)
+    add_mode_arguments(watch)
+    watch.add_argument('--settle', type=float, default=2.0, help="文件大小与修改时间静止多少秒后视为写入完成")
+    watch.add_argument('--debounce', type=float, default=2.0, help="多少秒内没有新文件就绪时处理一批")
+    watch.add_argument('--interval', type=float, default=1.0, help="检查候选文件的间隔秒数")
+    watch.add_argument('--max-batch', type=int, default=500, help="每批最多处理的文件数")
+    watch.add_argument('--backend', choices=['auto', 'inotify', 'poll'], default='auto',
+                       help="auto: Linux 下使用 inotify，否则轮询目录")
+    watch.add_argument('--state', help="序号状态文件 (JSON)，重启监视后接着编号")
+    watch.add_argument('--ignore-existing', action='store_true', help="不处理启动时目录中已有的文件")
+    watch.add_argument('--dry-run', action='store_true', help="仅预演，不移动任何文件")
+    watch.add_argument('--workers', type=int, default=1, help="并发移动的工作线程数")
+    watch.add_argument('--verify', action='store_true', help="跨设备复制时校验内容后再删除源文件")
+    watch.add_argument('--jsonl', action='store_true', help="以 JSON lines 格式输出日志")
+    watch.add_argument('--stats-json', help="退出时把累计的计时与计数写入该 JSON 文件")
+    add_log_file_arguments(watch)
+
+    undo = subparsers.add_parser('undo', help="按任务日志撤销已完成的移动")
+    undo.add_argument('journal', help="任务日志路径")
+    undo.add_argument('--jsonl', action='store_true', help="以 JSON lines 格式输出日志")
+    add_log_file_arguments(undo)
+
+    extensions = subparsers.add_parser('extensions', help="列出目录下所有文件的后缀")
+    extensions.add_argument('source', help="源文件目录")
+    add_index_argument(extensions)
+
+    return parser
+
+
+def add_mode_arguments(parser: argparse.ArgumentParser) -> None:
+    """模式 A/B/C 与规则链的参数 (run 与 watch 共用)"""
+    mode_a = parser.add_argument_group("模式 A 参数")
+    mode_a.add_argument('--target', default='', help="旧字符 (大小写不敏感查找)")
+    mode_a.add_argument('--replace', default='', help="新字符 (留空则删除)")
+    mode_a.add_argument('--scope', choices=['1', '2', '3'], default='1', help="作用范围: 1 主体, 2 后缀, 3 主体+后缀")
+
+    mode_b = parser.add_argument_group("模式 B 参数")
+    mode_b.add_argument('--type', choices=['size', 'sequence'], default='sequence', help="命名规则")
+    mode_b.add_argument('--start-num', type=int, default=1, help="序列模式的起始数字")
+    mode_b.add_argument('--padding', type=int, default=0, help="序号最少位数 (监视模式分批编号时建议指定)")
+
+    mode_c = parser.add_argument_group("模式 C 参数")
+    mode_c.add_argument('--dup-action', choices=['skip', 'tag'], default='skip',
+                        help="skip: 重复文件留在源目录; tag: 文件名加 _dup 后一并移动")
+    mode_c.add_argument('--hash-cache', default=str(DEFAULT_HASH_CACHE), help="哈希缓存数据库路径")
+    mode_c.add_argument('--no-hash-cache', action='store_true', help="不读写哈希缓存")
+
+    mode_rules = parser.add_argument_group("规则链参数 (--mode rules)")
+    mode_rules.add_argument('--rule', action='append', default=[], metavar='JSON',
+                            help="一条规则的 JSON，可重复，按顺序应用，例如 '{\"type\": \"case\", \"case\": \"lower\"}'")
+    mode_rules.add_argument('--rules-file', help="包含规则列表的 JSON 文件")
+
+
+def add_log_file_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--log-file', help="把每个文件的结构化日志追加写入该文件 (后台缓冲写入)")
+    parser.add_argument('--log-format', choices=['jsonl', 'csv'], default='jsonl', help="日志文件格式")
+
+
+def add_sort_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--sort', choices=sort_choices(), default=DEFAULT_SORT, metavar='KEY',
+                        help="处理顺序 (决定序号): name 文件名, natural 自然顺序 (file2 在 file10 之前), "
+                             "mtime 修改时间, size 大小；加前缀 '-' 为降序，例如 --sort=-mtime")
+
+
+def add_index_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--no-index', action='store_true',
+                        help="不使用目录索引缓存，每次完整列出目录 (目录中的文件被原地改写过时使用)")
+
+
+def index_for(args: argparse.Namespace) -> Optional[DirectoryIndex]:
+    return None if args.no_index else default_index()
+
+
+def build_config(args: argparse.Namespace) -> Dict[str, Any]:
+    """由命令行参数构造与 GUI 相同结构的配置字典"""
+    config: Dict[str, Any] = {}
+    if args.mode == 'a':
+        if not args.target:
+            raise ValueError("模式 A: '--target' 不能为空。")
+        config['target'] = args.target
+        config['replace'] = args.replace
+        config['scope'] = args.scope
+    elif args.mode == 'b':
+        config['type'] = args.type
+        if args.type == 'sequence':
+            if args.start_num <= 0:
+                raise ValueError("模式 B: '--start-num' 必须是大于零的整数。")
+            config['start_num'] = args.start_num
+            if args.padding:
+                config['padding'] = args.padding
+    elif args.mode == 'c':
+        config['action'] = args.dup_action
+        if not args.no_hash_cache:
+            config['hash_cache'] = args.hash_cache
+    elif args.mode == 'rules':
+        rules: List[Dict[str, Any]] = []
+        if args.rules_file:
+            with open(args.rules_file, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+            if not isinstance(loaded, list):
+                raise ValueError(f"规则文件必须是 JSON 数组: {args.rules_file}")
+            rules.extend(loaded)
+        for rule_str in args.rule:
+            try:
+                rules.append(json.loads(rule_str))
+            except ValueError as e:
+                raise ValueError(f"无效的规则 JSON {rule_str!r}: {e}")
+        if not rules:
+            raise ValueError("规则链模式: 至少需要一条 '--rule' 或 '--rules-file'。")
+        # 开始扫描前先编译一次，无效的规则按参数错误报告
+        compile_rules(rules, 1)
+        config['rules'] = rules
+    return config
+
+
+class Reporter:
+    """把日志与进度输出到标准输出：纯文本或每行一个 JSON 对象"""
+
+    def __init__(self, jsonl: bool, sink: Optional[FileSink] = None):
+        self.jsonl = jsonl
+        self.sink = sink
+        self._out = sys.stdout
+
+    def emit(self, event: str, **fields: Any) -> None:
+        if self.jsonl:
+            self._out.write(json.dumps(dict(event=event, **fields), ensure_ascii=False) + "\n")
+        elif event == 'log':
+            self._out.write(fields['message'] + "\n")
+
+    def log(self, record: Union[str, LogRecord]) -> None:
+        if isinstance(record, str):
+            record = message(record)
+        if self.sink is not None:
+            self.sink(record)
+        if self.jsonl:
+            fields = record._asdict()
+            fields['kind'] = fields.pop('event')
+            fields['message'] = record.format()
+            self.emit('log', **fields)
+        else:
+            self._out.write(record.format() + "\n")
+
+    def progress_func(self) -> Optional[Callable[[int, int], None]]:
+        # 纯文本模式下每个文件已有一行日志，无需额外的进度行
+        if not self.jsonl:
+            return None
+        return lambda done, total: self.emit('progress', done=done, total=total)
+
+
+def run_command(args: argparse.Namespace, reporter: Reporter) -> int:
+    config = build_config(args)
+    if not Path(args.source).is_dir():
+        raise FileNotFoundError("源目录路径无效或不存在。")
+    if args.output is None and not args.in_place:
+        raise ValueError("缺少输出结果目录 (或使用 --in-place 原地改名)。")
+
+    stats = RunStats()
+    processor = FileProcessor(args.source, args.output, parse_extensions(args.ext), stats=stats,
+                              recursive=args.recursive, in_place=args.in_place, index=index_for(args),
+                              sort=args.sort)
+    reporter.emit('found', total=processor.total_files)
+    if processor.total_files == 0 and not args.journal:
+        reporter.log("🚨 源目录下没有找到符合筛选条件的任何文件，操作中止。")
+        return 0
+
+    success_count = processor.process_files(
+        args.mode, config, reporter.log,
+        workers=args.workers, use_processes=args.processes, dry_run=args.dry_run,
+        progress_func=reporter.progress_func(), journal_path=args.journal, verify=args.verify,
+    )
+    # 续跑时任务日志中已完成的文件同样计为成功
+    resumed = processor.resumed_done
+    finished = success_count + resumed
+    reporter.emit('done', success=finished, total=processor.planned_total, resumed=resumed,
+                  dry_run=args.dry_run)
+    if reporter.jsonl:
+        reporter.emit('stats', **stats.finish())
+    else:
+        earlier = f" (另有 {resumed} 个已在上次运行中完成)" if resumed else ""
+        if args.dry_run:
+            reporter.log(f"🔍 预演完成！共 {success_count} 个文件可处理{earlier}，未移动任何文件。")
+        else:
+            reporter.log(f"🎉 全部完成！已处理 {success_count} 个文件{earlier}。")
+        stats.finish()
+        for line in stats.summary_lines():
+            reporter.log(line)
+    if args.stats_json:
+        stats.dump(Path(args.stats_json))
+    return 0 if finished == processor.planned_total else 1
+
+
+def load_jobs(path: str) -> List['Job']:
+    """读取任务清单；每项的 config 与 GUI/命令行构造的配置字典结构相同"""
+    from .scheduler import Job
+
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    if not isinstance(items, list):
+        raise ValueError("任务清单必须是 JSON 数组。")
+    jobs: List['Job'] = []
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"任务清单第 {number} 项无效: 必须是 JSON 对象")
+        if not isinstance(item.get('config', {}), dict):
+            raise ValueError(f"任务清单第 {number} 项无效: config 必须是 JSON 对象")
+        try:
+            in_place = bool(item.get('in_place', False))
+            output = item['source'] if in_place else item['output']
+            jobs.append(Job(item['source'], output, item['mode'], item.get('config', {}),
+                            parse_extensions(item.get('ext', '')), bool(item.get('recursive', False)),
+                            item.get('journal'), in_place, item.get('sort', DEFAULT_SORT)))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"任务清单第 {number} 项无效: 缺少 {e}")
+    return jobs
+
+
+def parse_device_limits(specs: List[str]) -> Dict[int, int]:
+    """把 'PATH=N' 形式的参数转换为 {设备号: 并发上限}"""
+    from .scheduler import device_of
+
+    limits: Dict[int, int] = {}
+    for spec in specs:
+        path, sep, count = spec.rpartition('=')
+        if not sep or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"无效的设备并发设置 {spec!r}，格式为 PATH=N")
+        limits[device_of(Path(path))] = int(count)
+    return limits
+
+
+def batch_command(args: argparse.Namespace, reporter: Reporter) -> int:
+    from .scheduler import JobScheduler
+
+    jobs = load_jobs(args.jobs)
+    stats = RunStats()
+    scheduler = JobScheduler(per_device=args.per_device, max_jobs=args.max_jobs,
+                             device_limits=parse_device_limits(args.device_limit), stats=stats,
+                             index=index_for(args))
+    results = scheduler.run(jobs, reporter.log, workers=args.workers, dry_run=args.dry_run, verify=args.verify)
+
+    failed = 0
+    for result in results:
+        ok = result.error is None and result.success == result.total
+        failed += not ok
+        reporter.emit('job_done', source=result.job.source, total=result.total, success=result.success,
+                      resumed=result.resumed, error=str(result.error) if result.error else None)
+    if reporter.jsonl:
+        reporter.emit('stats', **stats.finish())
+    else:
+        reporter.log(f"🎉 {len(results)} 个任务已结束，其中 {failed} 个未全部成功。")
+        stats.finish()
+        for line in stats.summary_lines():
+            reporter.log(line)
+    if args.stats_json:
+        stats.dump(Path(args.stats_json))
+    return 0 if failed == 0 else 1
+
+
+def watch_command(args: argparse.Namespace, reporter: Reporter) -> int:
+    from .watch import FolderWatcher
+
+    config = build_config(args)
+    if not Path(args.source).is_dir():
+        raise FileNotFoundError("源目录路径无效或不存在。")
+    if args.output is None and not args.in_place:
+        raise ValueError("缺少输出结果目录 (或使用 --in-place 原地改名)。")
+
+    stats = RunStats()
+    watcher = FolderWatcher(args.source, args.output, args.mode, config, parse_extensions(args.ext),
+                            in_place=args.in_place, stats=stats, settle=args.settle, debounce=args.debounce,
+                            interval=args.interval, max_batch=args.max_batch, backend=args.backend,
+                            state_path=args.state, include_existing=not args.ignore_existing, sort=args.sort)
+    cancel_event = threading.Event()
+
+    def batch_done(number: int, total: int, success: int) -> None:
+        reporter.emit('batch_done', batch=number, total=total, success=success, next_index=watcher.next_index)
+
+    # 监视在后台线程中运行，主线程等待 Ctrl+C：取消后当前文件完成即停止，不会中断一次移动
+    errors: List[Exception] = []
+
+    def watch() -> None:
+        try:
+            watcher.run(reporter.log, cancel_event, workers=args.workers, dry_run=args.dry_run,
+                        verify=args.verify, batch_func=batch_done)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=watch, name='watch', daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+    except KeyboardInterrupt:
+        cancel_event.set()
+        reporter.log(message("⏹️ 正在停止监视，等待当前文件完成..."))
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    if reporter.jsonl:
+        reporter.emit('stats', **stats.finish())
+    else:
+        stats.finish()
+        for line in stats.summary_lines():
+            reporter.log(line)
+    if args.stats_json:
+        stats.dump(Path(args.stats_json))
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    reporter = Reporter(getattr(args, 'jsonl', False))
+
+    try:
+        if getattr(args, 'log_file', None):
+            reporter.sink = FileSink(Path(args.log_file), args.log_format)
+        if args.command == 'run':
+            return run_command(args, reporter)
+        if args.command == 'batch':
+            return batch_command(args, reporter)
+        if args.command == 'watch':
+            return watch_command(args, reporter)
+        if args.command == 'undo':
+            count = undo_journal(Path(args.journal), reporter.log)
+            reporter.emit('done', undone=count)
+            return 0
+        if args.command == 'extensions':
+            for ext in sorted(get_available_extensions(args.source, index_for(args))):
+                print(ext)
+            return 0
+    except (ValueError, FileNotFoundError) as e:
+        print(f"参数/路径错误: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if reporter.sink is not None:
+            reporter.sink.close()
+    return 0
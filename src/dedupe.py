@@ -0,0 +1,191 @@
+# src/dedupe.py
+
+import hashlib
+import os
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .scanner import FileRecord
+
+# --- 重复文件检测 (分级哈希 + 持久化缓存) ---
+#
+# 1. 按文件大小分组，大小唯一的文件不可能重复，不读取任何内容；
+# 2. 同大小的文件计算"局部哈希" (文件头 + 文件尾)，大多数不同文件在这里即被区分；
+# 3. 局部哈希仍相同的文件才在进程池中计算完整内容哈希。
+# 哈希结果按 (路径, 大小, 修改时间) 缓存在 SQLite 中，文件未变化时重复运行无需再次读取。
+
+# 局部哈希读取的文件头/尾长度
+PARTIAL_BLOCK_SIZE = 64 * 1024
+# 完整哈希的读取块大小
+FULL_HASH_CHUNK_SIZE = 1024 * 1024
+# 待计算的完整哈希总量低于此值时直接在当前进程计算，省去进程池启动开销
+PROCESS_POOL_MIN_BYTES = 64 * 1024 * 1024
+
+DEFAULT_HASH_CACHE = Path.home() / ".files_tools" / "hash_cache.sqlite3"
+
+
+def partial_hash(path: str, size: int) -> str:
+    """读取文件头尾各 PARTIAL_BLOCK_SIZE 字节计算哈希；小文件等同于完整哈希"""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb', buffering=0) as f:
+        if size <= 2 * PARTIAL_BLOCK_SIZE:
+            hasher.update(f.read())
+        else:
+            hasher.update(f.read(PARTIAL_BLOCK_SIZE))
+            f.seek(-PARTIAL_BLOCK_SIZE, os.SEEK_END)
+            hasher.update(f.read(PARTIAL_BLOCK_SIZE))
+    return hasher.hexdigest()
+
+
+def full_hash(path: str) -> str:
+    """流式计算完整内容哈希。定义为模块级函数，以便进程池序列化调用。"""
+    hasher = hashlib.blake2b()
+    buffer = bytearray(FULL_HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+class HashCache:
+    """
+    持久化哈希缓存，键为 (绝对路径, 大小, 修改时间)；任一项变化即视为缓存失效。
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime REAL, partial TEXT, full TEXT)"
+        )
+        self._pending: List[Tuple[str, int, float, Optional[str], Optional[str]]] = []
+
+    def get(self, path: str, size: int, mtime: float) -> Tuple[Optional[str], Optional[str]]:
+        """返回 (局部哈希, 完整哈希)，没有有效缓存时对应项为 None"""
+        row = self._conn.execute(
+            "SELECT size, mtime, partial, full FROM hashes WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime:
+            return None, None
+        return row[2], row[3]
+
+    def put(self, path: str, size: int, mtime: float, partial: Optional[str], full: Optional[str]) -> None:
+        self._pending.append((path, size, mtime, partial, full))
+
+    def flush(self) -> None:
+        """批量写入本次新计算的哈希"""
+        if self._pending:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO hashes (path, size, mtime, partial, full) VALUES (?, ?, ?, ?, ?)",
+                    self._pending,
+                )
+            self._pending = []
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+
+def _full_hashes(paths: Sequence[str], total_bytes: int, workers: Optional[int]) -> Iterable[str]:
+    if len(paths) < 2 or total_bytes < PROCESS_POOL_MIN_BYTES:
+        return [full_hash(p) for p in paths]
+
+    # 按需导入，避免普通运行加载 multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(full_hash, paths, chunksize=max(1, len(paths) // 64)))
+
+
+def find_duplicates(folder: Path, records: Sequence[FileRecord], cache: Optional[HashCache] = None,
+                    workers: Optional[int] = None) -> Dict[int, int]:
+    """
+    在 records (同一目录下、已排序) 中查找内容重复的文件。
+    返回 {重复文件序号: 首个相同文件的序号}；每组中排序最靠前的文件视为原件。
+    无法读取的文件不参与比较。
+    """
+    by_size: Dict[int, List[int]] = defaultdict(list)
+    for index, record in enumerate(records):
+        by_size[record.size].append(index)
+
+    # 缓存以绝对路径为键，相对路径的源目录 (例如命令行中的 '.') 也不会与其它目录的同名文件混淆
+    root = os.path.abspath(folder)
+    paths: Dict[int, str] = {}
+    partial: Dict[int, str] = {}
+    full: Dict[int, str] = {}
+
+    # --- 第 2 级：局部哈希 ---
+    by_partial: Dict[Tuple[int, str], List[int]] = defaultdict(list)
+    for size, indices in by_size.items():
+        if len(indices) < 2:
+            continue
+        for index in indices:
+            record = records[index]
+            path = os.path.join(root, record.relpath)
+            paths[index] = path
+            cached_partial, cached_full = cache.get(path, size, record.mtime) if cache else (None, None)
+            if cached_full is not None:
+                full[index] = cached_full
+            if cached_partial is None:
+                try:
+                    cached_partial = partial_hash(path, size)
+                except OSError:
+                    continue
+                if cache:
+                    cache.put(path, size, record.mtime, cached_partial, cached_full)
+            partial[index] = cached_partial
+            by_partial[(size, cached_partial)].append(index)
+
+    # --- 第 3 级：完整哈希 (小文件的局部哈希已覆盖全部内容) ---
+    to_hash: List[int] = []
+    for (size, _), indices in by_partial.items():
+        if len(indices) < 2:
+            continue
+        for index in indices:
+            if size <= 2 * PARTIAL_BLOCK_SIZE:
+                full[index] = partial[index]
+            elif index not in full:
+                to_hash.append(index)
+
+    if to_hash:
+        hash_paths = [paths[i] for i in to_hash]
+        total_bytes = sum(records[i].size for i in to_hash)
+        try:
+            results = list(_full_hashes(hash_paths, total_bytes, workers))
+        except OSError:
+            # 某个文件读取失败时逐个重试，跳过失败的文件
+            results = []
+            for p in hash_paths:
+                try:
+                    results.append(full_hash(p))
+                except OSError:
+                    results.append('')
+        for index, digest in zip(to_hash, results):
+            if not digest:
+                continue
+            full[index] = digest
+            if cache:
+                record = records[index]
+                cache.put(paths[index], record.size, record.mtime, partial[index], digest)
+
+    if cache:
+        cache.flush()
+
+    # --- 按 (大小, 完整哈希) 分组，保留每组第一个 ---
+    originals: Dict[Tuple[int, str], int] = {}
+    duplicates: Dict[int, int] = {}
+    for index in sorted(full):
+        key = (records[index].size, full[index])
+        if key in originals:
+            duplicates[index] = originals[key]
+        else:
+            originals[key] = index
+    return duplicates
@@ -0,0 +1,328 @@
+# src/dirindex.py
+
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .filetable import NAME_ENCODING, NAME_ERRORS
+from .scanner import FileRecord, split_suffix
+
+if TYPE_CHECKING:
+    from .stats import RunStats
+
+# --- 持久化目录索引 ---
+#
+# 网络共享上列一次目录可能要几十秒，而"获取可用后缀"、预览与运行 (源目录和输出目录) 会反复列同一批目录。
+# 目录索引按 (目录路径, 目录 mtime) 缓存每个目录的列表：文件名、大小、修改时间、子目录名与后缀直方图。
+#   命中：只 stat 目录本身一次；
+#   目录 mtime 变化 (有条目增删或改名)：只重新列出这一个目录，递归扫描时未变化的子目录仍然命中；
+#   列表保存在 SQLite 中 (与哈希缓存同目录)，按最近使用时间淘汰，重启程序后仍然有效。
+# 刷新时不按 inode 沿用旧的大小：删除后新建的同名文件可能复用同一个 inode 号。
+# 目录 mtime 不反映文件内容的原地改写 (追加、覆盖写入)，因此缓存的大小与修改时间只适合显示；
+# 命名、排序或去重要用到它们时由调用方重新 stat 取自缓存的文件 (见 FileTable.refresh_stats)；
+# 本次刚重新列出的目录已经 stat 过，不再重复。命令行也可用 --no-index 绕过索引。
+
+DEFAULT_DIR_INDEX = Path.home() / ".files_tools" / "dir_index.sqlite3"
+# 持久化保留的目录数上限 (按最近使用淘汰)
+DEFAULT_MAX_DIRS = 2000
+# 内存中保留的文件条目总数上限 (按最近使用淘汰)
+MEMORY_MAX_ENTRIES = 1_000_000
+# 列出目录时其 mtime 距当时不足该秒数，则同一时间戳内可能还有未体现的变化，下次不信任缓存 (类似 git 的 racy 判定)
+RACY_WINDOW = 2.0
+
+
+class DirListing:
+    """
+    一个目录顶层的列表快照 (只读)。
+    文件名以 NUL 分隔编码在一个 bytes 中，大小与修改时间各占一个 array，按需才解码为字符串。
+    dirs 为子目录名 (不含指向目录的符号链接)，others 为其余非普通文件的条目名。
+    from_cache 为真表示取自缓存而不是刚刚列出，此时文件的大小与修改时间可能已过期。
+    """
+
+    def __init__(self, mtime_ns: int, listed_at: float, names: bytes, sizes: array, mtimes: array,
+                 dirs: List[str], others: List[str], histogram: Dict[str, int], from_cache: bool = True):
+        self.mtime_ns = mtime_ns
+        self.listed_at = listed_at
+        self._names = names
+        self.sizes = sizes
+        self.mtimes = mtimes
+        self.dirs = dirs
+        self.others = others
+        self.histogram = histogram
+        self.from_cache = from_cache
+
+    def cached(self) -> 'DirListing':
+        """同一份列表存入缓存时的视图 (共享数据，from_cache 为真)"""
+        return DirListing(self.mtime_ns, self.listed_at, self._names, self.sizes, self.mtimes,
+                          self.dirs, self.others, self.histogram)
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def encoded_names(self) -> bytes:
+        """以 NUL 分隔的文件名，编码方式与 FileTable 相同，可直接拷贝而无需逐个解码"""
+        return self._names
+
+    def file_names(self) -> List[str]:
+        if not self._names:
+            return []
+        return self._names.decode(NAME_ENCODING, NAME_ERRORS).split('\0')
+
+    def all_names(self) -> Iterator[str]:
+        """目录中的全部条目名 (分配输出文件名时，子目录等同样占用名字)"""
+        yield from self.file_names()
+        yield from self.dirs
+        yield from self.others
+
+    def records(self, extensions: Optional[Iterable[str]] = None, rel_dir: str = '') -> Iterator[FileRecord]:
+        """按后缀筛选产出 FileRecord，与 scan_files 的结果一致"""
+        wanted = set(extensions) if extensions else None
+        for i, name in enumerate(self.file_names()):
+            suffix = split_suffix(name)
+            if wanted is not None and suffix.lower() not in wanted:
+                continue
+            yield FileRecord(name, suffix, self.sizes[i], self.mtimes[i], rel_dir)
+
+    def is_fresh(self, st: os.stat_result) -> bool:
+        return st.st_mtime_ns == self.mtime_ns and self.listed_at - st.st_mtime >= RACY_WINDOW
+
+    def to_row(self) -> Tuple:
+        return (self.mtime_ns, self.listed_at, self._names, self.sizes.tobytes(), self.mtimes.tobytes(),
+                json.dumps(self.dirs), json.dumps(self.others), json.dumps(self.histogram))
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> 'DirListing':
+        mtime_ns, listed_at, names, sizes, mtimes, dirs, others, histogram = row
+        return cls(mtime_ns, listed_at, bytes(names), array('q', sizes), array('d', mtimes),
+                   json.loads(dirs), json.loads(others), json.loads(histogram))
+
+
+def list_directory(folder: Path) -> Tuple[DirListing, int]:
+    """
+    用 scandir 列出目录，返回 (列表, stat 次数)。每个文件 stat 一次 (Windows 下 scandir 已自带 stat 数据)。
+    """
+    listed_at = time.time()
+    st_dir = os.stat(folder)
+    names: List[str] = []
+    sizes = array('q')
+    mtimes = array('d')
+    dirs: List[str] = []
+    others: List[str] = []
+    histogram: Dict[str, int] = {}
+    stat_calls = 1
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                    continue
+                if not entry.is_file():
+                    others.append(entry.name)
+                    continue
+                stat_calls += 1
+                st = entry.stat()
+            except OSError:
+                # 列表期间被删除或无权限访问的条目直接跳过
+                continue
+            names.append(entry.name)
+            sizes.append(st.st_size)
+            mtimes.append(st.st_mtime)
+            ext = split_suffix(entry.name).lower()
+            if ext:
+                histogram[ext] = histogram.get(ext, 0) + 1
+
+    blob = '\0'.join(names).encode(NAME_ENCODING, NAME_ERRORS)
+    return (DirListing(st_dir.st_mtime_ns, listed_at, blob, sizes, mtimes, dirs, others, histogram, from_cache=False),
+            stat_calls)
+
+
+class DirectoryIndex:
+    """
+    目录列表缓存：内存中按条目总数做 LRU，db_path 不为空时同时持久化到 SQLite (按目录数淘汰)。
+    线程安全，可被预览线程、后台任务与批量任务共用。新列出的目录在 flush (每次 scan 结束时自动调用) 时写入磁盘。
+    """
+
+    def __init__(self, db_path: Optional[Path] = DEFAULT_DIR_INDEX, max_dirs: int = DEFAULT_MAX_DIRS,
+                 memory_max_entries: int = MEMORY_MAX_ENTRIES):
+        self.max_dirs = max_dirs
+        self.memory_max_entries = memory_max_entries
+        self._lock = threading.RLock()
+        self._memory: 'OrderedDict[str, DirListing]' = OrderedDict()
+        self._memory_entries = 0
+        # 待写入的目录列表与待更新的最近使用时间
+        self._pending: Dict[str, DirListing] = {}
+        self._touched: Dict[str, float] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            db_path = Path(db_path)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dirs ("
+                " path TEXT PRIMARY KEY, last_used REAL, mtime_ns INTEGER, listed_at REAL, names BLOB,"
+                " sizes BLOB, mtimes BLOB, subdirs TEXT, others TEXT, histogram TEXT)"
+            )
+
+    @staticmethod
+    def _key(folder: Path) -> str:
+        return os.path.normcase(os.path.abspath(folder))
+
+    def _remember(self, key: str, listing: DirListing) -> None:
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_entries -= len(old)
+        self._memory[key] = listing
+        self._memory_entries += len(listing)
+        while self._memory_entries > self.memory_max_entries and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_entries -= len(evicted)
+
+    def _cached(self, key: str) -> Optional[DirListing]:
+        listing = self._memory.get(key)
+        if listing is not None:
+            self._memory.move_to_end(key)
+            return listing
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT mtime_ns, listed_at, names, sizes, mtimes, subdirs, others, histogram"
+            " FROM dirs WHERE path = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        listing = DirListing.from_row(row)
+        self._remember(key, listing)
+        return listing
+
+    def listing(self, folder: Path, stats: Optional['RunStats'] = None) -> Optional[DirListing]:
+        """
+        返回目录的当前列表；目录不存在时返回 None。缓存有效时只 stat 目录本身。
+        stats 不为空时累加 stat_calls、dir_index_hits 与 dir_index_refreshes 计数。
+        """
+        key = self._key(folder)
+        try:
+            st = os.stat(folder)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not stat.S_ISDIR(st.st_mode):
+            return None
+        with self._lock:
+            cached = self._cached(key)
+            if cached is not None and cached.is_fresh(st):
+                self._touched[key] = time.time()
+                if stats is not None:
+                    stats.incr('stat_calls')
+                    stats.incr('dir_index_hits')
+                return cached
+
+        listing, stat_calls = list_directory(folder)
+        with self._lock:
+            self._remember(key, listing.cached())
+            self._pending[key] = listing
+        if stats is not None:
+            stats.incr('stat_calls', stat_calls + 1)
+            stats.incr('dir_index_refreshes')
+        return listing
+
+    def scan(self, folder: Path, extensions: Optional[Iterable[str]] = None,
+             stats: Optional['RunStats'] = None, recursive: bool = False,
+             exclude: Iterable[Path] = ()) -> Iterator[FileRecord]:
+        """与 scan_files 参数和结果相同，但目录列表取自索引"""
+        for rel_dir, listing in self.walk(folder, stats, recursive, exclude):
+            yield from listing.records(extensions, rel_dir)
+
+    def walk(self, folder: Path, stats: Optional['RunStats'] = None, recursive: bool = False,
+             exclude: Iterable[Path] = ()) -> Iterator[Tuple[str, DirListing]]:
+        """
+        按 scan 的顺序逐个产出 (相对路径, 目录列表)，供调用方整块使用列表 (例如 FileTable 直接拷贝编码后的文件名)。
+        """
+        excluded = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+        pending: List[Tuple[str, str]] = [(str(folder), '')]
+        try:
+            while pending:
+                current, rel_dir = pending.pop()
+                try:
+                    listing = self.listing(Path(current), stats)
+                    if listing is None:
+                        raise FileNotFoundError(f"目录不存在: {current}")
+                except OSError:
+                    if not rel_dir:
+                        raise
+                    # 无权限访问或已被删除的子目录直接跳过
+                    continue
+                if recursive:
+                    for name in listing.dirs:
+                        path = os.path.join(current, name)
+                        if os.path.normcase(os.path.abspath(path)) not in excluded:
+                            pending.append((path, os.path.join(rel_dir, name)))
+                yield rel_dir, listing
+        finally:
+            self.flush()
+
+    def invalidate(self, folder: Path) -> None:
+        """丢弃某个目录的缓存 (下次访问时完整重新列出)"""
+        key = self._key(folder)
+        with self._lock:
+            listing = self._memory.pop(key, None)
+            if listing is not None:
+                self._memory_entries -= len(listing)
+            self._pending.pop(key, None)
+            self._touched.pop(key, None)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM dirs WHERE path = ?", (key,))
+
+    def flush(self) -> None:
+        """把新列出的目录与最近使用时间写入磁盘，并淘汰最久未用的目录"""
+        with self._lock:
+            if self._conn is None:
+                self._pending.clear()
+                self._touched.clear()
+                return
+            if not self._pending and not self._touched:
+                return
+            now = time.time()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO dirs (path, last_used, mtime_ns, listed_at, names, sizes, mtimes,"
+                    " subdirs, others, histogram) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(key, now) + listing.to_row() for key, listing in self._pending.items()],
+                )
+                self._conn.executemany("UPDATE dirs SET last_used = ? WHERE path = ?",
+                                       [(used, key) for key, used in self._touched.items()])
+                self._conn.execute(
+                    "DELETE FROM dirs WHERE path NOT IN (SELECT path FROM dirs ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_dirs,),
+                )
+            self._pending.clear()
+            self._touched.clear()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_default_index: Optional[DirectoryIndex] = None
+_default_lock = threading.Lock()
+
+
+def default_index() -> DirectoryIndex:
+    """进程内共享的目录索引 (持久化到 DEFAULT_DIR_INDEX；无法打开数据库时只在内存中缓存)"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            try:
+                _default_index = DirectoryIndex(DEFAULT_DIR_INDEX)
+            except (OSError, sqlite3.Error):
+                _default_index = DirectoryIndex(None)
+        return _default_index
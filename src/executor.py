@@ -0,0 +1,95 @@
+# src/executor.py
+
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Deque, Iterable, Iterator, Optional, Tuple
+
+from .transfer import TransferResult, transfer_file
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+# --- 文件移动执行引擎 ---
+
+# 单个移动任务: (序号, 源文件, 目标路径, 预先产生的错误)
+MoveTask = Tuple[int, Path, Optional[Path], Optional[Exception]]
+# 移动结果: (序号, 源文件, 目标路径, 错误, 传输结果；未执行移动时为 None)
+MoveResult = Tuple[int, Path, Optional[Path], Optional[Exception], Optional[TransferResult]]
+
+
+def move_file(src: str, dst: str, verify: bool = False, dst_dev: Optional[int] = None,
+              src_dev: Optional[int] = None) -> TransferResult:
+    """
+    执行单个文件移动 (目标已存在时抛出 FileExistsError，绝不覆盖)。
+    定义为模块级函数，以便进程池可以序列化调用。
+    """
+    return transfer_file(Path(src), Path(dst), verify=verify, dst_dev=dst_dev, src_dev=src_dev)
+
+
+class MoveExecutor:
+    """
+    使用线程池或进程池并发执行文件移动。
+
+    目标文件名由调用方按顺序预先确定，这里只负责搬运数据；
+    结果严格按提交顺序返回，保证日志输出与串行路径完全一致。
+    """
+
+    def __init__(self, workers: int = 1, use_processes: bool = False, window: int = 0,
+                 verify: bool = False, dst_dev: Optional[int] = None, src_dev: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self.verify = verify
+        self.dst_dev = dst_dev
+        self.src_dev = src_dev
+        # 同时在途的任务上限，避免一次性为海量文件创建 Future
+        self.window = window if window > 0 else self.workers * 4
+
+    def _create_pool(self) -> 'Executor':
+        # 按需导入：串行路径与命令行启动时无需加载 concurrent.futures / multiprocessing
+        if self.use_processes:
+            from concurrent.futures import ProcessPoolExecutor
+            return ProcessPoolExecutor(max_workers=self.workers)
+        from concurrent.futures import ThreadPoolExecutor
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def run(self, tasks: Iterable[MoveTask]) -> Iterator[MoveResult]:
+        """
+        执行全部任务，按原顺序逐个产出 (序号, 源文件, 目标路径, 错误, 传输结果)。
+        已携带错误或没有目标路径的任务不会被提交，直接原样返回。
+        """
+        if self.workers == 1:
+            for index, src, dst, error in tasks:
+                result = None
+                if error is None and dst is not None:
+                    try:
+                        result = move_file(str(src), str(dst), self.verify, self.dst_dev, self.src_dev)
+                    except Exception as e:
+                        error = e
+                yield index, src, dst, error, result
+            return
+
+        pending: Deque[Tuple[MoveTask, Optional['Future']]] = deque()
+        with self._create_pool() as pool:
+            for task in tasks:
+                index, src, dst, error = task
+                future = None
+                if error is None and dst is not None:
+                    future = pool.submit(move_file, str(src), str(dst), self.verify, self.dst_dev, self.src_dev)
+                pending.append((task, future))
+
+                if len(pending) >= self.window:
+                    yield self._collect(*pending.popleft())
+
+            while pending:
+                yield self._collect(*pending.popleft())
+
+    @staticmethod
+    def _collect(task: MoveTask, future: Optional['Future']) -> MoveResult:
+        index, src, dst, error = task
+        result = None
+        if future is not None:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+        return index, src, dst, error, result
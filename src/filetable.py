@@ -0,0 +1,238 @@
+# src/filetable.py
+
+import heapq
+import os
+from array import array
+from itertools import accumulate, islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .scanner import FileRecord, scan_dirs, split_suffix
+from .sorting import DEFAULT_SORT, compute_keys, parse_sort
+
+if TYPE_CHECKING:
+    from .dirindex import DirectoryIndex, DirListing
+    from .stats import RunStats
+
+# --- 紧凑的文件表 ---
+#
+# 百万级文件时，每个文件一个 FileRecord 元组 (外加名字、后缀、大小、时间各自的对象) 约占 250 字节。
+# FileTable 按列存储：全部文件名编码后以 NUL 结尾依次拼接在一个 bytearray 中，用偏移数组定位
+# (需要全部文件名时整体解码后一次切分)，
+# 大小、修改时间、所在子目录编号各占一个 array，每个文件只需约 30 字节加上文件名本身的长度。
+# 按下标访问时才临时构造 FileRecord，因此规则、去重等代码无需修改。
+# 扫描结果直接追加进这些缓冲区 (发现顺序)，排序只排一个行号数组：每次只为 SORT_CHUNK 行计算排序键，
+# 各段排好后归并，峰值内存为表本身加上每行 4 字节的行号，与排序键的大小无关。
+# 使用目录索引 (或不需要 stat) 时整块追加每个目录的文件名与大小/时间数组，不经过逐个文件的 FileRecord。
+
+# 文件名的编码方式：surrogatepass 保证任何 str (包括 surrogateescape 解码得到的名字) 都能原样还原
+NAME_ENCODING = 'utf-8'
+NAME_ERRORS = 'surrogatepass'
+
+# 分段排序时每段的行数 (同时驻留内存的排序键个数)
+SORT_CHUNK = 1 << 14
+
+
+class FileTable:
+    """
+    只读的列式文件列表，行为类似 List[FileRecord] (支持 len、下标与迭代)。
+    通过 scan() 创建；行顺序即处理顺序 (按 sort 指定的排序方式，递归时先按子目录)。
+    """
+
+    def __init__(self):
+        # 第 i 个文件名占 _names[_offsets[i]:_offsets[i + 1] - 1]，其后是一个 NUL
+        self._names = bytearray()
+        self._offsets = array('Q', [0])
+        self._sizes = array('q')
+        self._mtimes = array('d')
+        # 子目录编号 -> 相对路径；非递归扫描时只有顶层 ''
+        self._dirs: List[str] = ['']
+        self._dir_lookup: Dict[str, int] = {'': 0}
+        self._dir_ids = array('I')
+        # 处理顺序中的第 i 行 -> 存储位置；为 None 时即发现顺序
+        self._rows: Optional[array] = None
+        # 大小与修改时间可能不是当前值的存储位置区间 [start, stop) (取自索引缓存，或扫描时没有 stat)
+        self._stale: List[Tuple[int, int]] = []
+
+    @classmethod
+    def scan(cls, folder: Path, extensions: Optional[Iterable[str]] = None,
+             stats: Optional['RunStats'] = None, recursive: bool = False,
+             exclude: Iterable[Path] = (), index: Optional['DirectoryIndex'] = None,
+             sort: Optional[str] = DEFAULT_SORT, restat: bool = False,
+             stat_files: bool = True) -> 'FileTable':
+        """
+        扫描目录并按处理顺序建表。文件按目录分批整块写入紧凑缓冲区，只临时保留一批文件名字符串。
+        index 不为空时目录列表取自目录索引 (未变化的目录无需重新列出)；
+        此时 restat=True 会在排序前重新 stat 取自索引缓存的文件，大小与修改时间不使用可能过期的值。
+        sort 为排序方式 (见 sorting 模块)；为 None 时保持发现顺序，由调用方自行排序 (例如预览只选出前几屏)。
+        不使用索引且 stat_files=False 时不 stat 文件，大小与修改时间为 0 (见 scan_dirs)。
+        """
+        table = cls()
+        if index is None:
+            for batch in scan_dirs(folder, extensions, stats, recursive=recursive, exclude=exclude,
+                                   stat_files=stat_files):
+                blob = '\0'.join(batch.names).encode(NAME_ENCODING, NAME_ERRORS)
+                table._extend(blob, batch.sizes, batch.mtimes, table._dir_id(batch.rel_dir), not stat_files)
+        else:
+            wanted = set(extensions) if extensions else None
+            for rel_dir, listing in index.walk(folder, stats, recursive=recursive, exclude=exclude):
+                table._append_listing(listing, wanted, rel_dir)
+        if restat:
+            table.refresh_stats(folder, stats)
+        if sort is not None:
+            table._rows = table._sorted_rows(sort)
+        return table
+
+    @classmethod
+    def from_records(cls, records: Iterable[FileRecord], sort: Optional[str] = DEFAULT_SORT) -> 'FileTable':
+        """由调用方已发现的文件记录 (例如监视模式中的一批新文件) 建表，排序规则与 scan 相同"""
+        table = cls()
+        for record in records:
+            table._append(record.name, record.size, record.mtime, table._dir_id(record.rel_dir))
+        if sort is not None:
+            table._rows = table._sorted_rows(sort)
+        return table
+
+    def _sorted_rows(self, sort: str) -> array:
+        """
+        按排序方式给出存储位置的顺序 (与 sorting.sort_order 的结果相同)。
+        每段 SORT_CHUNK 行单独排序 (每行的键只在段内计算一次)，多段时再按键归并。
+        """
+        key_func, descending = parse_sort(sort)
+        dirs = self._dirs if len(self._dirs) > 1 else None
+
+        def row_key(slot: int) -> Any:
+            key = key_func(self._stored_name(slot), self._sizes[slot], self._mtimes[slot])
+            return (dirs[self._dir_ids[slot]], key) if dirs is not None else key
+
+        count = len(self._sizes)
+        runs = [array('I', sorted(range(start, min(start + SORT_CHUNK, count)), key=row_key, reverse=descending))
+                for start in range(0, count, SORT_CHUNK)]
+        if len(runs) == 1:
+            return runs[0]
+        # 归并时每段只有队首一行的键驻留内存；键相同时先取靠前的段，与整体稳定排序一致
+        return array('I', heapq.merge(*runs, key=row_key, reverse=descending))
+
+    def _append(self, name: str, size: int, mtime: float, dir_id: int) -> None:
+        self._names += name.encode(NAME_ENCODING, NAME_ERRORS)
+        self._names += b'\0'
+        self._offsets.append(len(self._names))
+        self._sizes.append(size)
+        self._mtimes.append(mtime)
+        self._dir_ids.append(dir_id)
+
+    def _dir_id(self, rel_dir: str) -> int:
+        """子目录的编号，首次遇到时分配"""
+        dir_id = self._dir_lookup.get(rel_dir)
+        if dir_id is None:
+            dir_id = self._dir_lookup[rel_dir] = len(self._dirs)
+            self._dirs.append(rel_dir)
+        return dir_id
+
+    def _append_listing(self, listing: 'DirListing', wanted: Optional[Set[str]], rel_dir: str) -> None:
+        """
+        追加目录索引中一个目录的文件：文件名按字节整体拷贝，大小与时间数组整体追加。
+        只有筛选条件排除了该目录中的部分文件时才逐个检查后缀。
+        """
+        blob = listing.encoded_names()
+        if not blob:
+            return
+        sizes: Iterable[int] = listing.sizes
+        mtimes: Iterable[float] = listing.mtimes
+        if wanted is not None:
+            kept = wanted.intersection(listing.histogram)
+            if not kept:
+                return
+            # 直方图只统计有后缀的文件：全部后缀都被选中且没有无后缀的文件时无需逐个检查
+            if len(kept) < len(listing.histogram) or sum(listing.histogram.values()) < len(listing):
+                parts = blob.split(b'\0')
+                rows = [i for i, part in enumerate(parts)
+                        if split_suffix(part.decode(NAME_ENCODING, NAME_ERRORS)).lower() in wanted]
+                if not rows:
+                    return
+                blob = b'\0'.join(parts[i] for i in rows)
+                sizes = [listing.sizes[i] for i in rows]
+                mtimes = [listing.mtimes[i] for i in rows]
+        self._extend(blob, sizes, mtimes, self._dir_id(rel_dir), listing.from_cache)
+
+    def _extend(self, blob: bytes, sizes: Iterable[int], mtimes: Iterable[float], dir_id: int, stale: bool) -> None:
+        """整块追加同一子目录中的文件：blob 为以 NUL 分隔的已编码文件名 (非空)"""
+        start = len(self._sizes)
+        # 每个名字之后还有一个 NUL，下一个名字从 长度 + 1 处开始
+        lengths = map((1).__add__, map(len, blob.split(b'\0')))
+        self._offsets.extend(islice(accumulate(lengths, initial=len(self._names)), 1, None))
+        self._names += blob
+        self._names += b'\0'
+        self._sizes.extend(sizes)
+        self._mtimes.extend(mtimes)
+        self._dir_ids.extend(array('I', [dir_id]) * (len(self._sizes) - start))
+        if stale:
+            self._stale.append((start, len(self._sizes)))
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    @property
+    def stale_stats(self) -> bool:
+        """是否有文件的大小与修改时间可能不是当前值 (取自目录索引缓存，或扫描时没有 stat)"""
+        return bool(self._stale)
+
+    def refresh_stats(self, folder: Path, stats: Optional['RunStats'] = None) -> None:
+        """
+        重新 stat 大小与修改时间可能过期的文件 (folder 为扫描根目录)，行顺序不变；本次刚 stat 过的文件不再重复。
+        已被删除或无法访问的文件保留原值，执行移动时自然会失败。
+        """
+        root = str(folder)
+        stat_calls = 0
+        for start, stop in self._stale:
+            for slot in range(start, stop):
+                stat_calls += 1
+                try:
+                    st = os.stat(os.path.join(root, self._dirs[self._dir_ids[slot]], self._stored_name(slot)))
+                except OSError:
+                    continue
+                self._sizes[slot] = st.st_size
+                self._mtimes[slot] = st.st_mtime
+        self._stale = []
+        if stats is not None:
+            stats.incr('stat_calls', stat_calls)
+
+    def sort_keys(self, sort: str = DEFAULT_SORT) -> Tuple[List[Any], bool]:
+        """按当前行顺序计算每行的排序键，返回 (键列表, 是否降序)，与建表时使用的键相同"""
+        names: List[str] = self._names.decode(NAME_ENCODING, NAME_ERRORS).split('\0')
+        names.pop()
+        sizes: Any = self._sizes
+        mtimes: Any = self._mtimes
+        dir_ids: Any = self._dir_ids
+        if self._rows is not None:
+            names = [names[slot] for slot in self._rows]
+            sizes = [sizes[slot] for slot in self._rows]
+            mtimes = [mtimes[slot] for slot in self._rows]
+            dir_ids = [dir_ids[slot] for slot in self._rows]
+        dirs = [self._dirs[dir_id] for dir_id in dir_ids] if len(self._dirs) > 1 else None
+        return compute_keys(sort, names, sizes, mtimes, dirs)
+
+    def _stored_name(self, slot: int) -> str:
+        return self._names[self._offsets[slot]:self._offsets[slot + 1] - 1].decode(NAME_ENCODING, NAME_ERRORS)
+
+    def name(self, index: int) -> str:
+        return self._stored_name(self._rows[index] if self._rows is not None else index)
+
+    def __getitem__(self, index: int) -> FileRecord:
+        if index < 0:
+            index += len(self)
+        slot = self._rows[index] if self._rows is not None else index
+        name = self._stored_name(slot)
+        return FileRecord(name, split_suffix(name), self._sizes[slot], self._mtimes[slot],
+                          self._dirs[self._dir_ids[slot]])
+
+    def __iter__(self) -> Iterator[FileRecord]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def nbytes(self) -> int:
+        """表本身占用的内存 (字节)，不含子目录名列表"""
+        return (len(self._names) + self._offsets.itemsize * len(self._offsets)
+                + self._sizes.itemsize * len(self._sizes) + self._mtimes.itemsize * len(self._mtimes)
+                + self._dir_ids.itemsize * len(self._dir_ids)
+                + (self._rows.itemsize * len(self._rows) if self._rows is not None else 0))
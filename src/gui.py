@@ -1,13 +1,40 @@
 # src/gui.py
 
+import queue
+import threading
+import time
+from datetime import datetime
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
 # 从同一包内的其他模块导入
 from .processor import FileProcessor
-from .utils import get_available_extensions
+from .dedupe import DEFAULT_HASH_CACHE
+from .stats import RunStats
+from .logsink import DEFAULT_LOG_DIR, FileSink, RingBuffer, fan_out
+from .preview import PreviewModel
+from .dirindex import DirectoryIndex, default_index
+from .utils import get_available_extensions, parse_extensions
+
+# 后台任务消息队列的轮询间隔 (毫秒) 与每次最多处理的消息数
+POLL_INTERVAL_MS = 100
+MAX_MESSAGES_PER_POLL = 5000
+# 界面只保留最近的日志行，完整记录写入日志文件
+MAX_LOG_LINES = 5000
+# 预览列表的可见行数 (只创建这么多行控件，滚动时改写内容) 与参数输入的防抖间隔 (毫秒)
+PREVIEW_ROWS = 12
+PREVIEW_DEBOUNCE_MS = 250
+# 处理顺序选项: 显示文字 -> 排序方式 (见 sorting 模块)
+SORT_OPTIONS = {
+    '文件名': 'name',
+    '自然顺序 (file2 在 file10 之前)': 'natural',
+    '修改时间 (最早在前)': 'mtime',
+    '修改时间 (最新在前)': '-mtime',
+    '文件大小 (最小在前)': 'size',
+    '文件大小 (最大在前)': '-size',
+}
 
 # --- Tkinter GUI 界面 ---
 
@@ -22,6 +49,18 @@ class RenamerApp:
         
         # 扩展名筛选变量
         self.extensions_filter_var = tk.StringVar(value="") 
+
+        # 递归处理子目录变量 (输出目录中保持相同的目录结构)
+        self.recursive_var = tk.BooleanVar(value=False)
+
+        # 原地改名变量 (文件留在源目录，只修改名字)
+        self.in_place_var = tk.BooleanVar(value=False)
+
+        # 使用目录索引变量 (关闭后每次都重新列出目录，不读取缓存)
+        self.use_index_var = tk.BooleanVar(value=True)
+
+        # 处理顺序变量 (决定序号)
+        self.sort_var = tk.StringVar(value=next(iter(SORT_OPTIONS)))
         
         # 模式变量
         self.mode_var = tk.StringVar(value='a')
@@ -35,10 +74,42 @@ class RenamerApp:
         self.type_var = tk.StringVar(value='sequence')
         self.start_num_var = tk.StringVar(value='1')
 
+        # 模式 C 变量
+        self.duplicate_action_var = tk.StringVar(value='skip')
+
+        # 预演模式变量 (只生成计划，不移动文件)
+        self.dry_run_var = tk.BooleanVar(value=False)
+
+        # 后台处理线程与主线程之间的通信
+        self.worker_queue: "queue.Queue[tuple]" = queue.Queue()
+        self.worker_thread: Optional[threading.Thread] = None
+        self.cancel_event = threading.Event()
+        # 后台线程写入的结构化日志 (有界环形缓冲) 与界面已读取到的位置
+        self.log_buffer = RingBuffer(MAX_LOG_LINES)
+        self.log_seq = 0
+        # 最新进度 (已完成数, 总数)，后台线程直接覆盖，界面轮询时读取
+        self.latest_progress: Optional[Tuple[int, int]] = None
+        # 当前运行的统计 (界面刷新耗时也记入其中)
+        self.run_stats: Optional[RunStats] = None
+
+        # 改名预览：缓存的目录列表、首个可见行、待执行的防抖回调与后台读取结果
+        self.preview_model: Optional[PreviewModel] = None
+        self.preview_top = 0
+        self._preview_after: Optional[str] = None
+        self._preview_loading: Optional[tuple] = None
+        self._preview_result: Optional[tuple] = None
+        self._preview_sort_after: Optional[str] = None
+
         # 构建界面
         self.create_widgets()
         self.update_mode_frame() 
 
+        # 任何影响新文件名的输入变化都会 (防抖后) 刷新预览
+        for var in (self.source_path, self.extensions_filter_var, self.recursive_var, self.use_index_var,
+                    self.sort_var, self.mode_var,
+                    self.target_var, self.replace_var, self.scope_var, self.type_var, self.start_num_var):
+            var.trace_add('write', self.schedule_preview)
+
     def create_widgets(self):
         # 整体框架
         main_frame = ttk.Frame(self.master, padding="10")
@@ -71,6 +142,23 @@ class RenamerApp:
         # 获取可用后缀按钮
         get_ext_btn = ttk.Button(path_frame, text="获取可用后缀", command=self.get_and_set_extensions)
         get_ext_btn.grid(row=row_idx, column=2, padx=5, pady=2)
+
+        row_idx += 1
+        ttk.Checkbutton(path_frame, text="包含子目录 (在输出目录中保持相同的目录结构)",
+                        variable=self.recursive_var).grid(row=row_idx, column=0, columnspan=3, sticky='w', padx=5, pady=2)
+
+        row_idx += 1
+        ttk.Checkbutton(path_frame, text="原地改名 (文件留在源目录，只修改名字)", variable=self.in_place_var,
+                        command=self.check_paths).grid(row=row_idx, column=0, columnspan=3, sticky='w', padx=5, pady=2)
+
+        row_idx += 1
+        ttk.Checkbutton(path_frame, text="使用目录索引 (未变化的目录无需重新列出)",
+                        variable=self.use_index_var).grid(row=row_idx, column=0, columnspan=3, sticky='w', padx=5, pady=2)
+
+        row_idx += 1
+        ttk.Label(path_frame, text="处理顺序 (决定序号):").grid(row=row_idx, column=0, sticky='w', padx=5, pady=2)
+        ttk.Combobox(path_frame, textvariable=self.sort_var, values=list(SORT_OPTIONS), state='readonly',
+                     width=30).grid(row=row_idx, column=1, sticky='w', padx=5, pady=2)
         
         # 2. 模式选择
         mode_select_frame = ttk.LabelFrame(main_frame, text="🔧 操作模式选择", padding="10")
@@ -78,7 +166,8 @@ class RenamerApp:
 
         modes = [
             ("模式 A: 字符替换/删除", 'a'),
-            ("模式 B: 重新命名 (大小/序列)", 'b')
+            ("模式 B: 重新命名 (大小/序列)", 'b'),
+            ("模式 C: 重复文件检测", 'c')
         ]
         
         for i, (text, mode) in enumerate(modes):
@@ -88,12 +177,44 @@ class RenamerApp:
         # 3. 模式参数区域 (动态内容)
         self.mode_params_frame = ttk.LabelFrame(main_frame, text="⚙️ 模式参数", padding="10")
         self.mode_params_frame.pack(fill='x', pady=5)
+
+        # 4. 改名预览 (虚拟列表：只创建可见的行，滚动时改写行内容)
+        preview_frame = ttk.LabelFrame(main_frame, text="👀 改名预览", padding="10")
+        preview_frame.pack(fill='x', pady=5)
+        self.preview_status = ttk.Label(preview_frame, text="选择源目录后显示改名预览")
+        self.preview_status.pack(side=tk.BOTTOM, anchor='w')
+        self.preview_scrollbar = ttk.Scrollbar(preview_frame, orient='vertical', command=self.scroll_preview)
+        self.preview_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.preview_tree = ttk.Treeview(preview_frame, columns=('index', 'old', 'new'), show='headings',
+                                         height=PREVIEW_ROWS, selectmode='none')
+        self.preview_tree.heading('index', text="#")
+        self.preview_tree.heading('old', text="原文件名")
+        self.preview_tree.heading('new', text="新文件名")
+        self.preview_tree.column('index', width=60, stretch=False, anchor='e')
+        self.preview_tree.pack(fill='x', expand=True)
+        for row in range(PREVIEW_ROWS):
+            self.preview_tree.insert('', tk.END, iid=str(row), values=('', '', ''))
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.preview_tree.bind(sequence, self._on_preview_wheel)
         
-        # 4. 执行按钮
-        self.run_button = ttk.Button(main_frame, text="🚀 开始处理", command=self.run_process, state='disabled')
-        self.run_button.pack(fill='x', pady=10)
+        # 5. 执行按钮
+        ttk.Checkbutton(main_frame, text="仅预演 (只显示改名计划，不移动任何文件)", variable=self.dry_run_var).pack(anchor='w')
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill='x', pady=10)
+        button_frame.columnconfigure(0, weight=1)
+        self.run_button = ttk.Button(button_frame, text="🚀 开始处理", command=self.run_process, state='disabled')
+        self.run_button.grid(row=0, column=0, sticky='ew')
+        self.cancel_button = ttk.Button(button_frame, text="⏹️ 取消", command=self.cancel_process, state='disabled')
+        self.cancel_button.grid(row=0, column=1, padx=(5, 0))
+
+        # 进度条
+        self.progress_var = tk.DoubleVar(value=0)
+        self.progress_bar = ttk.Progressbar(main_frame, variable=self.progress_var, maximum=1, mode='determinate')
+        self.progress_bar.pack(fill='x')
+        self.progress_label = ttk.Label(main_frame, text="")
+        self.progress_label.pack(anchor='w')
         
-        # 5. 日志区域
+        # 6. 日志区域
         log_frame = ttk.LabelFrame(main_frame, text="📝 操作日志", padding="10")
         log_frame.pack(fill='both', expand=True, pady=5)
         
@@ -128,6 +249,10 @@ class RenamerApp:
         
         self.check_paths()
 
+    def current_index(self) -> Optional[DirectoryIndex]:
+        """界面勾选了使用目录索引时返回默认索引，否则返回 None (直接列出目录)"""
+        return default_index() if self.use_index_var.get() else None
+
     def get_and_set_extensions(self):
         """获取源目录下的所有文件后缀，并填充到筛选输入框中。"""
         source_dir = self.source_path.get()
@@ -136,7 +261,7 @@ class RenamerApp:
             return 
             
         try:
-            available_extensions = get_available_extensions(source_dir)
+            available_extensions = get_available_extensions(source_dir, self.current_index())
             
             if not available_extensions:
                 self.extensions_filter_var.set("")
@@ -155,7 +280,10 @@ class RenamerApp:
 
     def check_paths(self):
         """检查路径是否都已设置，并启用/禁用运行按钮"""
-        if self.source_path.get() and self.output_path.get():
+        if self.worker_thread is not None:
+            # 处理进行中，保持运行按钮禁用
+            self.run_button.config(state='disabled')
+        elif self.source_path.get() and (self.output_path.get() or self.in_place_var.get()):
             self.run_button.config(state='normal')
         else:
             self.run_button.config(state='disabled')
@@ -194,6 +322,13 @@ class RenamerApp:
             
             self.toggle_start_num()
 
+        elif current_mode == 'c':
+            ttk.Label(self.mode_params_frame, text="重复文件:").grid(row=0, column=0, sticky='w', padx=5, pady=5)
+            action_frame = ttk.Frame(self.mode_params_frame)
+            action_frame.grid(row=0, column=1, sticky='w', padx=5, pady=5)
+            ttk.Radiobutton(action_frame, text="跳过 (留在源目录)", variable=self.duplicate_action_var, value='skip').pack(side='left')
+            ttk.Radiobutton(action_frame, text="标记 (文件名加 _dup)", variable=self.duplicate_action_var, value='tag').pack(side='left', padx=10)
+
     def toggle_start_num(self):
         """控制模式B下起始数字的动态显示/隐藏"""
         if self.type_var.get() == 'sequence':
@@ -203,40 +338,161 @@ class RenamerApp:
             self.start_num_label.grid_forget()
             self.start_num_entry.grid_forget()
 
+    def schedule_preview(self, *_):
+        """输入变化后延迟刷新预览；连续输入只触发最后一次"""
+        if self._preview_after is not None:
+            self.master.after_cancel(self._preview_after)
+        self._preview_after = self.master.after(PREVIEW_DEBOUNCE_MS, self.refresh_preview)
+
+    def refresh_preview(self):
+        """源目录或筛选条件变化时在后台重新读取列表，否则只按新参数重算可见行"""
+        self._preview_after = None
+        source_dir = self.source_path.get()
+        if not source_dir or not Path(source_dir).is_dir():
+            self.preview_model = None
+            self.preview_status.config(text="选择源目录后显示改名预览")
+            self._show_preview_rows(0)
+            return
+
+        key = (source_dir, tuple(self.parse_extensions_filter()), self.recursive_var.get(),
+               SORT_OPTIONS[self.sort_var.get()], self.use_index_var.get())
+        if self.preview_model is None or self.preview_model.key != key:
+            if self._preview_loading is None:
+                self._preview_loading = key
+                self.preview_status.config(text="正在读取目录列表...")
+                threading.Thread(target=self._load_preview, args=key, daemon=True).start()
+                self.master.after(POLL_INTERVAL_MS, self._poll_preview_load)
+            return
+        self._update_preview()
+
+    def _load_preview(self, source_dir: str, extensions: tuple, recursive: bool, sort: str, use_index: bool):
+        """后台线程：扫描目录，结果 (或异常) 由主线程轮询取走"""
+        try:
+            model = PreviewModel(source_dir, list(extensions), recursive,
+                                 default_index() if use_index else None, sort)
+            # 键中同时记下是否使用了索引，切换开关后重新读取
+            model.key += (use_index,)
+        except Exception as e:
+            # 除目录读取错误外，索引数据库也可能出错 (如 sqlite3.OperationalError)；
+            # 异常必须交回主线程，否则 _preview_loading 不会被清除，预览再也不会刷新
+            self._preview_result = (None, e)
+            return
+        self._preview_result = (model, None)
+
+    def _poll_preview_load(self):
+        if self._preview_result is None:
+            self.master.after(POLL_INTERVAL_MS, self._poll_preview_load)
+            return
+        model, error = self._preview_result
+        self._preview_result = None
+        self._preview_loading = None
+        if model is None:
+            self.preview_model = None
+            self._show_preview_rows(0)
+            self.preview_status.config(text=f"⚠️ 无法读取源目录: {error}")
+            return
+        self.preview_model = model
+        self.preview_top = 0
+        if not model.sorted:
+            # 先显示已选出的前几屏，完整排序留给后台线程
+            threading.Thread(target=model.sort_all, daemon=True).start()
+        # 读取期间条件可能又变了：键不一致时 refresh_preview 会重新读取
+        self.refresh_preview()
+
+    def _update_preview(self):
+        model = self.preview_model
+        mode = self.mode_var.get()
+        try:
+            model.configure(mode, self.get_config(mode))
+        except ValueError as e:
+            model.invalidate(str(e))
+
+        status = f"共 {len(model)} 个文件"
+        if model.error:
+            status += f"  ⚠️ {model.error}"
+        elif mode == 'c':
+            status += "  (模式 C 只在运行时检测重复内容)"
+        else:
+            status += "  (与输出目录重名时，执行时会追加 _N 后缀)"
+        self.preview_status.config(text=status)
+        self._show_preview_rows(self.preview_top)
+
+    def _show_preview_rows(self, top: int):
+        """改写固定数量的行控件以显示从 top 开始的行，并同步滚动条"""
+        model = self.preview_model
+        total = len(model) if model is not None else 0
+        top = max(0, min(top, total - PREVIEW_ROWS))
+        self.preview_top = top
+        rows = model.rows(top, top + PREVIEW_ROWS) if model is not None else []
+        for row in range(PREVIEW_ROWS):
+            self.preview_tree.item(str(row), values=rows[row] if row < len(rows) else ('', '', ''))
+        if total:
+            self.preview_scrollbar.set(top / total, min(top + PREVIEW_ROWS, total) / total)
+        else:
+            self.preview_scrollbar.set(0, 1)
+        if model is not None and not model.sorted and self._preview_sort_after is None:
+            # 可能显示了占位行：后台排序完成后重绘
+            self._preview_sort_after = self.master.after(POLL_INTERVAL_MS, self._poll_preview_sort, model)
+
+    def _poll_preview_sort(self, model: PreviewModel):
+        self._preview_sort_after = None
+        if model is not self.preview_model:
+            return
+        if not model.sorted:
+            self._preview_sort_after = self.master.after(POLL_INTERVAL_MS, self._poll_preview_sort, model)
+            return
+        self._show_preview_rows(self.preview_top)
+
+    def scroll_preview(self, *args):
+        """滚动条回调: ('moveto', 比例) 或 ('scroll', 步数, 'units'|'pages')"""
+        if self.preview_model is None:
+            return
+        if args[0] == 'moveto':
+            top = int(float(args[1]) * len(self.preview_model))
+        else:
+            step = int(args[1]) * (PREVIEW_ROWS if args[2] == 'pages' else 1)
+            top = self.preview_top + step
+        self._show_preview_rows(top)
+
+    def _on_preview_wheel(self, event):
+        step = -3 if event.num == 4 or event.delta > 0 else 3
+        self._show_preview_rows(self.preview_top + step)
+        return 'break'
+
     def log_message(self, message: str):
         """向日志框添加消息"""
+        self.log_messages([message])
+
+    def log_messages(self, messages: List[str]):
+        """一次性向日志框添加多条消息，只刷新一次控件；超出 MAX_LOG_LINES 的旧行被删除"""
+        if not messages:
+            return
         self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, message + "\n")
+        self.log_text.insert(tk.END, "\n".join(messages) + "\n")
+        line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+        if line_count > MAX_LOG_LINES:
+            self.log_text.delete('1.0', f"{line_count - MAX_LOG_LINES + 1}.0")
         self.log_text.see(tk.END) 
         self.log_text.config(state='disabled')
 
+    def flush_log_buffer(self):
+        """把后台线程新写入环形缓冲的日志格式化后显示；来不及显示而被覆盖的记录只提示条数"""
+        records, dropped, self.log_seq = self.log_buffer.since(self.log_seq)
+        if not records and not dropped:
+            return
+        started = time.perf_counter()
+        lines = [record.format() for record in records]
+        if dropped:
+            lines.insert(0, f"… 省略 {dropped} 条日志 (完整记录见日志文件)")
+        self.log_messages(lines)
+        if self.run_stats is not None:
+            self.run_stats.add_time('gui_log', time.perf_counter() - started)
+
     def parse_extensions_filter(self) -> List[str]:
         """
         解析扩展名筛选字符串，返回规范化的扩展名列表 (小写，带点，无重复)。
         """
-        filter_str = self.extensions_filter_var.get()
-        if not filter_str:
-            return []
-            
-        extensions = set()
-        parts = filter_str.split(',')
-        for part in parts:
-            part = part.strip().lower()
-            if not part:
-                continue
-            
-            # 去除前导的 *
-            if part.startswith('*'):
-                part = part[1:]
-            
-            # 确保以 . 开头
-            if not part.startswith('.'):
-                part = '.' + part
-                
-            if len(part) > 1: # 排除掉只剩下 '.' 的情况
-                extensions.add(part)
-                
-        return sorted(list(extensions))
+        return parse_extensions(self.extensions_filter_var.get())
 
 
     def get_config(self, mode: str) -> Dict[str, Any]:
@@ -258,12 +514,16 @@ class RenamerApp:
                     config['start_num'] = start_num
                 except ValueError:
                     raise ValueError(f"模式 B: '起始数字' 必须是整数。当前输入: {self.start_num_var.get()}")
+        elif mode == 'c':
+            config['action'] = self.duplicate_action_var.get()
+            config['hash_cache'] = str(DEFAULT_HASH_CACHE)
         return config
 
     def run_process(self):
-        """执行按钮绑定的主逻辑"""
+        """执行按钮绑定的主逻辑：校验参数后在后台线程中处理文件"""
         source_path_str = self.source_path.get()
-        output_path_str = self.output_path.get()
+        in_place = self.in_place_var.get()
+        output_path_str = source_path_str if in_place else self.output_path.get()
         current_mode = self.mode_var.get()
         
         self.log_text.config(state='normal')
@@ -277,28 +537,148 @@ class RenamerApp:
 
             if not Path(source_path_str).is_dir():
                  raise FileNotFoundError("源目录路径无效或不存在。")
+        except (ValueError, FileNotFoundError) as ve:
+            self.log_message(f"参数/路径错误: {ve}")
+            messagebox.showerror("错误", str(ve))
+            return
 
-            processor = FileProcessor(source_path_str, output_path_str, target_extensions)
-            
-            if target_extensions:
-                self.log_message(f"筛选扩展名: {', '.join(target_extensions)}")
+        if target_extensions:
+            self.log_message(f"筛选扩展名: {', '.join(target_extensions)}")
+
+        self.cancel_event.clear()
+        self.run_stats = RunStats()
+        self.log_buffer.clear()
+        self.log_seq = 0
+        self.latest_progress = None
+        log_path = DEFAULT_LOG_DIR / f"run-{datetime.now():%Y%m%d-%H%M%S}.jsonl"
+        self.progress_var.set(0)
+        self.progress_label.config(text="正在扫描源目录...")
+        self.worker_thread = threading.Thread(
+            target=self._worker,
+            args=(source_path_str, output_path_str, target_extensions, current_mode, config,
+                  self.dry_run_var.get(), self.run_stats, log_path, self.recursive_var.get(), in_place,
+                  SORT_OPTIONS[self.sort_var.get()], self.current_index()),
+            daemon=True,
+        )
+        self.run_button.config(state='disabled')
+        self.cancel_button.config(state='normal')
+        self.worker_thread.start()
+        self.master.after(POLL_INTERVAL_MS, self._poll_worker_queue)
 
+    def cancel_process(self):
+        """请求后台任务在当前文件完成后停止"""
+        if self.worker_thread is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state='disabled')
+            self.progress_label.config(text="正在取消，等待当前文件完成...")
+
+    def _worker(self, source_path_str: str, output_path_str: str, target_extensions: List[str],
+                mode: str, config: Dict[str, Any], dry_run: bool, stats: RunStats,
+                log_path: Optional[Path] = None, recursive: bool = False, in_place: bool = False,
+                sort: str = 'name', index: Optional[DirectoryIndex] = None):
+        """
+        后台线程：扫描并处理文件。
+        逐文件日志写入环形缓冲 (log_path 不为空时同时异步写入日志文件)，进度只保留最新值；
+        其余事件通过队列按顺序交给主线程。
+        """
+        put = self.worker_queue.put
+        sink: Optional[FileSink] = None
+        try:
+            processor = FileProcessor(source_path_str, output_path_str, target_extensions, stats=stats,
+                                      recursive=recursive, in_place=in_place, index=index, sort=sort)
+            put(('found', processor.total_files, mode))
             if processor.total_files == 0:
-                self.log_message("🚨 源目录下没有找到符合筛选条件的任何文件，操作中止。")
-                messagebox.showinfo("完成", "源目录下没有找到符合筛选条件的任何文件。")
                 return
 
-            self.log_message(f"共找到 {processor.total_files} 个文件，开始执行 [模式 {current_mode.upper()}]...")
-            
-            success_count = processor.process_files(current_mode, config, self.log_message)
-            
-            self.log_message(f"\n🎉 全部完成！已处理 {success_count} 个文件。")
-            self.log_message(f"📁 文件已保存至: {output_path_str}")
-            messagebox.showinfo("完成", f"文件批量处理成功！\n已处理 {success_count} 个文件。\n文件已保存至: {output_path_str}")
-            
-        except (ValueError, FileNotFoundError) as ve:
-            self.log_message(f"参数/路径错误: {ve}")
-            messagebox.showerror("错误", str(ve))
+            log_func = self.log_buffer.append
+            if log_path is not None:
+                log_path.parent.mkdir(parents=True, exist_ok=True)
+                sink = FileSink(log_path)
+                log_func = fan_out(self.log_buffer.append, sink)
+                put(('log_file', log_path))
+
+            def progress_func(done: int, total: int):
+                self.latest_progress = (done, total)
+
+            success_count = processor.process_files(
+                mode, config, log_func, dry_run=dry_run,
+                cancel_event=self.cancel_event, progress_func=progress_func,
+            )
+            put(('done', success_count, dry_run, output_path_str))
         except Exception as e:
-            self.log_message(f"致命错误: {e}")
-            messagebox.showerror("致命错误", f"处理过程中发生致命错误：{e}")
\ No newline at end of file
+            put(('error', e))
+        finally:
+            if sink is not None:
+                sink.close()
+            put(('finished',))
+
+    def _poll_worker_queue(self):
+        """主线程：读取环形缓冲中的新日志与最新进度，按顺序处理后台事件"""
+        finished = False
+
+        for _ in range(MAX_MESSAGES_PER_POLL):
+            try:
+                item = self.worker_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            # 事件入队前产生的日志都已在缓冲中，先显示它们以保持顺序
+            self.flush_log_buffer()
+            if item[0] == 'finished':
+                finished = True
+                break
+            self._handle_worker_event(item)
+
+        self.flush_log_buffer()
+        progress = self.latest_progress
+        if progress is not None:
+            done, total = progress
+            self.progress_var.set(done / total if total else 1)
+            self.progress_label.config(text=f"{done}/{total}")
+
+        if finished:
+            if self.run_stats is not None and self.run_stats.counters:
+                self.log_messages(self.run_stats.summary_lines())
+            self.worker_thread = None
+            self.cancel_button.config(state='disabled')
+            self.check_paths()
+            # 源目录内容已变化，丢弃缓存的列表
+            self.preview_model = None
+            self.schedule_preview()
+        else:
+            self.master.after(POLL_INTERVAL_MS, self._poll_worker_queue)
+
+    def _handle_worker_event(self, item: tuple):
+        """处理后台线程发来的非日志事件"""
+        kind = item[0]
+        if kind == 'found':
+            total_files, mode = item[1:]
+            if total_files == 0:
+                self.progress_label.config(text="")
+                self.log_message("🚨 源目录下没有找到符合筛选条件的任何文件，操作中止。")
+                messagebox.showinfo("完成", "源目录下没有找到符合筛选条件的任何文件。")
+            else:
+                self.log_message(f"共找到 {total_files} 个文件，开始执行 [模式 {mode.upper()}]...")
+
+        elif kind == 'log_file':
+            self.log_message(f"🗒️ 完整日志写入: {item[1]}")
+
+        elif kind == 'done':
+            success_count, dry_run, output_path_str = item[1:]
+            if dry_run:
+                self.log_message(f"\n🔍 预演完成！共 {success_count} 个文件可处理，未移动任何文件。")
+            elif self.cancel_event.is_set():
+                self.log_message(f"\n⏹️ 已取消！已处理 {success_count} 个文件。")
+            else:
+                self.log_message(f"\n🎉 全部完成！已处理 {success_count} 个文件。")
+                self.log_message(f"📁 文件已保存至: {output_path_str}")
+                messagebox.showinfo("完成", f"文件批量处理成功！\n已处理 {success_count} 个文件。\n文件已保存至: {output_path_str}")
+
+        elif kind == 'error':
+            e = item[1]
+            if isinstance(e, (ValueError, FileNotFoundError)):
+                self.log_message(f"参数/路径错误: {e}")
+                messagebox.showerror("错误", str(e))
+            else:
+                self.log_message(f"致命错误: {e}")
+                messagebox.showerror("致命错误", f"处理过程中发生致命错误：{e}")
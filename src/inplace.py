@@ -0,0 +1,100 @@
+# src/inplace.py
+
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .utils import NameRegistry
+
+# --- 原地改名的安全执行顺序 ---
+#
+# 原地改名时，一个文件的新名字可能正是另一个待改名文件的当前名字 (a→b, b→c) 甚至构成循环 (a→b, b→a)。
+# 目标名互不相同，因此每个改名最多被一个改名"挡住" (目标名的当前占用者)，也最多挡住一个改名：
+# 依赖图只由互不相交的链和环组成。
+#   链：从目标名空闲的一端开始，依次执行即可，无需临时名；
+#   环：先把环中一个文件改为临时名腾出位置，沿环执行其余改名，最后把临时名改为最终名。
+
+
+class RenameStep(NamedTuple):
+    """
+    一步改名。final 为 False 表示为打破循环而改成临时名，文件稍后还会再改名一次。
+    """
+    index: int
+    source: Path
+    destination: Path
+    final: bool = True
+
+
+class TempNamer:
+    """
+    为打破循环分配临时路径 (与原文件同目录，形如 '.原名.swap')。
+    临时名不与目录中现有的文件重名，也不与 reserved 中任何计划的目标名重名。
+    """
+
+    def __init__(self, reserved: Iterable[Path] = ()):
+        self._reserved: Dict[Path, List[str]] = defaultdict(list)
+        for path in reserved:
+            self._reserved[path.parent].append(path.name)
+        self._registries: Dict[Path, NameRegistry] = {}
+
+    def __call__(self, source: Path) -> Path:
+        folder = source.parent
+        registry = self._registries.get(folder)
+        if registry is None:
+            registry = self._registries[folder] = NameRegistry(folder)
+            for name in self._reserved.pop(folder, ()):
+                registry.add(name)
+        return registry.reserve_path(f".{source.name}.swap")
+
+
+def schedule_renames(moves: Sequence[Tuple[int, Path, Path]],
+                     temp_path: Callable[[Path], Path]) -> List[List[RenameStep]]:
+    """
+    为一组改名 (序号, 原路径, 新路径) 安排不会覆盖任何文件的执行顺序。
+
+    返回按顺序执行的分组，每组是一条链或一个环：组内必须按顺序执行，组与组之间互不依赖
+    (可在组的边界安全地停止)。temp_path(原路径) 返回用于打破循环的空闲临时路径。
+    路径按 os.path.normcase 比较，因此只改大小写的文件名 (Windows) 也会经临时名完成。
+    """
+    def key(path: Path) -> str:
+        return os.path.normcase(str(path))
+
+    by_source: Dict[str, int] = {key(src): n for n, (_, src, _) in enumerate(moves)}
+    # blocker[n]: 当前占用第 n 个改名目标名的改名；waiter[m]: 等待第 m 个改名腾出位置的改名
+    blocker: List[Optional[int]] = [by_source.get(key(dst)) for _, _, dst in moves]
+    waiter: Dict[int, int] = {b: n for n, b in enumerate(blocker) if b is not None}
+    emitted = [False] * len(moves)
+    groups: List[List[RenameStep]] = []
+
+    # --- 链：从目标名空闲的改名开始，沿 waiter 依次执行 ---
+    for n in range(len(moves)):
+        if blocker[n] is not None or emitted[n]:
+            continue
+        group: List[RenameStep] = []
+        k: Optional[int] = n
+        while k is not None:
+            index, src, dst = moves[k]
+            group.append(RenameStep(index, src, dst))
+            emitted[k] = True
+            k = waiter.get(k)
+        groups.append(group)
+
+    # --- 环：剩余的改名都在环上，每个环只需一个临时名 ---
+    for n in range(len(moves)):
+        if emitted[n]:
+            continue
+        index, src, dst = moves[n]
+        temp = temp_path(src)
+        group = [RenameStep(index, src, temp, False)]
+        emitted[n] = True
+        k = waiter[n]
+        while k != n:
+            k_index, k_src, k_dst = moves[k]
+            group.append(RenameStep(k_index, k_src, k_dst))
+            emitted[k] = True
+            k = waiter[k]
+        group.append(RenameStep(index, temp, dst))
+        groups.append(group)
+
+    return groups
@@ -0,0 +1,274 @@
+# src/journal.py
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from .utils import atomic_move, finish_interrupted_move
+from .inplace import TempNamer, schedule_renames
+from .logsink import LogFunc, LogRecord
+
+# --- 可恢复的任务日志 (JSON lines，只追加写入) ---
+#
+# 文件结构：
+#   {"type": "header", ...}               任务元数据 (源/输出目录、模式、配置、总数)
+#   {"type": "op", "i": 0, ...}           改名计划，每个文件一行
+#   {"type": "plan_end"}                  计划写入完整的标记
+#   {"type": "staged", "i": 0, "tmp": ...} 原地改名时为打破循环而暂时改成的临时名
+#   {"type": "done", "i": 0, "dst": ...}  已完成的移动
+#   {"type": "undone", "i": 0}            已撤销的移动
+
+JOURNAL_VERSION = 1
+
+
+class JournalState(NamedTuple):
+    """从日志文件读取的任务状态"""
+    header: Dict[str, Any]
+    ops: List[Dict[str, Any]]
+    done: Dict[int, str]
+    complete_plan: bool
+    # 已改为临时名、尚未到达最终名的文件 (原地改名)
+    staged: Dict[int, str]
+
+
+class JobJournal:
+    """
+    任务日志写入器。计划整体写入后立即 fsync；完成记录先进入缓冲区，
+    每 sync_every 条或每 sync_interval 秒批量 fsync 一次，兼顾崩溃安全与吞吐。
+    """
+
+    def __init__(self, path: Path, sync_every: int = 256, sync_interval: float = 2.0):
+        self.path = Path(path)
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        _repair_tail(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8', buffering=1024 * 1024)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+
+    def sync(self) -> None:
+        """把缓冲区写入磁盘并 fsync"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def write_plan(self, header: Dict[str, Any], plan: Iterable[Any], total: Optional[int] = None) -> None:
+        """
+        写入任务元数据与完整计划 (RenameOp 列表或迭代器；为迭代器时需给出 total)。
+        header['recursive'] 为真时 src/dst 记录相对于源/输出目录的路径，否则只记录文件名。
+        """
+        if total is None:
+            total = len(plan)
+        self._write(dict(header, type='header', version=JOURNAL_VERSION, total=total))
+        recursive = bool(header.get('recursive'))
+        source_folder = Path(header['source'])
+        output_folder = Path(header['output'])
+        for index, op in enumerate(plan):
+            src = str(op.source.relative_to(source_folder)) if recursive else op.source.name
+            record: Dict[str, Any] = {'type': 'op', 'i': index, 'src': src, 'reason': op.reason}
+            if op.destination is not None:
+                if recursive:
+                    record['dst'] = str(op.destination.relative_to(output_folder))
+                else:
+                    record['dst'] = op.destination.name
+            if op.detail:
+                record['detail'] = op.detail
+            self._write(record)
+        self._write({'type': 'plan_end'})
+        self.sync()
+
+    def record_done(self, index: int, dst_name: str) -> None:
+        """记录一个已完成的移动 (实际目标名可能因外部抢占而与计划不同)"""
+        self._write({'type': 'done', 'i': index, 'dst': dst_name})
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def record_staged(self, index: int, tmp_name: str) -> None:
+        """记录文件已暂时改为临时名；崩溃后续跑或撤销时据此找到文件。立即 fsync。"""
+        self._write({'type': 'staged', 'i': index, 'tmp': tmp_name})
+        self.sync()
+
+    def record_undone(self, index: int) -> None:
+        self._write({'type': 'undone', 'i': index})
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self) -> 'JobJournal':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _repair_tail(path: Path) -> None:
+    """崩溃可能在末尾留下半行记录，继续追加前将其截断，避免与新记录粘连"""
+    if not path.exists():
+        return
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # 从末尾向前查找最后一个换行符
+        pos = size
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                f.truncate(pos + newline + 1)
+                return
+        f.truncate(0)
+
+
+def load_journal(path: Path, with_ops: bool = True) -> JournalState:
+    """
+    读取日志文件。崩溃时可能残留一行不完整的记录，读到它即停止。
+    with_ops=False 时不保留计划记录 (ops 为空)，续跑时改用 iter_ops 流式读取计划。
+    """
+    header: Dict[str, Any] = {}
+    ops: List[Dict[str, Any]] = []
+    done: Dict[int, str] = {}
+    staged: Dict[int, str] = {}
+    complete_plan = False
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+
+            kind = record.get('type')
+            if kind == 'op':
+                if with_ops:
+                    ops.append(record)
+            elif kind == 'done':
+                done[record['i']] = record['dst']
+                staged.pop(record['i'], None)
+            elif kind == 'staged':
+                # 文件此刻位于临时名 (前进时尚未到达新名，撤销时尚未回到原名)
+                staged[record['i']] = record['tmp']
+                done.pop(record['i'], None)
+            elif kind == 'undone':
+                done.pop(record['i'], None)
+                staged.pop(record['i'], None)
+            elif kind == 'plan_end':
+                complete_plan = True
+            elif kind == 'header':
+                header = record
+
+    return JournalState(header, ops, done, complete_plan, staged)
+
+
+def iter_ops(path: Path) -> Iterator[Dict[str, Any]]:
+    """按顺序流式读取日志中的计划记录，读到 plan_end 为止"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            kind = record.get('type')
+            if kind == 'op':
+                yield record
+            elif kind == 'plan_end':
+                return
+
+
+def _undo_move(src: Path, dst: Path) -> None:
+    """撤销一次移动；上次撤销在建立硬链接与删除源文件之间中断时，原名上的硬链接由撤销建立，补完删除即可"""
+    try:
+        atomic_move(src, dst)
+    except FileExistsError:
+        if not finish_interrupted_move(src, dst):
+            raise
+
+
+def undo_journal(path: Path, log_func: LogFunc) -> int:
+    """
+    按日志批量撤销已完成的移动：倒序把文件移回源目录的原名 (不覆盖已存在的文件)。
+    返回成功撤销的文件数。
+    """
+    state = load_journal(path)
+    if not state.header:
+        raise ValueError(f"无效的任务日志: {path}")
+
+    source_folder = Path(state.header['source'])
+    output_folder = Path(state.header['output'])
+    src_names = {op['i']: op['src'] for op in state.ops}
+    if state.header.get('in_place'):
+        return _undo_in_place(path, state, src_names, log_func)
+    undone_count = 0
+
+    with JobJournal(path) as journal:
+        for index in sorted(state.done, reverse=True):
+            src_name = src_names[index]
+            dst_name = state.done[index]
+            try:
+                _undo_move(output_folder / dst_name, source_folder / src_name)
+            except Exception as e:
+                log_func(LogRecord('error', 'undo_failed', index, old_name=dst_name, error=str(e)))
+                continue
+            journal.record_undone(index)
+            log_func(LogRecord('info', 'undo', index, old_name=dst_name, new_name=src_name))
+            undone_count += 1
+
+    return undone_count
+
+
+def _undo_in_place(path: Path, state: JournalState, src_names: Dict[int, str], log_func: LogFunc) -> int:
+    """
+    撤销原地改名：把文件改回原名 (包括停留在临时名上的文件)。
+    撤销本身也可能构成链或环 (例如撤销 a↔b 的互换)，因此同样按依赖顺序执行。
+    """
+    folder = Path(state.header['source'])
+    moves = [(index, folder / dst_name, folder / src_names[index]) for index, dst_name in state.done.items()]
+    moves += [(index, folder / tmp_name, folder / src_names[index]) for index, tmp_name in state.staged.items()]
+    moves.sort(key=lambda move: move[0], reverse=True)
+    groups = schedule_renames(moves, TempNamer(dst for _, _, dst in moves))
+    # 日志中显示撤销前的名字，而不是中途使用的临时名
+    current_names = {index: str(src.relative_to(folder)) for index, src, _ in moves}
+    undone_count = 0
+
+    with JobJournal(path) as journal:
+        for group in groups:
+            failed = set()
+            for step in group:
+                if step.index in failed:
+                    continue
+                old_name = current_names[step.index]
+                try:
+                    _undo_move(step.source, step.destination)
+                except Exception as e:
+                    failed.add(step.index)
+                    log_func(LogRecord('error', 'undo_failed', step.index, old_name=old_name, error=str(e)))
+                    continue
+                if not step.final:
+                    # 与前进时相同：立即记录临时名，撤销中途崩溃后仍能找到该文件
+                    journal.record_staged(step.index, str(step.destination.relative_to(folder)))
+                    continue
+                journal.record_undone(step.index)
+                log_func(LogRecord('info', 'undo', step.index, old_name=old_name,
+                                   new_name=str(step.destination.relative_to(folder))))
+                undone_count += 1
+
+    return undone_count
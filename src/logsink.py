@@ -0,0 +1,199 @@
+# src/logsink.py
+
+import csv
+import io
+import json
+import threading
+from collections import deque
+from pathlib import Path
+from queue import SimpleQueue
+from typing import Callable, Deque, List, NamedTuple, Tuple
+
+# --- 结构化日志记录与输出端 ---
+#
+# 处理过程只构造轻量的 LogRecord 元组，不做字符串格式化；
+# 只有真正显示在界面上的记录才调用 format() 生成文本。
+
+# GUI 每次运行的完整日志默认保存位置
+DEFAULT_LOG_DIR = Path.home() / ".files_tools" / "logs"
+
+class LogRecord(NamedTuple):
+    """
+    一条结构化日志。
+
+    level: 'info' | 'warning' | 'error'
+    event: 'rename' (改名), 'archive' (归档), 'duplicate_skip' (跳过重复), 'duplicate_tag' (标记重复),
+           'stage' (原地改名时为打破循环暂时改为临时名),
+           'failed' (处理失败), 'undo' (撤销), 'undo_failed' (撤销失败), 'message' (一般消息)
+    index: 文件序号 (从 0 开始)，与文件无关的消息为 -1
+    job: 多任务调度时所属任务的标签，单任务运行为空
+    """
+    level: str
+    event: str
+    index: int = -1
+    total: int = 0
+    old_name: str = ''
+    new_name: str = ''
+    error: str = ''
+    message: str = ''
+    dry_run: bool = False
+    job: str = ''
+
+    def format(self) -> str:
+        """生成与旧版日志一致的显示文本 (多任务时前缀任务标签)"""
+        text = self._format_text()
+        return f"[{self.job}] {text}" if self.job else text
+
+    def _format_text(self) -> str:
+        prefix = "🔍 [预演] " if self.dry_run else ""
+        position = f"[{self.index + 1}/{self.total}]"
+        event = self.event
+        if event == 'rename':
+            return f"{prefix}✅ {position} 改名: {self.old_name} -> {self.new_name}"
+        if event == 'archive':
+            return f"{prefix}📦 {position} 归档: {self.old_name} (未触发改名)"
+        if event == 'duplicate_skip':
+            return f"{prefix}⏭️ {position} 跳过重复: {self.old_name} ({self.message})"
+        if event == 'duplicate_tag':
+            return f"{prefix}🏷️ {position} 标记重复: {self.old_name} -> {self.new_name} ({self.message})"
+        if event == 'stage':
+            return f"{prefix}🔁 {position} 临时改名 (打破循环): {self.old_name} -> {self.new_name}"
+        if event == 'failed':
+            return f"❌ 处理失败: {self.old_name}, 错误: {self.error}"
+        if event == 'undo':
+            return f"↩️ 已撤销: {self.old_name} -> {self.new_name}"
+        if event == 'undo_failed':
+            return f"❌ 撤销失败: {self.old_name}, 错误: {self.error}"
+        return self.message
+
+    def __str__(self) -> str:
+        return self.format()
+
+
+LogFunc = Callable[[LogRecord], None]
+
+
+def message(text: str, level: str = 'info') -> LogRecord:
+    """构造与具体文件无关的一般消息"""
+    return LogRecord(level, 'message', message=text)
+
+
+def fan_out(*sinks: LogFunc) -> LogFunc:
+    """把同一条记录依次交给多个输出端"""
+    def emit(record: LogRecord) -> None:
+        for sink in sinks:
+            sink(record)
+    return emit
+
+
+class RingBuffer:
+    """
+    容量固定的内存环形缓冲区，供界面显示最近的日志。
+
+    append 可在工作线程中调用 (deque 的 append 是线程安全的)；
+    界面按序号增量读取，写入过快时最旧的记录被丢弃，只报告丢弃的条数。
+    """
+
+    def __init__(self, capacity: int = 5000):
+        self.capacity = capacity
+        self._records: Deque[LogRecord] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        # 累计写入的记录数，也是下一条记录的序号
+        self.count = 0
+
+    def __call__(self, record: LogRecord) -> None:
+        self.append(record)
+
+    def append(self, record: LogRecord) -> None:
+        with self._lock:
+            self._records.append(record)
+            self.count += 1
+
+    def since(self, seq: int) -> Tuple[List[LogRecord], int, int]:
+        """
+        返回 (序号 >= seq 且仍在缓冲区中的记录, 因溢出而丢失的条数, 新的读取位置)。
+        """
+        with self._lock:
+            count = self.count
+            available = len(self._records)
+            first_seq = count - available
+            start = max(seq, first_seq)
+            records = list(self._records)[start - first_seq:] if start < count else []
+        return records, start - seq, count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self.count = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+CSV_FIELDS = list(LogRecord._fields)
+
+
+class FileSink:
+    """
+    异步、块缓冲的日志文件输出端 (JSON lines 或 CSV)，保存完整的审计记录。
+
+    调用方只把记录放入队列；后台线程批量序列化并写入大块缓冲的文件，
+    因此不会拖慢处理文件的热循环。
+    """
+
+    def __init__(self, path: Path, fmt: str = 'jsonl', buffer_size: int = 1024 * 1024):
+        if fmt not in ('jsonl', 'csv'):
+            raise ValueError(f"不支持的日志格式: {fmt}")
+        self.path = Path(path)
+        self.fmt = fmt
+        self._queue: "SimpleQueue" = SimpleQueue()
+        self._file = open(self.path, 'a', encoding='utf-8', newline='', buffering=buffer_size)
+        if fmt == 'csv' and self._file.tell() == 0:
+            csv.writer(self._file).writerow(CSV_FIELDS)
+        self._thread = threading.Thread(target=self._writer, name="log-file-sink", daemon=True)
+        self._thread.start()
+
+    def __call__(self, record: LogRecord) -> None:
+        self._queue.put(record)
+
+    def _writer(self) -> None:
+        out = io.StringIO()
+        writer = csv.writer(out) if self.fmt == 'csv' else None
+        while True:
+            record = self._queue.get()
+            stop = record is None
+            batch = [] if stop else [record]
+            # 取出当前已排队的全部记录，一次性写入
+            while not stop and not self._queue.empty():
+                item = self._queue.get()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            for item in batch:
+                if writer is not None:
+                    writer.writerow(item)
+                else:
+                    out.write(json.dumps(item._asdict(), ensure_ascii=False))
+                    out.write("\n")
+            if batch:
+                self._file.write(out.getvalue())
+                out.seek(0)
+                out.truncate()
+            if stop:
+                break
+
+    def close(self) -> None:
+        """写完队列中剩余的记录后关闭文件"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self) -> 'FileSink':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
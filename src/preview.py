@@ -0,0 +1,139 @@
+# src/preview.py
+
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .dirindex import DirectoryIndex
+from .filetable import FileTable
+from .rules import NamePipeline, compile_rules, rules_for_mode, rules_use_file_stats
+from .scanner import FileRecord
+from .sorting import DEFAULT_SORT, sort_order, sort_uses_file_stats, top_order
+
+# --- 改名预览 ---
+#
+# 目录只在打开预览 (或源目录/筛选条件/排序方式变化) 时扫描一次；
+# 修改参数只重新编译规则，新文件名按需逐行计算，界面只请求当前可见的行。
+# 界面线程从不排序：读取目录的后台线程先用堆选出前几屏，界面显示后再在后台完整排序，
+# 排序完成前滚动到更后面的行只显示占位文字。
+# 排序方式不依赖大小/修改时间时扫描不 stat 文件；规则需要文件大小时只对可见的行按需 stat。
+
+# 预览行: (序号, 原文件名, 新文件名)
+PreviewRow = Tuple[int, str, str]
+
+# 打开预览时先选出的行数
+TOP_N_MIN = 256
+# 总行数不超过 TOP_N_MIN 的这个倍数时，直接完整排序比堆选择更快
+TOP_N_FULL_RATIO = 8
+# 尚未排序到的行显示的占位文字
+SORTING_PLACEHOLDER = "正在排序..."
+
+
+class PreviewModel:
+    """
+    基于一次目录扫描的改名预览数据源。
+
+    文件顺序与 FileProcessor 相同，序号位数由总文件数决定，因此预览的新文件名与实际运行一致；
+    与输出目录已有文件重名时追加的 _N 后缀只在执行时分配，不在预览中体现。
+    """
+
+    def __init__(self, folder: str, extensions: List[str], recursive: bool = False,
+                 index: Optional[DirectoryIndex] = None, sort: str = DEFAULT_SORT):
+        self.folder = Path(folder)
+        self.key = (str(folder), tuple(extensions), recursive, sort)
+        # 保持发现顺序，不做全量排序；排序键每行只计算一次。
+        # 按大小/时间排序时重新 stat 取自索引缓存的文件，否则完全不 stat
+        uses_stats = sort_uses_file_stats(sort)
+        self.records = FileTable.scan(self.folder, extensions, recursive=recursive, index=index, sort=None,
+                                      restat=uses_stats, stat_files=uses_stats)
+        self._keys, self._descending = self.records.sort_keys(sort)
+        # 已确定的前若干行: 处理顺序中的位置 -> records 中的下标 (sort_all 完成后为全部行)
+        total = len(self.records)
+        if total <= TOP_N_MIN * TOP_N_FULL_RATIO:
+            self._order: List[int] = sort_order(self._keys, self._descending)
+        else:
+            self._order = top_order(self._keys, TOP_N_MIN, self._descending)
+        self.error = ''
+        self._build_name: Optional[NamePipeline] = None
+        # 规则需要文件大小而扫描时没有 stat (或取自索引) 时，显示前 stat 该行
+        self._stat_rows = False
+        self._cache: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def sorted(self) -> bool:
+        """是否已完整排序 (否则只有前 TOP_N_MIN 行可以显示)"""
+        return len(self._order) == len(self.records)
+
+    def sort_all(self) -> None:
+        """完整排序。耗时与文件数成正比，由后台线程调用；完成后一次性替换行顺序"""
+        if not self.sorted:
+            self._order = sort_order(self._keys, self._descending)
+
+    def _record(self, position: int) -> Optional[FileRecord]:
+        """处理顺序中第 position 个文件；尚未排序到该位置时返回 None"""
+        order = self._order
+        if position >= len(order):
+            return None
+        record = self.records[order[position]]
+        if self._stat_rows:
+            try:
+                st = os.stat(self.folder / record.relpath)
+            except OSError:
+                return record
+            record = record._replace(size=st.st_size, mtime=st.st_mtime)
+        return record
+
+    def configure(self, mode: str, config: Dict[str, Any]) -> None:
+        """按新的模式参数重新编译规则，并丢弃已计算的行"""
+        try:
+            rules = rules_for_mode(mode, config)
+            self._build_name = compile_rules(rules, len(self.records))
+            self._stat_rows = self.records.stale_stats and rules_use_file_stats(rules)
+            self.error = ''
+        except KeyError as e:
+            self.invalidate(f"模式 {mode.upper()}: 缺少参数 {e}")
+            return
+        except ValueError as e:
+            self.invalidate(str(e))
+            return
+        self._cache.clear()
+
+    def invalidate(self, error: str) -> None:
+        """参数无效：只显示原文件名"""
+        self._build_name = None
+        self.error = error
+        self._cache.clear()
+
+    def new_name(self, index: int, record: Optional[FileRecord] = None) -> str:
+        if self._build_name is None:
+            return ''
+        name = self._cache.get(index)
+        if name is None:
+            if record is None:
+                record = self._record(index)
+                if record is None:
+                    return ''
+            try:
+                name = self._build_name(record, index)
+            except Exception as e:
+                name = f"❌ {e}"
+            self._cache[index] = name
+        return name
+
+    def rows(self, start: int, stop: int) -> List[PreviewRow]:
+        """只计算 [start, stop) 范围内的行；递归扫描时显示相对路径；尚未排序到的行显示占位文字"""
+        stop = min(stop, len(self.records))
+        rows: List[PreviewRow] = []
+        for index in range(max(start, 0), stop):
+            record = self._record(index)
+            if record is None:
+                rows.append((index + 1, SORTING_PLACEHOLDER, ''))
+                continue
+            new_name = self.new_name(index, record)
+            if record.rel_dir and new_name:
+                new_name = os.path.join(record.rel_dir, new_name)
+            rows.append((index + 1, record.relpath, new_name))
+        return rows
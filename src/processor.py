@@ -1,98 +1,596 @@
 # src/processor.py
 
+import os
+import threading
+import time
+from collections import deque
 from pathlib import Path
-import shutil
-from typing import Callable, Dict, Any, List
+from typing import Callable, Deque, Dict, Any, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 # 从 utils 模块导入需要的辅助函数
-from .utils import format_file_size, get_unique_path, case_insensitive_replace 
+from .utils import NameRegistry, finish_interrupted_move, format_size
+from .filetable import FileTable
+from .dirindex import DirectoryIndex
+from .executor import MoveExecutor, MoveResult, MoveTask, move_file
+from .journal import JobJournal, JournalState, iter_ops, load_journal
+from .rules import NamePipeline, compile_rules, rules_for_mode, rules_use_file_stats
+from .dedupe import HashCache, find_duplicates
+from .stats import RunStats
+from .inplace import TempNamer, schedule_renames
+from .sorting import DEFAULT_SORT, parse_sort, sort_uses_file_stats
+from .logsink import LogFunc, LogRecord, message
+
+# --- 改名计划 ---
+
+class RenameOp(NamedTuple):
+    """
+    改名计划中的一项操作。
+
+    reason: 'rename' (改名), 'archive' (原名归档), 'conflict' (因重名追加了后缀), 'error' (无法生成新名),
+            'duplicate' (内容重复：destination 为 None 时跳过不移动，否则按标记后的名字移动)
+    """
+    source: Path
+    destination: Optional[Path]
+    reason: str
+    detail: str = ''
+
+def _already_moved(source: Path, destination: Path) -> bool:
+    """
+    续跑时判断一次移动是否已在上次完成：源文件已不存在而目标已存在。
+    完成记录批量 fsync，崩溃时最后一批记录可能未写入磁盘，但对应的移动已经发生。
+    上次在建立硬链接之后、删除源文件之前中断时，目标是本任务建立的硬链接，在这里补完删除。
+    """
+    if not os.path.lexists(source):
+        return os.path.lexists(destination)
+    return finish_interrupted_move(source, destination)
 
 # --- 文件处理器类 (封装核心逻辑) ---
 
 class FileProcessor:
-    def __init__(self, source_folder: str, output_folder: str, extensions: List[str]):
+    def __init__(self, source_folder: str, output_folder: Optional[str], extensions: List[str],
+                 stats: Optional[RunStats] = None, recursive: bool = False, in_place: bool = False,
+                 files: Optional[FileTable] = None, index: Optional[DirectoryIndex] = None,
+                 sort: str = DEFAULT_SORT, registry: Optional[NameRegistry] = None):
         self.source_folder = Path(source_folder)
-        self.output_folder = Path(output_folder)
+        # 原地改名：文件留在源目录中只改名字，输出目录即源目录 (忽略 output_folder)
+        self.in_place = in_place
+        self.output_folder = self.source_folder if in_place else Path(output_folder)
         self.extensions = extensions 
-        
-        # 确保输出目录存在
-        if not self.output_folder.exists():
-            self.output_folder.mkdir(parents=True)
-
-        def is_target_file(f: Path) -> bool:
-            if not f.is_file():
-                return False
-            if not self.extensions: 
-                return True
-            
-            file_ext = f.suffix.lower() 
-            return file_ext in self.extensions
-
-        self.files: List[Path] = sorted([f for f in self.source_folder.iterdir() if is_target_file(f)], key=lambda x: x.name)
+        # 递归处理子目录，并在输出目录中保持相同的相对目录结构
+        self.recursive = recursive
+        # 分阶段计时与计数 (可由调用方传入以挂接钩子)
+        self.stats = stats if stats is not None else RunStats()
+        # 目录索引：源目录的发现与输出目录的名字登记都复用其中的目录列表
+        self.index = index
+        # 输出目录顶层的名字登记表：为空时规划时读取目录；监视模式跨批复用同一个，由调用方与目录保持同步
+        self.registry = registry
+        # 处理顺序 (决定序号)：'name'、'natural'、'mtime'、'size'，前缀 '-' 为降序
+        parse_sort(sort)
+        self.sort = sort
+
+        # 一次 scandir 完成发现，每个文件只 stat 一次，按排序键排序 (递归时先按子目录)；
+        # 结果存入紧凑的列式文件表，百万级文件也只占用少量内存。
+        # files 不为空时直接处理调用方给出的文件 (例如监视模式中已稳定的一批新文件)，不再扫描
+        # 目录索引只提供文件名；取自缓存的大小与修改时间可能已过期，排序或命名用到它们时重新 stat 这些文件
+        restat = index is not None and sort_uses_file_stats(sort)
+        if files is not None:
+            self.files = files
+        else:
+            with self.stats.phase('discovery'):
+                exclude = [self.output_folder] if recursive and not in_place else []
+                self.files = FileTable.scan(self.source_folder, self.extensions, self.stats,
+                                            recursive=recursive, exclude=exclude, index=index, sort=sort,
+                                            restat=restat)
         self.total_files = len(self.files)
+        # process_files 之后：计划中的文件总数，以及续跑时任务日志中已在上次运行完成的文件数
+        self.planned_total = self.total_files
+        self.resumed_done = 0
 
-    def process_files(self, mode: str, config: Dict[str, Any], log_func: Callable[[str], None]) -> int:
-        """主处理函数，根据模式和配置执行操作"""
-        if not self.files:
-            return 0
+    def plan(self, mode: str, config: Dict[str, Any]) -> List[RenameOp]:
+        """
+        第一阶段：纯内存计算改名计划，不对文件系统做任何写入。
+        冲突后缀基于输出目录的当前列表分配，与实际执行时的结果一致。
+        """
+        with self.stats.phase('plan'):
+            return list(self._plan(mode, config))
 
-        success_count = 0
-        sequence_counter = config.get('start_num', 1) 
-        
-        for index, src_file in enumerate(self.files):
+    def iter_plan(self, mode: str, config: Dict[str, Any]) -> Iterator[RenameOp]:
+        """
+        与 plan 相同，但逐项生成计划而不保留完整列表，配合 execute 流式执行时内存占用与文件数无关。
+        参数错误在调用时立即抛出 ValueError；各项的生成与执行交替进行，耗时计入 execute 阶段。
+        """
+        with self.stats.phase('plan'):
+            return self._plan(mode, config)
+
+    def _plan(self, mode: str, config: Dict[str, Any]) -> Iterator[RenameOp]:
+        try:
+            # 模式 A/B 与自定义规则链统一编译为单个改名函数，每次运行只编译一次
+            rules = rules_for_mode(mode, config)
+            build_name = compile_rules(rules, self.total_files)
+        except KeyError as e:
+            raise ValueError(f"模式 {mode.upper()}: 缺少参数 {e}")
+
+        # 按大小命名与去重 (哈希缓存以大小和修改时间判断失效) 不能使用索引中可能过期的值
+        if self.files.stale_stats and (mode == 'c' or rules_use_file_stats(rules)):
+            with self.stats.phase('discovery'):
+                self.files.refresh_stats(self.source_folder, self.stats)
+
+        # 模式 C: 先找出内容重复的文件，action 为 'skip' (跳过) 或 'tag' (文件名加 _dup 标记)
+        duplicates: Dict[int, int] = {}
+        duplicate_action = config.get('action', 'skip')
+        if mode == 'c':
+            if duplicate_action not in ('skip', 'tag'):
+                raise ValueError(f"模式 C: 未知的重复文件处理方式 {duplicate_action!r}")
+            cache_path = config.get('hash_cache')
+            cache = HashCache(Path(cache_path)) if cache_path else None
             try:
-                old_name = src_file.name
-                current_stem = src_file.stem
-                current_suffix = src_file.suffix
-                new_name = old_name 
-                
-                # --- 根据模式生成新文件名 ---
-                if mode == 'a': # 模式 A: 字符替换/删除
-                    target = config['target']
-                    replace_with = config['replace']
-                    scope = config['scope']
-                    new_stem = current_stem
-                    new_suffix = current_suffix
-
-                    if scope in ['1', '3']: 
-                        new_stem = case_insensitive_replace(current_stem, target, replace_with)
-                    if scope in ['2', '3']: 
-                        new_suffix = case_insensitive_replace(current_suffix, target, replace_with)
-                        
-                    new_name = f"{new_stem}{new_suffix}"
-                
-                elif mode == 'b': # 模式 B: 重新命名 (大小/序列)
-                    if config['type'] == 'size':
-                        size_str = format_file_size(src_file)
-                        new_name = f"{size_str}{current_suffix}" 
-                        
-                    elif config['type'] == 'sequence':
-                        current_num = sequence_counter + index
-                        padding = len(str(self.total_files + sequence_counter - 1))
-                        num_str = str(current_num).zfill(padding)
-                        new_name = f"{num_str}_{current_stem}{current_suffix}"
-                
+                with self.stats.phase('dedupe'):
+                    duplicates = find_duplicates(self.source_folder, self.files, cache)
+            finally:
+                if cache is not None:
+                    cache.close()
+
+        return self._generate_plan(build_name, duplicates, duplicate_action)
+
+    def _generate_plan(self, build_name: NamePipeline, duplicates: Dict[int, int],
+                       duplicate_action: str) -> Iterator[RenameOp]:
+        # 每个输出 (子) 目录只读取一次列表，之后在内存中分配唯一文件名
+        registries: Dict[str, NameRegistry] = {}
+        if self.registry is not None:
+            registries[''] = self.registry
+        initial_probes = sum(registry.probes for registry in registries.values())
+
+        def registry_for(rel_dir: str) -> NameRegistry:
+            registry = registries.get(rel_dir)
+            if registry is None:
+                registry = registries[rel_dir] = NameRegistry(self.output_folder / rel_dir,
+                                                              self._output_names(self.output_folder / rel_dir))
+            return registry
+
+        # 原地改名：先算出全部新名字，即将改走的文件不再占用原名 (出错或跳过的重复文件仍留在原名上)，
+        # 这样链式改名 (a→b, b→c) 与互换不会被误判为冲突
+        new_names: Optional[List[Any]] = None
+        if self.in_place:
+            new_names = []
+            for index, record in enumerate(self.files):
+                try:
+                    planned: Any = build_name(record, index)
+                except Exception as e:
+                    planned = e
+                new_names.append(planned)
+                if not isinstance(planned, Exception) and not (index in duplicates and duplicate_action == 'skip'):
+                    registry_for(record.rel_dir).discard(record.name)
+
+        try:
+            for index, record in enumerate(self.files):
+                src_file = self.source_folder / record.relpath
+                registry = registry_for(record.rel_dir)
+                if new_names is not None:
+                    new_name = new_names[index]
+                    if isinstance(new_name, Exception):
+                        yield RenameOp(src_file, None, 'error', str(new_name))
+                        continue
                 else:
-                    log_func(f"❌ 未知模式: {mode}")
+                    try:
+                        new_name = build_name(record, index)
+                    except Exception as e:
+                        yield RenameOp(src_file, None, 'error', str(e))
+                        continue
+
+                if index in duplicates:
+                    detail = f"与 {self.files[duplicates[index]].relpath} 内容相同"
+                    if duplicate_action == 'skip':
+                        yield RenameOp(src_file, None, 'duplicate', detail)
+                        continue
+                    new_path = Path(new_name)
+                    yield RenameOp(src_file, registry.reserve_path(f"{new_path.stem}_dup{new_path.suffix}"),
+                                   'duplicate', detail)
                     continue
 
-                # --- 执行文件移动和重命名 ---
-                dest_path = self.output_folder / new_name
-                final_dest_path = get_unique_path(dest_path)
-                
-                shutil.move(str(src_file), str(final_dest_path))
-                
-                # 记录操作日志
-                if old_name != final_dest_path.name:
-                    log_msg = f"✅ [{index+1}/{self.total_files}] 改名: {old_name} -> {final_dest_path.name}"
+                final_dest_path = registry.reserve_path(new_name)
+                if final_dest_path.name != new_name:
+                    reason = 'conflict'
+                elif new_name != record.name:
+                    reason = 'rename'
                 else:
-                    log_msg = f"📦 [{index+1}/{self.total_files}] 归档: {old_name} (未触发改名)"
-                
-                log_func(log_msg)
-                    
+                    reason = 'archive'
+                yield RenameOp(src_file, final_dest_path, reason)
+        finally:
+            probes = sum(registry.probes for registry in registries.values())
+            self.stats.incr('conflict_probes', probes - initial_probes)
+
+    def _output_names(self, folder: Path) -> Optional[Iterable[str]]:
+        """由目录索引取得输出目录中已有的名字；未使用索引时返回 None (由 NameRegistry 自行读取目录)"""
+        if self.index is None:
+            return None
+        listing = self.index.listing(folder, self.stats)
+        return listing.all_names() if listing is not None else ()
+
+    def execute(self, plan: Iterable[RenameOp], log_func: LogFunc,
+                workers: int = 1, use_processes: bool = False, dry_run: bool = False,
+                cancel_event: Optional[threading.Event] = None,
+                progress_func: Optional[Callable[[int, int], None]] = None,
+                journal: Optional[JobJournal] = None, skip: Optional[Set[int]] = None,
+                verify: bool = False, total: Optional[int] = None,
+                staged: Optional[Dict[int, str]] = None, recover: bool = False) -> int:
+        """
+        第二阶段：按计划移动文件，并按顺序记录每个文件的结果。
+
+        plan 可以是列表，也可以是 iter_plan 返回的迭代器 (此时需给出 total)：
+        计划逐项取用，只有在途的操作驻留内存。
+
+        workers > 1 时使用线程池 (use_processes=True 时为进程池) 并发移动文件；
+        目标名已在计划中确定，因此序号与冲突后缀与串行执行完全相同。
+        dry_run=True 时只输出将要执行的操作，不创建目录也不移动任何文件。
+        cancel_event 被置位后不再提交新文件，已在途的移动完成并记录后返回。
+        progress_func(已完成数, 总数) 在每个文件处理完 (无论成败) 后调用。
+        journal 不为空时，每个成功的移动都会记入任务日志；skip 中的序号 (已完成) 直接跳过。
+        输出目录与源文件位于不同设备时复制数据，verify=True 时在删除源文件前校验内容。
+        原地改名时按依赖顺序串行改名 (忽略 workers)；staged 为续跑时停留在临时名上的文件 {序号: 相对路径}。
+        recover=True (续跑) 时，源文件已不存在而目标已存在的文件视为上次已移动，只补记完成记录。
+        """
+        if total is None:
+            total = len(plan)
+        with self.stats.phase('execute'):
+            if self.in_place:
+                return self._execute_in_place(plan, log_func, dry_run, cancel_event, progress_func,
+                                              journal, skip, staged or {}, total, recover)
+            return self._execute(plan, log_func, workers, use_processes, dry_run, cancel_event,
+                                 progress_func, journal, skip, verify, total, recover)
+
+    def _execute(self, plan: Iterable[RenameOp], log_func: LogFunc, workers: int, use_processes: bool,
+                 dry_run: bool, cancel_event: Optional[threading.Event],
+                 progress_func: Optional[Callable[[int, int], None]], journal: Optional[JobJournal],
+                 skip: Optional[Set[int]], verify: bool, total: int, recover: bool) -> int:
+        skipped_count = len(skip) if skip else 0
+        if skipped_count:
+            log_func(message(f"⏭️ 跳过任务日志中已完成的 {skipped_count} 个文件。"))
+        dst_dev: Optional[int] = None
+        src_dev: Optional[int] = None
+        if not dry_run:
+            if not self.output_folder.exists():
+                self.output_folder.mkdir(parents=True)
+            dst_dev = os.stat(self.output_folder).st_dev
+            src_dev = os.stat(self.source_folder).st_dev
+            self.stats.incr('stat_calls', 2)
+
+        # 已提交但尚未取回结果的操作；执行器按提交顺序返回结果，因此与结果一一对应
+        in_flight: Deque[RenameOp] = deque()
+        # 递归处理时在输出目录中按需重建子目录结构
+        created_dirs: Set[Path] = {self.output_folder}
+        # 续跑时发现上次已移动、只缺完成记录的文件：不再提交移动，结果处理时按成功补记
+        recovered: Set[int] = set()
+
+        def generate_tasks() -> Iterator[MoveTask]:
+            for index, op in enumerate(plan):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                if skip and index in skip:
+                    continue
+                if self.recursive and not dry_run and op.destination is not None:
+                    folder = op.destination.parent
+                    if folder not in created_dirs:
+                        folder.mkdir(parents=True, exist_ok=True)
+                        created_dirs.add(folder)
+                error = RuntimeError(op.detail) if op.reason == 'error' else None
+                in_flight.append(op)
+                if recover and error is None and op.destination is not None and not dry_run:
+                    counters['stat_calls'] += 1
+                    if _already_moved(op.source, op.destination):
+                        counters['stat_calls'] += 1
+                        recovered.add(index)
+                        yield index, op.source, None, None
+                        continue
+                yield index, op.source, op.destination, error
+
+        # 仅在执行期间出现外部抢占时才需要重新分配名字，按需为目标所在目录创建登记表
+        registries: Dict[Path, NameRegistry] = {}
+        success_count = 0
+        done_count = skipped_count
+        # 计数先在本地累加，结束时一次性写入统计，避免热循环中逐个加锁
+        counters: Dict[str, int] = {'bytes_moved': 0, 'files_moved': 0, 'files_failed': 0, 'stat_calls': 0}
+        copied_files = 0
+        started = time.perf_counter()
+        executor = MoveExecutor(workers=workers, use_processes=use_processes, verify=verify,
+                                dst_dev=dst_dev, src_dev=src_dev)
+        tasks = generate_tasks()
+        if dry_run:
+            results: Iterator[MoveResult] = ((index, src, dst, error, None) for index, src, dst, error in tasks)
+        else:
+            results = executor.run(tasks)
+
+        # --- 执行文件移动和重命名，并按顺序记录结果 ---
+        for index, src_file, final_dest_path, error, transfer in results:
+            op = in_flight.popleft()
+            if index in recovered:
+                final_dest_path = op.destination
+            # 计划之外的进程抢先占用了目标名：登记该名字并重新分配后再试
+            while isinstance(error, FileExistsError):
+                folder = final_dest_path.parent
+                registry = registries.get(folder)
+                if registry is None:
+                    registry = registries[folder] = NameRegistry(folder)
+                    # 完整计划在内存中时，避开后续文件计划使用的名字；
+                    # 流式执行时无法预知后续名字，万一冲突，后续文件会在这里再次重新分配
+                    if isinstance(plan, list):
+                        for planned in plan:
+                            if planned.destination is not None and planned.destination.parent == folder:
+                                registry.add(planned.destination.name)
+                final_dest_path = registry.reserve_path(final_dest_path.name)
+                try:
+                    transfer = move_file(str(src_file), str(final_dest_path), verify, dst_dev, src_dev)
+                    error = None
+                except Exception as e:
+                    error = e
+
+            done_count += 1
+            if progress_func is not None:
+                progress_func(done_count, total)
+
+            if transfer is not None:
+                method_key = f"{transfer.method}_calls"
+                counters[method_key] = counters.get(method_key, 0) + 1
+                counters['stat_calls'] += transfer.stat_calls
+
+            # 只构造结构化记录，文本在真正显示时才格式化；递归处理时显示相对路径
+            if self.recursive:
+                old_name = str(src_file.relative_to(self.source_folder))
+            else:
+                old_name = src_file.name
+
+            if error is not None:
+                counters['files_failed'] += 1
+                log_func(LogRecord('error', 'failed', index, total, old_name, error=str(error)))
+                continue
+
+            if final_dest_path is None:
+                # 计划中被跳过的重复文件，留在源目录不动
+                log_func(LogRecord('info', 'duplicate_skip', index, total, old_name,
+                                   message=op.detail, dry_run=dry_run))
                 success_count += 1
-                
-            except Exception as e:
-                log_msg = f"❌ 处理失败: {src_file.name}, 错误: {e}"
-                log_func(log_msg)
+                continue
+
+            if self.recursive:
+                new_name = str(final_dest_path.relative_to(self.output_folder))
+            else:
+                new_name = final_dest_path.name
+            if op.reason == 'duplicate':
+                event = 'duplicate_tag'
+            elif old_name != new_name:
+                event = 'rename'
+            else:
+                event = 'archive'
+
+            log_func(LogRecord('info', event, index, total, old_name, new_name,
+                               message=op.detail, dry_run=dry_run))
+            success_count += 1
+            if transfer is not None:
+                counters['files_moved'] += 1
+                if transfer.method == 'copy':
+                    counters['bytes_moved'] += transfer.nbytes
+                    copied_files += 1
+            if journal is not None and not dry_run:
+                journal.record_done(index, new_name)
+
+        if recovered:
+            log_func(message(f"🩹 {len(recovered)} 个文件上次已移动但完成记录未写入任务日志，已补记。"))
+        if done_count < total:
+            log_func(message(f"⏹️ 已取消：剩余 {total - done_count} 个文件未处理。", 'warning'))
+
+        for name, value in counters.items():
+            self.stats.incr(name, value)
+
+        if copied_files:
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            copied_bytes = counters['bytes_moved']
+            log_func(message(f"📊 跨设备复制 {copied_files} 个文件，共 {format_size(copied_bytes)}，"
+                             f"平均 {format_size(int(copied_bytes / elapsed))}/s"))
+
+        return success_count
+
+    def _relative_name(self, path: Path) -> str:
+        """日志与任务日志中使用的名字：递归处理时为相对于源目录的路径"""
+        if self.recursive:
+            return str(path.relative_to(self.source_folder))
+        return path.name
+
+    def _execute_in_place(self, plan: Iterable[RenameOp], log_func: LogFunc, dry_run: bool,
+                          cancel_event: Optional[threading.Event],
+                          progress_func: Optional[Callable[[int, int], None]], journal: Optional[JobJournal],
+                          skip: Optional[Set[int]], staged: Dict[int, str], total: int, recover: bool) -> int:
+        """
+        原地改名：载入完整计划建立依赖图，按 schedule_renames 给出的顺序逐个改名，不移动文件数据。
+        只在链/环之间响应取消，保证不会有文件停留在临时名上。
+        续跑时 (recover) 链中每一步都依赖上一步腾出的名字，上次成功执行的步骤总是链的一个前缀：
+        从后往前找到最后一个源已不存在、目标已存在的步骤，它及之前的步骤只补记日志，不再改名。
+        """
+        skipped_count = len(skip) if skip else 0
+        if skipped_count:
+            log_func(message(f"⏭️ 跳过任务日志中已完成的 {skipped_count} 个文件。"))
+        dev: Optional[int] = None
+        if not dry_run:
+            dev = os.stat(self.source_folder).st_dev
+            self.stats.incr('stat_calls')
+
+        relative = self._relative_name
+        success_count = 0
+        done_count = skipped_count
+        counters: Dict[str, int] = {'files_moved': 0, 'files_failed': 0, 'stat_calls': 0}
+        recovered_count = 0
+
+        def finish_one() -> None:
+            nonlocal done_count
+            done_count += 1
+            if progress_func is not None:
+                progress_func(done_count, total)
+
+        # --- 无需改名的文件 (出错、跳过的重复文件、名字不变) 直接记录结果，其余进入依赖图 ---
+        ops: Dict[int, RenameOp] = {}
+        moves: List[Tuple[int, Path, Path]] = []
+        for index, op in enumerate(plan):
+            if skip and index in skip:
+                continue
+            source = self.source_folder / staged[index] if index in staged else op.source
+            if op.reason == 'error':
+                counters['files_failed'] += 1
+                log_func(LogRecord('error', 'failed', index, total, relative(op.source), error=op.detail))
+            elif op.destination is None:
+                log_func(LogRecord('info', 'duplicate_skip', index, total, relative(op.source),
+                                   message=op.detail, dry_run=dry_run))
+                success_count += 1
+            elif str(source) == str(op.destination):
+                log_func(LogRecord('info', 'archive', index, total, relative(op.source), dry_run=dry_run))
+                success_count += 1
+            else:
+                ops[index] = op
+                moves.append((index, source, op.destination))
+                continue
+            finish_one()
+
+        # --- 按链/环分组执行 ---
+        for group in schedule_renames(moves, TempNamer(dst for _, _, dst in moves)):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            recovered_steps = 0
+            # 环 (首步改为临时名) 不需要检查：首步完成后立即 fsync 了 staged 记录，
+            # 续跑时该文件从临时名出发，环已变成链；没有 staged 记录说明这个环还没有开始执行
+            if recover and not dry_run and group[0].final:
+                for position in range(len(group) - 1, -1, -1):
+                    counters['stat_calls'] += 1
+                    if _already_moved(group[position].source, group[position].destination):
+                        counters['stat_calls'] += 1
+                        recovered_steps = position + 1
+                        break
+            failed: Set[int] = set()
+            for position, step in enumerate(group):
+                if step.index in failed:
+                    continue
+                op = ops[step.index]
+                if position < recovered_steps:
+                    if step.final:
+                        recovered_count += 1
+                elif not dry_run:
+                    try:
+                        transfer = move_file(str(step.source), str(step.destination), False, dev, dev)
+                    except Exception as e:
+                        # 链/环中后续依赖它的改名会因目标仍被占用而各自失败，不会覆盖任何文件
+                        failed.add(step.index)
+                        counters['files_failed'] += 1
+                        log_func(LogRecord('error', 'failed', step.index, total, relative(step.source), error=str(e)))
+                        finish_one()
+                        continue
+                    method_key = f"{transfer.method}_calls"
+                    counters[method_key] = counters.get(method_key, 0) + 1
+                    counters['stat_calls'] += transfer.stat_calls
+
+                if not step.final:
+                    log_func(LogRecord('info', 'stage', step.index, total, relative(step.source),
+                                       relative(step.destination), dry_run=dry_run))
+                    if journal is not None and not dry_run:
+                        journal.record_staged(step.index, relative(step.destination))
+                    continue
+
+                new_name = relative(step.destination)
+                event = 'duplicate_tag' if op.reason == 'duplicate' else 'rename'
+                log_func(LogRecord('info', event, step.index, total, relative(op.source), new_name,
+                                   message=op.detail, dry_run=dry_run))
+                success_count += 1
+                if not dry_run:
+                    if position >= recovered_steps:
+                        counters['files_moved'] += 1
+                    if journal is not None:
+                        journal.record_done(step.index, new_name)
+                finish_one()
+
+        if recovered_count:
+            log_func(message(f"🩹 {recovered_count} 个文件上次已改名但完成记录未写入任务日志，已补记。"))
+        if done_count < total:
+            log_func(message(f"⏹️ 已取消：剩余 {total - done_count} 个文件未处理。", 'warning'))
+
+        for name, value in counters.items():
+            self.stats.incr(name, value)
+        return success_count
+
+    def _load_journal_plan(self, path: Path, state: JournalState, mode: str,
+                           config: Dict[str, Any]) -> Iterator[RenameOp]:
+        """由任务日志还原改名计划，保证续跑时的序号与冲突后缀与首次运行完全一致"""
+        header = state.header
+        if (Path(header.get('source', '')) != self.source_folder
+                or Path(header.get('output', '')) != self.output_folder
+                or header.get('mode') != mode or header.get('config') != config
+                or header.get('recursive', False) != self.recursive
+                or header.get('in_place', False) != self.in_place
+                or header.get('sort', DEFAULT_SORT) != self.sort):
+            raise ValueError("任务日志与当前的目录或模式参数不一致，无法续跑。")
+
+        return self._journal_ops(path)
+
+    def _journal_ops(self, path: Path) -> Iterator[RenameOp]:
+        """从任务日志流式读取计划，不在内存中保留完整列表"""
+        for record in iter_ops(path):
+            dst_name = record.get('dst')
+            destination = self.output_folder / dst_name if dst_name is not None else None
+            yield RenameOp(self.source_folder / record['src'], destination,
+                           record['reason'], record.get('detail', ''))
+
+    def process_files(self, mode: str, config: Dict[str, Any], log_func: LogFunc,
+                      workers: int = 1, use_processes: bool = False, dry_run: bool = False,
+                      cancel_event: Optional[threading.Event] = None,
+                      progress_func: Optional[Callable[[int, int], None]] = None,
+                      journal_path: Optional[str] = None, verify: bool = False) -> int:
+        """
+        主处理函数，根据模式和配置生成计划并执行。
+
+        指定 journal_path 时启用可恢复的任务日志：日志不存在则写入新计划；
+        日志已存在 (上次中断) 则沿用其中的计划，只处理尚未完成的文件。
+        计划始终逐项生成 (或从日志逐项读回) 并流式执行，峰值内存不随文件数增长。
+        """
+        state: Optional[JournalState] = None
+        if journal_path and Path(journal_path).exists():
+            state = load_journal(Path(journal_path), with_ops=False)
+            if not state.complete_plan:
+                # 计划尚未完整写入就中断了，此时还没有移动任何文件，重新规划即可
+                state = None
+                if not dry_run:
+                    Path(journal_path).unlink()
+
+        if state is None and not self.files:
+            return 0
+
+        try:
+            if state is not None:
+                plan = self._load_journal_plan(Path(journal_path), state, mode, config)
+                total = state.header['total']
+                self.resumed_done = len(state.done)
+                log_func(message(f"📒 从任务日志续跑: {journal_path}"))
+            else:
+                plan = self.iter_plan(mode, config)
+                total = self.total_files
+            self.planned_total = total
+        except ValueError as e:
+            log_func(message(f"❌ {e}", 'error'))
+            return 0
+
+        options: Dict[str, Any] = dict(workers=workers, use_processes=use_processes, dry_run=dry_run,
+                                       cancel_event=cancel_event, progress_func=progress_func, verify=verify,
+                                       total=total)
+        # 续跑 (包括对已有日志的预演) 跳过日志中已完成的文件，停留在临时名上的文件从临时名出发
+        skip: Set[int] = set(state.done) if state is not None else set()
+        staged = state.staged if state is not None else {}
+        if not journal_path or dry_run:
+            return self.execute(plan, log_func, skip=skip, staged=staged, **options)
 
-        return success_count
\ No newline at end of file
+        with JobJournal(Path(journal_path)) as journal:
+            if state is None:
+                header = {'source': str(self.source_folder), 'output': str(self.output_folder),
+                          'mode': mode, 'config': config}
+                if self.recursive:
+                    header['recursive'] = True
+                if self.in_place:
+                    header['in_place'] = True
+                if self.sort != DEFAULT_SORT:
+                    header['sort'] = self.sort
+                # 计划先完整写入日志 (并 fsync)，再从日志流式读回执行
+                journal.write_plan(header, plan, total)
+                plan = self._journal_ops(Path(journal_path))
+            return self.execute(plan, log_func, journal=journal, skip=skip, staged=staged,
+                                recover=state is not None, **options)
@@ -0,0 +1,212 @@
+# src/rules.py
+
+import os
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+from .scanner import FileRecord
+from .utils import format_size
+
+# --- 可组合的改名规则 ---
+#
+# 每条规则是一个配置字典，例如:
+#   {'type': 'regex', 'pattern': r'(\d+)', 'replace': r'#\1', 'scope': '1', 'count': 'all'}
+#   {'type': 'replace', 'target': 'IMG', 'replace': 'PIC', 'scope': '1', 'count': 'first'}
+#   {'type': 'sequence', 'start_num': 1, 'padding': 4}
+#   {'type': 'size'}
+#   {'type': 'case', 'case': 'lower', 'scope': '3'}
+#   {'type': 'affix', 'prefix': '2024_', 'suffix': '_bak'}
+#
+# scope 与模式 A 一致: '1' 主体, '2' 后缀, '3' 主体+后缀。
+# replace 与 regex 的 count 默认都是 'first' (只替换第一处，与模式 A 一致)，'all' 替换全部出现。
+# compile_rules 在每次运行前把规则链编译成单个函数，逐个文件调用一次即可得到最终文件名。
+
+# 编译后的单条规则: (主体, 后缀, 文件记录, 序号) -> (新主体, 新后缀)
+NameStep = Callable[[str, str, FileRecord, int], Tuple[str, str]]
+# 编译后的整条规则链: (文件记录, 序号) -> 新文件名
+NamePipeline = Callable[[FileRecord, int], str]
+
+CASE_FUNCTIONS: Dict[str, Callable[[str], str]] = {
+    'lower': str.lower,
+    'upper': str.upper,
+    'title': str.title,
+    'capitalize': str.capitalize,
+}
+
+
+def _scoped(scope: str, func: Callable[[str], str]) -> NameStep:
+    """把作用于字符串的函数按作用范围应用到主体和/或后缀"""
+    on_stem = scope in ('1', '3')
+    on_suffix = scope in ('2', '3')
+
+    def step(stem: str, suffix: str, record: FileRecord, index: int) -> Tuple[str, str]:
+        if on_stem:
+            stem = func(stem)
+        if on_suffix:
+            suffix = func(suffix)
+        return stem, suffix
+
+    return step
+
+
+def _count_of(rule: Dict[str, Any]) -> int:
+    """replace / regex 共用的 count 解析：默认 'first'，返回 re.sub 的 count 参数 (0 表示全部)"""
+    count = rule.get('count', 'first')
+    if count not in ('first', 'all'):
+        raise ValueError(f"规则 {rule['type']}: count 必须是 'first' 或 'all'，当前为 {count!r}")
+    return 1 if count == 'first' else 0
+
+
+def _compile_replace(rule: Dict[str, Any], total: int) -> NameStep:
+    """不区分大小写的字面替换 (模式 A)，count='all' 时替换全部出现"""
+    if not rule['target']:
+        raise ValueError("规则 replace: target 不能为空")
+    pattern = re.compile(re.escape(rule['target']), re.IGNORECASE)
+    replacement = rule.get('replace', '')
+    count = _count_of(rule)
+    # 使用函数作为替换值，避免替换文本中的反斜杠被当作模板转义
+    return _scoped(rule.get('scope', '1'), lambda s: pattern.sub(lambda m: replacement, s, count=count))
+
+
+def _compile_regex(rule: Dict[str, Any], total: int) -> NameStep:
+    """正则替换，替换文本支持 \\1 等分组引用；默认不区分大小写"""
+    flags = re.IGNORECASE if rule.get('ignore_case', True) else 0
+    try:
+        pattern = re.compile(rule['pattern'], flags)
+    except re.error as e:
+        raise ValueError(f"规则 regex: 无效的正则表达式 {rule['pattern']!r}: {e}")
+    replacement = rule.get('replace', '')
+    count = _count_of(rule)
+    return _scoped(rule.get('scope', '1'), lambda s: pattern.sub(replacement, s, count=count))
+
+
+def _compile_sequence(rule: Dict[str, Any], total: int) -> NameStep:
+    """在主体前加序号，位数由总文件数决定 (与模式 B 相同)；padding 可指定最少位数 (分批处理时保持位数一致)"""
+    start_num = rule.get('start_num', 1)
+    padding = max(int(rule.get('padding', 0)), len(str(total + start_num - 1)))
+    separator = rule.get('separator', '_')
+
+    def step(stem: str, suffix: str, record: FileRecord, index: int) -> Tuple[str, str]:
+        return f"{str(start_num + index).zfill(padding)}{separator}{stem}", suffix
+
+    return step
+
+
+def _compile_size(rule: Dict[str, Any], total: int) -> NameStep:
+    """用文件大小替换主体 (与模式 B 相同)"""
+    def step(stem: str, suffix: str, record: FileRecord, index: int) -> Tuple[str, str]:
+        return format_size(record.size), suffix
+
+    return step
+
+
+def _compile_case(rule: Dict[str, Any], total: int) -> NameStep:
+    case = rule.get('case', 'lower')
+    if case not in CASE_FUNCTIONS:
+        raise ValueError(f"规则 case: 不支持的大小写转换 {case!r}，可选: {', '.join(CASE_FUNCTIONS)}")
+    return _scoped(rule.get('scope', '1'), CASE_FUNCTIONS[case])
+
+
+def _compile_affix(rule: Dict[str, Any], total: int) -> NameStep:
+    """在主体前后追加固定文本 (后缀扩展名保持不变)"""
+    prefix = rule.get('prefix', '')
+    suffix_text = rule.get('suffix', '')
+
+    def step(stem: str, suffix: str, record: FileRecord, index: int) -> Tuple[str, str]:
+        return f"{prefix}{stem}{suffix_text}", suffix
+
+    return step
+
+
+RULE_COMPILERS: Dict[str, Callable[[Dict[str, Any], int], NameStep]] = {
+    'replace': _compile_replace,
+    'regex': _compile_regex,
+    'sequence': _compile_sequence,
+    'size': _compile_size,
+    'case': _compile_case,
+    'affix': _compile_affix,
+}
+
+
+def rules_use_file_stats(rules: List[Dict[str, Any]]) -> bool:
+    """规则链是否用到文件大小 (size 规则)；其余规则只依赖文件名与序号"""
+    return any(isinstance(rule, dict) and rule.get('type') == 'size' for rule in rules)
+
+
+def _checked_name(stem: str, suffix: str) -> str:
+    """
+    拼出最终文件名并检查：主体不能为空 (否则只剩后缀，变成隐藏文件)，不能是 '.' 或 '..'，
+    也不能含路径分隔符 (否则文件会被移出输出目录)。无效时抛出 ValueError，由调用方记为该文件的错误。
+    """
+    name = f"{stem}{suffix}"
+    if not stem:
+        raise ValueError(f"新文件名主体为空: {name!r}")
+    if name in ('.', '..') or os.sep in name or (os.altsep and os.altsep in name):
+        raise ValueError(f"新文件名无效: {name!r}")
+    return name
+
+
+def compile_rules(rules: List[Dict[str, Any]], total: int) -> NamePipeline:
+    """
+    将规则链编译为单个函数 (每次运行只编译一次)。
+    total 为本次处理的文件总数，用于决定序号位数。规则无效时抛出 ValueError；
+    生成的文件名无效时 (见 _checked_name) 编译后的函数对该文件抛出 ValueError。
+    """
+    steps: List[NameStep] = []
+    for rule in rules:
+        if not isinstance(rule, dict):
+            raise ValueError(f"规则必须是 JSON 对象，当前为 {rule!r}")
+        compiler = RULE_COMPILERS.get(rule.get('type', ''))
+        if compiler is None:
+            raise ValueError(f"未知规则类型: {rule.get('type')!r}")
+        try:
+            steps.append(compiler(rule, total))
+        except KeyError as e:
+            raise ValueError(f"规则 {rule['type']}: 缺少参数 {e}")
+
+    def pipeline(record: FileRecord, index: int) -> str:
+        stem = record.stem
+        suffix = record.suffix
+        for step in steps:
+            stem, suffix = step(stem, suffix, record, index)
+        return _checked_name(stem, suffix)
+
+    return pipeline
+
+
+def rules_for_mode(mode: str, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """把模式 A/B/C 的配置翻译为等价的规则链；'rules' 模式直接使用 config['rules']"""
+    if mode == 'a':
+        return [{'type': 'replace', 'target': config['target'], 'replace': config['replace'],
+                 'scope': config['scope'], 'count': 'first'}]
+    if mode == 'b':
+        if config.get('type') == 'size':
+            return [{'type': 'size'}]
+        if config.get('type') == 'sequence':
+            rule = {'type': 'sequence', 'start_num': config.get('start_num', 1)}
+            if 'padding' in config:
+                rule['padding'] = config['padding']
+            return [rule]
+        return []
+    if mode == 'rules':
+        return list(config.get('rules', []))
+    if mode == 'c':
+        # 模式 C (重复文件检测) 不改名，只跳过或标记重复文件
+        return []
+    raise ValueError(f"未知模式: {mode}")
+
+
+def continue_sequence(mode: str, config: Dict[str, Any], offset: int) -> Dict[str, Any]:
+    """
+    返回序号整体后移 offset 的配置副本 (模式 B 序列与规则链中的 sequence 规则)，
+    用于分批处理时让每批的编号接续上一批；其它模式原样返回。
+    """
+    if offset == 0:
+        return config
+    if mode == 'b' and config.get('type') == 'sequence':
+        return dict(config, start_num=config.get('start_num', 1) + offset)
+    if mode == 'rules':
+        rules = [dict(rule, start_num=rule.get('start_num', 1) + offset) if rule.get('type') == 'sequence' else rule
+                 for rule in config.get('rules', [])]
+        return dict(config, rules=rules)
+    return config
@@ -0,0 +1,171 @@
+# src/scanner.py
+
+import os
+from array import array
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .stats import RunStats
+
+# --- 基于 os.scandir 的目录发现 ---
+
+def split_suffix(name: str) -> str:
+    """
+    返回文件名的后缀，规则与 Path.suffix 完全一致 ('.bashrc' 与 'a.' 均无后缀)，
+    但无需为每个文件构造 Path 对象。
+    """
+    i = name.rfind('.')
+    if 0 < i < len(name) - 1:
+        return name[i:]
+    return ''
+
+
+class FileRecord(NamedTuple):
+    """
+    轻量文件记录：名字、后缀及一次 stat 得到的大小与修改时间。
+    rel_dir 为递归扫描时所在子目录相对于扫描根目录的路径，顶层文件为空字符串。
+    """
+    name: str
+    suffix: str
+    size: int
+    mtime: float
+    rel_dir: str = ''
+
+    @property
+    def stem(self) -> str:
+        if self.suffix:
+            return self.name[:-len(self.suffix)]
+        return self.name
+
+    @property
+    def relpath(self) -> str:
+        """相对于扫描根目录的路径"""
+        if self.rel_dir:
+            return os.path.join(self.rel_dir, self.name)
+        return self.name
+
+
+def scan_files(folder: Path, extensions: Optional[Iterable[str]] = None,
+               stats: Optional['RunStats'] = None, recursive: bool = False,
+               exclude: Iterable[Path] = ()) -> Iterator[FileRecord]:
+    """
+    流式扫描目录下的文件，逐个产出 FileRecord。
+
+    类型判断复用 DirEntry 缓存的信息；只有通过后缀筛选的文件才会 stat，
+    且每个文件最多 stat 一次 (Windows 下 scandir 已自带 stat 数据，无额外系统调用)。
+    extensions 为空时不做筛选，否则为小写、带点的后缀集合。
+    recursive=True 时深入子目录 (不跟随目录符号链接)，exclude 中的目录 (例如位于源目录内的输出目录) 整体跳过。
+    stats 不为空时，扫描结束后累加 stat_calls 计数。
+    """
+    wanted = set(extensions) if extensions else None
+    excluded = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+    stat_calls = 0
+    # 待扫描的目录: (实际路径, 相对路径)
+    pending: List[Tuple[str, str]] = [(str(folder), '')]
+
+    try:
+        while pending:
+            current, rel_dir = pending.pop()
+            try:
+                entries = os.scandir(current)
+            except OSError:
+                if not rel_dir:
+                    raise
+                # 无权限访问的子目录直接跳过
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if recursive and entry.is_dir(follow_symlinks=False):
+                            if os.path.normcase(os.path.abspath(entry.path)) not in excluded:
+                                pending.append((entry.path, os.path.join(rel_dir, entry.name)))
+                            continue
+                        if not entry.is_file():
+                            continue
+                        suffix = split_suffix(entry.name)
+                        if wanted is not None and suffix.lower() not in wanted:
+                            continue
+                        stat_calls += 1
+                        st = entry.stat()
+                    except OSError:
+                        # 扫描期间被删除或无权限访问的条目直接跳过
+                        continue
+                    yield FileRecord(entry.name, suffix, st.st_size, st.st_mtime, rel_dir)
+    finally:
+        if stats is not None:
+            stats.incr('stat_calls', stat_calls)
+
+
+
+# scan_dirs 每批最多的文件数：大目录分成多批产出，同时驻留内存的文件名字符串有上限
+DIR_BATCH_SIZE = 4096
+
+
+class DirBatch(NamedTuple):
+    """scan_dirs 产出的一批文件 (同一目录)：名字与同序的大小、修改时间数组"""
+    rel_dir: str
+    names: List[str]
+    sizes: array
+    mtimes: array
+
+
+def _batch(rel_dir: str, names: List[str], sizes: array, mtimes: array, stat_files: bool) -> DirBatch:
+    if not stat_files:
+        sizes = array('q', [0]) * len(names)
+        mtimes = array('d', [0.0]) * len(names)
+    return DirBatch(rel_dir, names, sizes, mtimes)
+
+
+def scan_dirs(folder: Path, extensions: Optional[Iterable[str]] = None,
+              stats: Optional['RunStats'] = None, recursive: bool = False,
+              exclude: Iterable[Path] = (), stat_files: bool = True) -> Iterator[DirBatch]:
+    """
+    与 scan_files 相同的遍历顺序、筛选与 stat 次数，但按目录整批产出 (每批最多 DIR_BATCH_SIZE 个文件)，
+    供建表时整块追加，无需为每个文件构造 FileRecord。
+    stat_files=False 时完全不 stat，大小与修改时间记为 0 (只需要文件名时使用，例如预览)。
+    """
+    wanted = set(extensions) if extensions else None
+    excluded = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+    stat_calls = 0
+    pending: List[Tuple[str, str]] = [(str(folder), '')]
+
+    try:
+        while pending:
+            current, rel_dir = pending.pop()
+            try:
+                entries = os.scandir(current)
+            except OSError:
+                if not rel_dir:
+                    raise
+                continue
+            names: List[str] = []
+            sizes = array('q')
+            mtimes = array('d')
+            with entries:
+                for entry in entries:
+                    try:
+                        if recursive and entry.is_dir(follow_symlinks=False):
+                            if os.path.normcase(os.path.abspath(entry.path)) not in excluded:
+                                pending.append((entry.path, os.path.join(rel_dir, entry.name)))
+                            continue
+                        if not entry.is_file():
+                            continue
+                        if wanted is not None and split_suffix(entry.name).lower() not in wanted:
+                            continue
+                        if stat_files:
+                            stat_calls += 1
+                            st = entry.stat()
+                            sizes.append(st.st_size)
+                            mtimes.append(st.st_mtime)
+                    except OSError:
+                        continue
+                    names.append(entry.name)
+                    if len(names) == DIR_BATCH_SIZE:
+                        yield _batch(rel_dir, names, sizes, mtimes, stat_files)
+                        names, sizes, mtimes = [], array('q'), array('d')
+            if names:
+                yield _batch(rel_dir, names, sizes, mtimes, stat_files)
+    finally:
+        if stats is not None:
+            stats.incr('stat_calls', stat_calls)
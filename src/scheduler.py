@@ -0,0 +1,169 @@
+# src/scheduler.py
+
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .processor import FileProcessor
+from .dirindex import DirectoryIndex
+from .logsink import LogFunc, LogRecord, message
+from .sorting import DEFAULT_SORT
+from .stats import RunStats
+
+# --- 多目录任务调度 ---
+#
+# 多个源目录的任务并发执行，但每个底层设备 (st_dev) 上同时运行的任务数有上限：
+# 慢速网络共享上的任务不会占满全部并发名额而拖住 SSD 上的任务，机械硬盘也不会被多个任务同时随机读写。
+# 调度器每次从等待队列中挑选第一个"所涉设备都有空闲名额"的任务，而不是严格按顺序等待。
+
+
+class Job(NamedTuple):
+    """一个处理任务，参数含义与 FileProcessor / process_files 相同"""
+    source: str
+    output: str
+    mode: str
+    config: Dict[str, Any]
+    extensions: Sequence[str] = ()
+    recursive: bool = False
+    journal_path: Optional[str] = None
+    in_place: bool = False
+    sort: str = DEFAULT_SORT
+
+
+class JobResult(NamedTuple):
+    job: Job
+    total: int
+    success: int                        # 包括续跑时任务日志中已完成的文件
+    error: Optional[Exception] = None
+    resumed: int = 0                    # 其中在上次运行中已完成的文件数
+
+
+def device_of(path: Path) -> int:
+    """返回路径所在设备号；路径尚不存在时 (例如输出目录) 取最近的已存在上级目录"""
+    path = Path(os.path.abspath(path))
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            if path.parent == path:
+                raise
+            path = path.parent
+
+
+class JobScheduler:
+    """
+    按设备限流的任务调度器。
+
+    per_device: 每个设备上同时运行的任务数上限 (源目录与输出目录所在设备都计入)；
+    device_limits 可为个别设备号单独指定上限；max_jobs 为全局同时运行的任务数上限。
+    stats 不为空时，所有任务的计时与计数累加到同一个 RunStats 中；index 不为空时各任务共用该目录索引。
+    """
+
+    def __init__(self, per_device: int = 1, max_jobs: int = 4,
+                 device_limits: Optional[Dict[int, int]] = None, stats: Optional[RunStats] = None,
+                 index: Optional[DirectoryIndex] = None):
+        if per_device < 1 or max_jobs < 1:
+            raise ValueError("per_device 与 max_jobs 必须是正整数。")
+        self.per_device = per_device
+        self.max_jobs = max_jobs
+        self.device_limits = device_limits or {}
+        self.stats = stats if stats is not None else RunStats()
+        self.index = index
+        self._cond = threading.Condition()
+        self._active: Dict[int, int] = {}
+        self._running = 0
+
+    def _fits(self, devices: Tuple[int, ...]) -> bool:
+        if self._running >= self.max_jobs:
+            return False
+        return all(self._active.get(dev, 0) < self.device_limits.get(dev, self.per_device) for dev in devices)
+
+    def run(self, jobs: Sequence[Job], log_func: LogFunc, workers: int = 1, use_processes: bool = False,
+            dry_run: bool = False, cancel_event: Optional[threading.Event] = None,
+            verify: bool = False) -> List[JobResult]:
+        """
+        执行全部任务并按提交顺序返回结果。单个任务失败不影响其它任务；
+        cancel_event 被置位后不再启动新任务，运行中的任务在当前文件完成后停止。
+        """
+        results: List[Optional[JobResult]] = [None] * len(jobs)
+        pending: List[Tuple[int, Job, Tuple[int, ...]]] = []
+        for number, job in enumerate(jobs):
+            try:
+                folders = [job.source] if job.in_place else [job.source, job.output]
+                devices = tuple(sorted({device_of(Path(folder)) for folder in folders}))
+            except OSError as e:
+                results[number] = JobResult(job, 0, 0, e)
+                log_func(message(f"❌ 任务 {self._label(number, job)} 无法启动: {e}", 'error'))
+                continue
+            pending.append((number, job, devices))
+
+        threads: List[threading.Thread] = []
+        with self._cond:
+            while pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                ready = next((item for item in pending if self._fits(item[2])), None)
+                if ready is None:
+                    # 等待某个任务结束释放名额 (超时以便及时响应取消)
+                    self._cond.wait(0.5)
+                    continue
+                pending.remove(ready)
+                number, job, devices = ready
+                self._acquire(devices)
+                thread = threading.Thread(
+                    target=self._run_job,
+                    args=(number, job, devices, results, log_func,
+                          dict(workers=workers, use_processes=use_processes, dry_run=dry_run,
+                               cancel_event=cancel_event, verify=verify)),
+                    name=f"job-{number}", daemon=True,
+                )
+                threads.append(thread)
+                thread.start()
+
+        for thread in threads:
+            thread.join()
+        for number, job, _ in pending:
+            results[number] = JobResult(job, 0, 0, None)
+        return [result for result in results if result is not None]
+
+    @staticmethod
+    def _label(number: int, job: Job) -> str:
+        return f"{number + 1}:{Path(job.source).name}"
+
+    def _acquire(self, devices: Tuple[int, ...]) -> None:
+        self._running += 1
+        for dev in devices:
+            self._active[dev] = self._active.get(dev, 0) + 1
+
+    def _release(self, devices: Tuple[int, ...]) -> None:
+        with self._cond:
+            self._running -= 1
+            for dev in devices:
+                self._active[dev] -= 1
+            self._cond.notify_all()
+
+    def _run_job(self, number: int, job: Job, devices: Tuple[int, ...], results: List[Optional[JobResult]],
+                 log_func: LogFunc, options: Dict[str, Any]) -> None:
+        label = self._label(number, job)
+
+        def job_log(record: LogRecord) -> None:
+            log_func(record._replace(job=label))
+
+        total = 0
+        try:
+            processor = FileProcessor(job.source, job.output, list(job.extensions),
+                                      stats=self.stats, recursive=job.recursive, in_place=job.in_place,
+                                      index=self.index, sort=job.sort)
+            total = processor.total_files
+            job_log(message(f"共找到 {total} 个文件，开始执行 [模式 {job.mode.upper()}]..."))
+            success = processor.process_files(job.mode, job.config, job_log,
+                                              journal_path=job.journal_path, **options)
+            total = processor.planned_total
+            resumed = processor.resumed_done
+            results[number] = JobResult(job, total, success + resumed, resumed=resumed)
+        except Exception as e:
+            job_log(message(f"❌ 任务失败: {e}", 'error'))
+            results[number] = JobResult(job, total, 0, e)
+        finally:
+            self._release(devices)
@@ -0,0 +1,85 @@
+# src/sorting.py
+
+import heapq
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# --- 处理顺序 (排序键) ---
+#
+# 处理顺序决定序号 (模式 B 与 sequence 规则)。排序键只使用发现阶段已得到的文件名、大小与修改时间，不再 stat；
+# 每个文件的键只计算一次 (decorate-sort)，之后只按键比较行号。
+# 排序方式写作 'name'、'natural'、'mtime'、'size'，加前缀 '-' 表示降序 (例如 '-mtime' 最新的在前)。
+# 递归处理时先按子目录再按排序键排序 (降序时子目录也按逆序)。
+
+# 排序键函数: (文件名, 大小, 修改时间) -> 可比较的键；键相同时再比较文件名，保证顺序确定
+SortKey = Callable[[str, int, float], Any]
+
+DEFAULT_SORT = 'name'
+
+_DIGITS = re.compile(r'(\d+)')
+
+
+def natural_key(name: str) -> Tuple[Tuple[Any, ...], str]:
+    """自然顺序: 'file2' 排在 'file10' 之前。数字段按数值比较，其余部分不区分大小写"""
+    parts = _DIGITS.split(name)
+    # split 的结果总是 文本, 数字, 文本, ... 交替，同一位置的类型一致，可以直接比较
+    return tuple(int(part) if i % 2 else part.casefold() for i, part in enumerate(parts)), name
+
+
+SORT_KEYS: Dict[str, SortKey] = {
+    'name': lambda name, size, mtime: name,
+    'natural': lambda name, size, mtime: natural_key(name),
+    'mtime': lambda name, size, mtime: (mtime, name),
+    'size': lambda name, size, mtime: (size, name),
+}
+
+
+def sort_choices() -> List[str]:
+    """全部可用的排序方式 (含降序写法)，供命令行与界面使用"""
+    return [prefix + name for name in SORT_KEYS for prefix in ('', '-')]
+
+
+def parse_sort(sort: str) -> Tuple[SortKey, bool]:
+    """解析排序方式，返回 (排序键函数, 是否降序)；未知的排序方式抛出 ValueError"""
+    descending = sort.startswith('-')
+    key_func = SORT_KEYS.get(sort[1:] if descending else sort)
+    if key_func is None:
+        raise ValueError(f"未知的排序方式: {sort!r}，可选: {', '.join(sort_choices())}")
+    return key_func, descending
+
+
+def sort_uses_file_stats(sort: str) -> bool:
+    """排序方式是否依赖文件大小或修改时间 (而不只是文件名)"""
+    return sort.lstrip('-') in ('mtime', 'size')
+
+
+def compute_keys(sort: str, names: Sequence[str], sizes: Sequence[int], mtimes: Sequence[float],
+                 dirs: Optional[Sequence[str]] = None) -> Tuple[List[Any], bool]:
+    """
+    为每一行计算一次排序键，返回 (键列表, 是否降序)。
+    dirs 不为空时 (递归处理) 键以所在子目录开头，同一子目录的文件排在一起。
+    """
+    key_func, descending = parse_sort(sort)
+    if dirs is None and key_func is SORT_KEYS['name']:
+        # 按文件名排序时键就是文件名本身
+        keys = list(names)
+    elif dirs is None:
+        keys = [key_func(name, size, mtime) for name, size, mtime in zip(names, sizes, mtimes)]
+    else:
+        keys = [(rel_dir, key_func(name, size, mtime))
+                for rel_dir, name, size, mtime in zip(dirs, names, sizes, mtimes)]
+    return keys, descending
+
+
+def sort_order(keys: Sequence[Any], descending: bool = False) -> List[int]:
+    """按预先计算的键给出全部行号的顺序 (稳定排序)"""
+    return sorted(range(len(keys)), key=keys.__getitem__, reverse=descending)
+
+
+def top_order(keys: Sequence[Any], n: int, descending: bool = False) -> List[int]:
+    """
+    只选出排在前 n 位的行号，结果与 sort_order(keys, descending)[:n] 相同。
+    用堆选择，复杂度 O(行数 · log n)，预览只需要前几屏时无需对百万行完整排序。
+    """
+    select = heapq.nlargest if descending else heapq.nsmallest
+    return select(n, range(len(keys)), key=keys.__getitem__)
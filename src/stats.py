@@ -0,0 +1,103 @@
+# src/stats.py
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+from .utils import format_size
+
+# --- 运行统计：分阶段计时与计数器 ---
+#
+# 常用计数器:
+#   stat_calls       stat/lstat/fstat 系统调用次数
+#   rename_calls     元数据改名 (rename / 硬链接) 次数
+#   copy_calls       跨设备数据复制次数
+#   conflict_probes  为解决重名而检查的候选文件名个数
+#   bytes_moved      跨设备复制的字节数
+#   files_moved      成功处理的文件数
+#   files_failed     处理失败的文件数
+#   dir_index_hits   目录索引命中 (只 stat 目录本身) 的目录数
+#   dir_index_refreshes  目录索引失效后重新列出的目录数
+
+# 钩子: (事件名, 数据)；事件包括 'phase' (某阶段结束) 与 'finish' (调用 finish 时的完整快照)
+StatsHook = Callable[[str, Dict[str, Any]], None]
+
+
+class RunStats:
+    """线程安全的计时与计数收集器，可挂接回调钩子，并导出为 JSON"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self._hooks: List[StatsHook] = []
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def add_hook(self, hook: StatsHook) -> None:
+        self._hooks.append(hook)
+
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        for hook in self._hooks:
+            hook(event, data)
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """累加某阶段的耗时 (同名阶段可多次进入，例如逐批刷新日志)"""
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add_time(name, elapsed)
+            self._emit('phase', {'name': name, 'seconds': elapsed})
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = dict(self.phases)
+            counters = dict(self.counters)
+        execute_seconds = phases.get('execute', 0.0)
+        files_moved = counters.get('files_moved', 0)
+        return {
+            'phases': {name: round(seconds, 6) for name, seconds in phases.items()},
+            'counters': counters,
+            'files_per_sec': round(files_moved / execute_seconds, 1) if execute_seconds > 0 else None,
+            'bytes_per_sec': round(counters.get('bytes_moved', 0) / execute_seconds, 1) if execute_seconds > 0 else None,
+            'wall_seconds': round(time.perf_counter() - self._started, 6),
+        }
+
+    def finish(self) -> Dict[str, Any]:
+        """生成最终快照并通知钩子"""
+        data = self.snapshot()
+        self._emit('finish', data)
+        return data
+
+    def summary_lines(self) -> List[str]:
+        """供 GUI / 命令行输出的可读摘要"""
+        data = self.snapshot()
+        lines = ["📈 运行统计:"]
+        for name, seconds in data['phases'].items():
+            lines.append(f"   阶段 {name}: {seconds:.3f}s")
+        for name, value in sorted(data['counters'].items()):
+            shown = format_size(value) if name == 'bytes_moved' else value
+            lines.append(f"   {name}: {shown}")
+        if data['files_per_sec'] is not None:
+            lines.append(f"   吞吐: {data['files_per_sec']} 文件/秒, {format_size(int(data['bytes_per_sec']))}/s")
+        return lines
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def dump(self, path: Path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
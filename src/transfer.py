@@ -0,0 +1,174 @@
+# src/transfer.py
+
+import errno
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from .utils import atomic_move
+
+# --- 文件传输层 ---
+#
+# 同一设备 (st_dev 相同) 上只做元数据层面的改名，不搬运数据；
+# 跨设备时以 O_EXCL 独占创建目标文件，优先使用内核态复制
+# (os.copy_file_range / os.sendfile)，数据不经过用户态缓冲区。
+
+# 单次内核复制 / 用户态读写的块大小
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# 校验时的读取块大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class TransferResult(NamedTuple):
+    """单个文件的传输结果，供吞吐与系统调用统计使用"""
+    method: str      # 'rename' (同设备改名), 'copy' (跨设备复制), 'symlink' (重建符号链接)
+    nbytes: int      # 复制的字节数
+    stat_calls: int  # 本次传输执行的 stat 类系统调用次数
+
+
+def _copy_kernel(fd_in: int, fd_out: int, size: int, chunk_size: int) -> int:
+    """使用 copy_file_range，不可用时退回 sendfile；都不支持时抛出 OSError"""
+    copied = 0
+    use_copy_file_range = hasattr(os, 'copy_file_range')
+
+    while copied < size:
+        count = min(chunk_size, size - copied)
+        if use_copy_file_range:
+            try:
+                sent = os.copy_file_range(fd_in, fd_out, count)
+            except OSError as e:
+                # 较旧的内核或部分文件系统 (如跨文件系统的 NFS) 不支持，且尚未写入任何数据时切换到 sendfile
+                if e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP) and copied == 0:
+                    use_copy_file_range = False
+                    continue
+                raise
+        else:
+            sent = os.sendfile(fd_out, fd_in, copied, count)
+
+        if sent == 0:
+            break
+        copied += sent
+
+    return copied
+
+
+def _copy_userspace(fd_in: int, fd_out: int, chunk_size: int, hasher=None) -> int:
+    """用户态循环复制 (复用同一块缓冲区)，可顺带计算源数据的流式校验值"""
+    copied = 0
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(fd_in, 'rb', buffering=0, closefd=False) as f_in, \
+            open(fd_out, 'wb', buffering=0, closefd=False) as f_out:
+        while True:
+            n = f_in.readinto(buffer)
+            if not n:
+                break
+            chunk = view[:n]
+            if hasher is not None:
+                hasher.update(chunk)
+            written = 0
+            while written < n:
+                written += f_out.write(chunk[written:])
+            copied += n
+    return copied
+
+
+def file_digest(path: Path) -> str:
+    """流式计算文件的 BLAKE2b 校验值"""
+    hasher = hashlib.blake2b()
+    with open(path, 'rb', buffering=0) as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def copy_file(src: Path, dst: Path, verify: bool = False, chunk_size: int = COPY_CHUNK_SIZE) -> int:
+    """
+    把 src 复制到新建的 dst (dst 已存在时抛出 FileExistsError)，保留时间戳与权限。
+    verify=True 时边复制边计算源数据校验值，完成后再读回目标文件比对，不一致则抛出 OSError。
+    返回复制的字节数；失败时删除不完整的目标文件。
+    """
+    fd_in = os.open(src, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        st = os.fstat(fd_in)
+        fd_out = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), st.st_mode & 0o777)
+    except BaseException:
+        os.close(fd_in)
+        raise
+
+    try:
+        try:
+            if verify:
+                hasher = hashlib.blake2b()
+                copied = _copy_userspace(fd_in, fd_out, chunk_size, hasher)
+                source_digest = hasher.hexdigest()
+            else:
+                try:
+                    copied = _copy_kernel(fd_in, fd_out, st.st_size, chunk_size)
+                except (OSError, AttributeError) as e:
+                    # 平台不支持内核态复制 (例如 Windows)，且尚未写入数据时退回用户态复制
+                    if isinstance(e, OSError) and os.lseek(fd_out, 0, os.SEEK_CUR) != 0:
+                        raise
+                    copied = _copy_userspace(fd_in, fd_out, chunk_size)
+        finally:
+            os.close(fd_in)
+            os.close(fd_out)
+
+        if copied != st.st_size:
+            raise OSError(errno.EIO, f"复制不完整: {copied}/{st.st_size} 字节", str(src))
+        if verify and file_digest(dst) != source_digest:
+            raise OSError(errno.EIO, "校验失败: 目标文件内容与源文件不一致", str(dst))
+
+        shutil.copystat(src, dst)
+    except BaseException:
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        raise
+
+    return copied
+
+
+def transfer_file(src: Path, dst: Path, verify: bool = False, dst_dev: Optional[int] = None,
+                  src_dev: Optional[int] = None) -> TransferResult:
+    """
+    移动单个文件，绝不覆盖已存在的目标。
+
+    同一设备上做元数据改名，不复制数据；跨设备时复制数据 (可选校验) 后删除源文件。
+    dst_dev / src_dev 为目标目录与源目录的 st_dev，由调用方缓存以免逐个 stat；
+    源文件实际位于其他挂载点上时，改名因 EXDEV 失败，随即改为复制。
+    """
+    stat_calls = 0
+    if dst_dev is None:
+        dst_dev = os.stat(dst.parent).st_dev
+        stat_calls += 1
+    if src_dev is None:
+        src_dev = os.lstat(src).st_dev
+        stat_calls += 1
+
+    if src_dev == dst_dev:
+        try:
+            if os.name == 'nt':
+                # Windows 的 os.rename 在目标存在时直接失败，本身就不会覆盖
+                os.rename(src, dst)
+            else:
+                # POSIX 的 rename 会静默覆盖，改用硬链接 + 删除实现不覆盖的改名
+                atomic_move(src, dst)
+            return TransferResult('rename', 0, stat_calls)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+    if os.path.islink(src):
+        # 与 shutil.move 一致：跨设备时重建符号链接本身，而不是复制它指向的内容
+        os.symlink(os.readlink(src), dst)
+        os.unlink(src)
+        return TransferResult('symlink', 0, stat_calls + 1)
+
+    copied = copy_file(src, dst, verify=verify)
+    os.unlink(src)
+    # islink 的 lstat 与复制时的 fstat
+    return TransferResult('copy', copied, stat_calls + 2)
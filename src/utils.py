@@ -1,10 +1,29 @@
 # src/utils.py
 
+import os
+import shutil
+import threading
 from pathlib import Path
-from typing import Set
+from typing import TYPE_CHECKING, Dict, Iterable, List, Set, Optional
+
+from .scanner import split_suffix
+
+if TYPE_CHECKING:
+    from .dirindex import DirectoryIndex
 
 # --- 核心工具函数 ---
 
+def format_size(size_bytes: int) -> str:
+    """
+    将字节数转换为保留2位小数的大写单位字符串 (KB, MB)，保留小数点。
+    """
+    if size_bytes < 1024:
+        return f"{size_bytes}B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.2f}KB"
+    else:
+        return f"{size_bytes / (1024 * 1024):.2f}MB"
+
 def format_file_size(file_path: Path) -> str:
     """
     计算文件大小并转换为保留2位小数的大写单位字符串 (KB, MB)，保留小数点。
@@ -14,16 +33,14 @@ def format_file_size(file_path: Path) -> str:
     except FileNotFoundError:
         return "N/A"
         
-    if size_bytes < 1024:
-        return f"{size_bytes}B"
-    elif size_bytes < 1024 * 1024:
-        return f"{size_bytes / 1024:.2f}KB"
-    else:
-        return f"{size_bytes / (1024 * 1024):.2f}MB"
+    return format_size(size_bytes)
 
 def get_unique_path(destination_path: Path) -> Path:
     """
     解决重名冲突：如果目标路径已存在，自动追加 _1, _2
+
+    每个候选名都要 exists() 一次，冲突多时为 O(n²)；处理流程已改用 NameRegistry，
+    这里只保留给基准测试作为旧实现的对照。
     """
     if not destination_path.exists():
         return destination_path
@@ -40,6 +57,152 @@ def get_unique_path(destination_path: Path) -> Path:
             return new_path
         counter += 1
 
+class NameRegistry:
+    """
+    输出目录的文件名登记表：只在创建时读取一次目录列表，之后在内存中分配唯一文件名。
+
+    与 get_unique_path 相同，冲突时追加 _1, _2 ... 后缀，但不再对每个候选名执行 exists()；
+    每个基础名记录下一个待尝试的计数器，因此分配名字的均摊复杂度为 O(1)。
+    文件名按 os.path.normcase 归一化比较 (Windows 下不区分大小写)。
+    probes 记录为解决重名而检查过的候选名个数，供统计使用。
+    names 不为空时使用调用方给出的目录列表 (例如取自目录索引)，不再读取目录。
+    """
+
+    def __init__(self, folder: Path, names: Optional[Iterable[str]] = None):
+        self.folder = Path(folder)
+        self.probes = 0
+        self._taken: Set[str] = set()
+        self._next_counter: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        if names is None and self.folder.is_dir():
+            names = os.listdir(self.folder)
+        for name in names or ():
+            self._taken.add(os.path.normcase(name))
+
+    def __contains__(self, name: str) -> bool:
+        return os.path.normcase(name) in self._taken
+
+    def add(self, name: str) -> None:
+        """将文件名标记为已占用 (例如发现外部进程抢先创建了该文件)"""
+        with self._lock:
+            self._taken.add(os.path.normcase(name))
+
+    def discard(self, name: str) -> None:
+        """释放文件名 (例如原地改名时，即将被改走的文件不再占用原名)"""
+        with self._lock:
+            self._taken.discard(os.path.normcase(name))
+
+    def reserve(self, name: str) -> str:
+        """为期望的文件名分配一个唯一名字，并立即登记为已占用"""
+        with self._lock:
+            key = os.path.normcase(name)
+            if key not in self._taken:
+                self._taken.add(key)
+                return name
+
+            path = Path(name)
+            stem = path.stem
+            suffix = path.suffix
+            counter = self._next_counter.get(key, 1)
+            while True:
+                self.probes += 1
+                new_name = f"{stem}_{counter}{suffix}"
+                new_key = os.path.normcase(new_name)
+                if new_key not in self._taken:
+                    break
+                counter += 1
+
+            self._next_counter[key] = counter + 1
+            self._taken.add(new_key)
+            return new_name
+
+    def reserve_path(self, name: str) -> Path:
+        """同 reserve，返回位于登记目录下的完整路径"""
+        return self.folder / self.reserve(name)
+
+def _same_entry(src: Path, dst: Path) -> bool:
+    """
+    src 与 dst 是否为同一个目录项的两种写法 (例如 'd/./x' 与 'd/x')。
+    比较 lstat 结果 (不跟随符号链接)，且文件只有一个链接，排除同一文件的不同硬链接。
+    """
+    try:
+        src_st = os.lstat(src)
+        dst_st = os.lstat(dst)
+    except OSError:
+        return False
+    return os.path.samestat(src_st, dst_st) and src_st.st_nlink == 1
+
+def finish_interrupted_move(src: Path, dst: Path) -> bool:
+    """
+    补完上次在建立硬链接与删除源文件之间中断的 atomic_move：src 与 dst 是同一文件的两个不同目录项时删除 src。
+    用户自己建立的硬链接同样满足这个条件，因此只能由确知 dst 由本任务建立的调用方使用
+    (任务日志续跑与撤销)。同一目录下只有大小写不同的名字按同一个目录项处理，不删除。
+    返回是否补完。
+    """
+    try:
+        src_st = os.lstat(src)
+        dst_st = os.lstat(dst)
+    except FileNotFoundError:
+        return False
+    if not os.path.samestat(src_st, dst_st) or src_st.st_nlink < 2:
+        return False
+    if os.path.samefile(src.parent, dst.parent) and src.name.casefold() == dst.name.casefold():
+        return False
+    os.unlink(src)
+    return True
+
+def atomic_move(src: Path, dst: Path) -> None:
+    """
+    不覆盖地移动文件：若目标在移动瞬间已存在，抛出 FileExistsError。
+
+    同一设备上通过硬链接 + 删除源文件实现原子占位；
+    跨设备或不支持硬链接时，先以 O_EXCL 独占创建目标文件，再写入数据。
+    目标是同一文件的另一个硬链接或指向源文件的符号链接时同样抛出 FileExistsError，
+    上次中断留下的硬链接由调用方通过 finish_interrupted_move 处理。
+    """
+    try:
+        if os.link in os.supports_follow_symlinks:
+            # 符号链接按链接本身移动，而不是链接到它指向的文件
+            os.link(src, dst, follow_symlinks=False)
+        else:
+            os.link(src, dst)
+    except FileExistsError:
+        if not _same_entry(src, dst):
+            raise
+        # 源与目标是同一个目录项 (例如不区分大小写的卷上只改大小写)，不能删除，直接改名
+        os.rename(src, dst)
+        return
+    except (FileNotFoundError, NotADirectoryError):
+        # 源文件不存在 (或目标目录不存在)：不创建任何占位文件
+        raise
+    except OSError:
+        fd = os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+        try:
+            try:
+                os.replace(src, dst)
+                return
+            except OSError:
+                shutil.copy2(src, dst)
+        except BaseException:
+            # 删除自己创建的占位文件或不完整的副本
+            os.unlink(dst)
+            raise
+        try:
+            os.unlink(src)
+        except BaseException:
+            if os.path.exists(src):
+                os.unlink(dst)
+            raise
+        return
+
+    try:
+        os.unlink(src)
+    except BaseException:
+        os.unlink(dst)
+        raise
+
 def case_insensitive_replace(original_string: str, target_str: str, replacement_str: str) -> str:
     """
     执行不区分大小写的替换（仅替换第一次出现）。
@@ -60,20 +223,62 @@ def case_insensitive_replace(original_string: str, target_str: str, replacement_
     )
     return new_string
 
-def get_available_extensions(folder_path_str: str) -> Set[str]:
+def get_available_extensions(folder_path_str: str, index: Optional['DirectoryIndex'] = None) -> Set[str]:
     """
     扫描指定目录，返回所有文件的唯一后缀集合 (小写，带点，例如: {'.jpg', '.png'})。
+    index 不为空时直接读取目录索引中的后缀直方图，目录未变化时无需重新列出。
     """
     folder_path = Path(folder_path_str)
+    if index is not None:
+        listing = index.listing(folder_path)
+        if listing is None:
+            return set()
+        index.flush()
+        return set(listing.histogram)
+
     if not folder_path.is_dir():
         return set()
         
     extensions = set()
-    for item in folder_path.iterdir():
-        if item.is_file():
+    # 使用 scandir 复用目录项中的类型信息，无需逐个 stat
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
             # 获取后缀，转小写，并添加到集合
-            ext = item.suffix.lower()
+            ext = split_suffix(entry.name).lower()
             if ext: # 确保不是没有后缀的文件
                 extensions.add(ext)
                 
-    return extensions
\ No newline at end of file
+    return extensions
+
+
+def parse_extensions(filter_str: str) -> List[str]:
+    """
+    解析扩展名筛选字符串 (如 "*.jpg, png")，返回规范化的扩展名列表 (小写，带点，无重复)。
+    """
+    if not filter_str:
+        return []
+        
+    extensions = set()
+    parts = filter_str.split(',')
+    for part in parts:
+        part = part.strip().lower()
+        if not part:
+            continue
+        
+        # 去除前导的 *
+        if part.startswith('*'):
+            part = part[1:]
+        
+        # 确保以 . 开头
+        if not part.startswith('.'):
+            part = '.' + part
+            
+        if len(part) > 1: # 排除掉只剩下 '.' 的情况
+            extensions.add(part)
+            
+    return sorted(list(extensions))
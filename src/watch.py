@@ -0,0 +1,395 @@
+# src/watch.py
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .dirindex import RACY_WINDOW
+from .filetable import FileTable
+from .logsink import LogFunc, LogRecord, message
+from .processor import FileProcessor
+from .rules import compile_rules, continue_sequence, rules_for_mode
+from .scanner import FileRecord, split_suffix
+from .sorting import DEFAULT_SORT, compute_keys, parse_sort, top_order
+from .stats import RunStats
+from .utils import NameRegistry
+
+# --- 监视模式 (热文件夹) ---
+#
+# 扫描仪、导出程序等持续向源目录投放文件。监视模式只关注新出现的文件，不再反复扫描整个目录：
+#   1. 发现：Linux 下用 inotify (经 ctypes 调用 libc) 接收事件；其它平台或 inotify 不可用时轮询，
+#      目录 mtime 变化时才用 scandir 列出文件名并与上次的快照求差。
+#   2. 稳定：候选文件的大小与修改时间持续 settle 秒不变，才认为对方已写完。
+#   3. 分批：稳定的文件先积攒，debounce 秒内没有新文件稳定 (或积满 max_batch 个) 时作为一批交给 FileProcessor。
+# 序号在批与批之间接续，指定状态文件时重启监视后也继续编号。
+# 输出目录的名字登记表跨批复用：原地改名时按事件增量更新，否则只在输出目录被外部修改 (mtime 变化) 时重新读取。
+# 只监视源目录顶层 (不递归)。
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MOVED_FROM | IN_DELETE
+# struct inotify_event 的定长部分: wd, mask, cookie, len (其后为 len 字节、以 NUL 填充的文件名)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def list_names(folder: Path, extensions: Optional[Iterable[str]] = None) -> Set[str]:
+    """列出目录顶层通过后缀筛选的文件名 (类型判断复用 DirEntry 缓存，不做 stat)"""
+    wanted = set(extensions) if extensions else None
+    names: Set[str] = set()
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if wanted is None or split_suffix(entry.name).lower() in wanted:
+                names.add(entry.name)
+    return names
+
+
+class InotifySource:
+    """Linux inotify 事件源，只监视一个目录的顶层"""
+
+    def __init__(self, folder: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 失败: {os.strerror(err)}")
+        if libc.inotify_add_watch(fd, os.fsencode(str(folder)), WATCH_MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, f"inotify_add_watch 失败: {os.strerror(err)}")
+        self._fd = fd
+
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        """
+        等待最多 timeout 秒，返回期间新建、移入、写完、删除或移走的文件名。
+        返回 None 表示内核事件队列溢出、有事件丢失，调用方需重新列出目录。
+        """
+        names: Set[str] = set()
+        ready, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if not ready:
+            return names
+        overflowed = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                elif name and not mask & IN_ISDIR:
+                    names.add(os.fsdecode(name))
+        return None if overflowed else names
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollSource:
+    """
+    轮询事件源：每次只 stat 目录本身，mtime 变化 (或距今不足 RACY_WINDOW 秒) 时才列出文件名，
+    与上次的快照求差得到新出现或消失的文件。
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        self._mtime_ns: Optional[int] = None
+        self._names: Set[str] = set()
+        self._changed()
+        self._names = list_names(folder)
+
+    def _changed(self) -> bool:
+        st = os.stat(self.folder)
+        racy = time.time() - st.st_mtime < RACY_WINDOW
+        changed = racy or st.st_mtime_ns != self._mtime_ns
+        self._mtime_ns = st.st_mtime_ns
+        return changed
+
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        time.sleep(max(timeout, 0))
+        if not self._changed():
+            return set()
+        names = list_names(self.folder)
+        changed = names ^ self._names
+        self._names = names
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def open_source(folder: Path, backend: str = 'auto'):
+    """backend: 'auto' (Linux 下优先 inotify)、'inotify' 或 'poll'"""
+    if backend not in ('auto', 'inotify', 'poll'):
+        raise ValueError(f"未知的监视方式: {backend!r}")
+    if backend != 'poll' and sys.platform.startswith('linux'):
+        try:
+            return InotifySource(folder)
+        except (OSError, AttributeError):
+            if backend == 'inotify':
+                raise
+    elif backend == 'inotify':
+        raise ValueError("inotify 仅在 Linux 下可用。")
+    return PollSource(folder)
+
+
+class FolderWatcher:
+    """
+    监视源目录，把写入完成的新文件分批交给 FileProcessor 处理。
+
+    参数含义与 FileProcessor / process_files 相同；settle 为判定写入完成所需的静止秒数，
+    debounce 为凑批的静默秒数，interval 为检查候选文件的间隔。
+    state_path 不为空时，每批结束后把下一个序号写入该 JSON 文件，重启后接着编号。
+    sort 决定批内的处理顺序；待处理的文件超过 max_batch 个时，按同一顺序先处理排在前面的文件。
+    include_existing=True 时启动时目录中已有的文件也会处理。
+    原地改名时，本程序改出的文件名不会被当作新文件再次处理。
+    """
+
+    def __init__(self, source_folder: str, output_folder: Optional[str], mode: str, config: Dict[str, Any],
+                 extensions: List[str], in_place: bool = False, stats: Optional[RunStats] = None,
+                 settle: float = 2.0, debounce: float = 2.0, interval: float = 1.0, max_batch: int = 500,
+                 backend: str = 'auto', state_path: Optional[str] = None, include_existing: bool = True,
+                 sort: str = DEFAULT_SORT):
+        if max_batch < 1:
+            raise ValueError("max_batch 必须是正整数。")
+        parse_sort(sort)
+        try:
+            # 参数错误在启动时立即报告，而不是等到第一批文件到达
+            compile_rules(rules_for_mode(mode, config), 1)
+        except KeyError as e:
+            raise ValueError(f"模式 {mode.upper()}: 缺少参数 {e}")
+        self.source_folder = Path(source_folder)
+        self.output_folder = output_folder
+        self.mode = mode
+        self.config = config
+        self.extensions = extensions
+        self.in_place = in_place
+        self.stats = stats if stats is not None else RunStats()
+        self.settle = settle
+        self.debounce = debounce
+        self.interval = interval
+        self.max_batch = max_batch
+        self.backend = backend
+        self.state_path = Path(state_path) if state_path else None
+        self.include_existing = include_existing
+        self.sort = sort
+
+        # 下一批第一个文件的序号偏移 (已分配的序号数) 与已处理的批数
+        self.next_index = 0
+        self.batches = 0
+        if self.state_path is not None and self.state_path.exists():
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.next_index = int(state.get('next_index', 0))
+            self.batches = int(state.get('batches', 0))
+
+        # 候选文件: 名字 -> (大小, mtime_ns, 开始静止的时刻)；大小为 -1 表示尚未 stat
+        self._candidates: Dict[str, Tuple[int, int, float]] = {}
+        # 已稳定、等待凑批的文件
+        self._pending: Dict[str, FileRecord] = {}
+        # 原地改名时本程序改出的文件: 名字 -> (大小, mtime)，改名不改变这两项，据此识别并忽略
+        self._handled: Dict[str, Tuple[int, float]] = {}
+        self._wanted = set(extensions) if extensions else None
+        # 输出目录的名字登记表 (跨批复用) 及其对应的目录 mtime；为 None 时下一批重新读取目录
+        self._registry: Optional[NameRegistry] = None
+        self._registry_mtime_ns: Optional[int] = None
+
+    def _add_candidates(self, names: Iterable[str], now: float) -> None:
+        """names 中可能有已被删除或移走的文件，stat 时自然被丢弃"""
+        for name in names:
+            if name in self._candidates or name in self._pending:
+                continue
+            if self._wanted is not None and split_suffix(name).lower() not in self._wanted:
+                continue
+            self._candidates[name] = (-1, -1, now)
+
+    def _check_candidates(self, now: float) -> int:
+        """stat 每个候选文件，把已静止 settle 秒的移入待处理集合，返回本次新稳定的文件数"""
+        ready = 0
+        self.stats.incr('stat_calls', len(self._candidates))
+        for name, (size, mtime_ns, since) in list(self._candidates.items()):
+            try:
+                st = os.stat(self.source_folder / name)
+            except OSError:
+                # 已被删除或移走 (例如写入程序先写临时名再改名)
+                del self._candidates[name]
+                self._handled.pop(name, None)
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                del self._candidates[name]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if signature != (size, mtime_ns):
+                self._candidates[name] = (st.st_size, st.st_mtime_ns, now)
+                continue
+            if now - since < self.settle:
+                continue
+            del self._candidates[name]
+            if self._handled.pop(name, None) == (st.st_size, st.st_mtime):
+                continue
+            self._pending[name] = FileRecord(name, split_suffix(name), st.st_size, st.st_mtime)
+            ready += 1
+        return ready
+
+    def run(self, log_func: LogFunc, cancel_event: threading.Event, workers: int = 1,
+            use_processes: bool = False, dry_run: bool = False, verify: bool = False,
+            batch_func: Optional[Callable[[int, int, int], None]] = None) -> int:
+        """
+        持续监视直到 cancel_event 被置位，返回成功处理的文件总数。
+        batch_func(批次号, 本批文件数, 本批成功数) 在每批处理完后调用。
+        取消时正在处理的一批会在当前文件完成后停止，尚未凑成批的文件留在源目录。
+        """
+        source = open_source(self.source_folder, self.backend)
+        kind = 'inotify' if isinstance(source, InotifySource) else '轮询'
+        log_func(message(f"👀 开始监视 {self.source_folder} ({kind})，文件静止 {self.settle:g} 秒后分批处理..."))
+        total_success = 0
+        try:
+            now = time.monotonic()
+            if self.include_existing:
+                self._add_candidates(sorted(list_names(self.source_folder, self.extensions)), now)
+            next_check = now
+            last_ready = now
+            while not cancel_event.is_set():
+                names = source.wait(max(next_check - time.monotonic(), 0))
+                now = time.monotonic()
+                if names is None:
+                    log_func(message("⚠️ 监视事件队列溢出，重新列出源目录。", 'warning'))
+                    names = list_names(self.source_folder, self.extensions)
+                    self._registry = None
+                elif self.in_place and self._registry is not None:
+                    self._sync_registry(names)
+                self._add_candidates(names, now)
+                if now < next_check:
+                    continue
+                next_check = now + self.interval
+
+                if self._check_candidates(now):
+                    last_ready = now
+                if self._pending and (now - last_ready >= self.debounce or len(self._pending) >= self.max_batch):
+                    total_success += self._run_batch(log_func, cancel_event, workers, use_processes, dry_run,
+                                                     verify, batch_func)
+                    last_ready = time.monotonic()
+        finally:
+            source.close()
+        if self._pending or self._candidates:
+            log_func(message(f"⏹️ 监视已停止：{len(self._pending) + len(self._candidates)} 个文件尚未处理。",
+                             'warning'))
+        return total_success
+
+    def _sync_registry(self, names: Iterable[str]) -> None:
+        """原地改名：按事件涉及的文件名 (新到达的文件、本程序改名前后的名字) 增量更新登记表"""
+        for name in names:
+            self.stats.incr('stat_calls')
+            if os.path.lexists(self.source_folder / name):
+                self._registry.add(name)
+            else:
+                self._registry.discard(name)
+
+    def _output_registry(self) -> NameRegistry:
+        """
+        跨批复用的输出目录登记表。原地改名时由事件增量更新；
+        否则输出目录的 mtime 与上一批结束时不同 (被外部修改) 才重新读取目录。
+        """
+        folder = self.source_folder if self.in_place else Path(self.output_folder)
+        if not self.in_place:
+            mtime_ns = self._folder_mtime_ns(folder)
+            if mtime_ns != self._registry_mtime_ns:
+                self._registry = None
+        if self._registry is None:
+            self._registry = NameRegistry(folder)
+        return self._registry
+
+    def _folder_mtime_ns(self, folder: Path) -> Optional[int]:
+        self.stats.incr('stat_calls')
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run_batch(self, log_func: LogFunc, cancel_event: threading.Event, workers: int,
+                   use_processes: bool, dry_run: bool, verify: bool,
+                   batch_func: Optional[Callable[[int, int, int], None]]) -> int:
+        records = list(self._pending.values())
+        if len(records) > self.max_batch:
+            keys, descending = compute_keys(self.sort, [r.name for r in records], [r.size for r in records],
+                                            [r.mtime for r in records])
+            records = [records[i] for i in top_order(keys, self.max_batch, descending)]
+        for record in records:
+            del self._pending[record.name]
+        table = FileTable.from_records(records, self.sort)
+        self.batches += 1
+        log_func(message(f"📥 第 {self.batches} 批: {len(table)} 个文件。"))
+
+        processor = FileProcessor(str(self.source_folder), self.output_folder, self.extensions,
+                                  stats=self.stats, in_place=self.in_place, files=table, sort=self.sort,
+                                  registry=self._output_registry())
+        # 序号接着上一批继续编号
+        config = continue_sequence(self.mode, self.config, self.next_index)
+        # 已有结果 (无论成败) 的文件在本批中的序号
+        finished: Set[int] = set()
+
+        def batch_log(record: LogRecord) -> None:
+            if record.index >= 0 and record.event != 'stage':
+                finished.add(record.index)
+            if (self.in_place and not record.dry_run and record.new_name
+                    and record.event in ('rename', 'archive', 'duplicate_tag')):
+                original = table[record.index]
+                self._handled[record.new_name] = (original.size, original.mtime)
+            log_func(record)
+
+        try:
+            plan = processor.plan(self.mode, config)
+        except ValueError as e:
+            log_func(message(f"❌ {e}", 'error'))
+            return 0
+        success = processor.execute(plan, batch_log, workers=workers, use_processes=use_processes,
+                                    dry_run=dry_run, cancel_event=cancel_event, verify=verify)
+        if not self.in_place:
+            self._registry_mtime_ns = self._folder_mtime_ns(Path(self.output_folder))
+        if len(finished) < len(table):
+            # 取消时尚未处理的文件放回待处理集合 (计入停止时的提示，重启监视后仍会处理)
+            for index in range(len(table)):
+                if index not in finished:
+                    record = table[index]
+                    self._pending[record.name] = record
+        # 序号按本批已用到的最大位置前移；未处理的文件以后使用新的序号，不会与已分配的重复
+        self.next_index += max(finished) + 1 if finished else 0
+        if self.state_path is not None and not dry_run:
+            self._save_state()
+        if batch_func is not None:
+            batch_func(self.batches, len(table), success)
+        return success
+
+    def _save_state(self) -> None:
+        tmp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': str(self.source_folder), 'next_index': self.next_index,
+                       'batches': self.batches}, f)
+        os.replace(tmp_path, self.state_path)
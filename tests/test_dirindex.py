@@ -0,0 +1,54 @@
+# tests/test_dirindex.py
+
+import os
+
+import pytest
+
+import src.dirindex as dirindex_module
+from src.dirindex import DirectoryIndex
+from src.filetable import FileTable
+from src.processor import FileProcessor
+from src.stats import RunStats
+
+NAMES = ['a.txt', 'B.JPG', 'noext', '.bashrc', 'c.tar.gz', 'é.Txt', os.fsdecode(b'bad\xff.jpg')]
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    # 刚创建的目录处于 racy 窗口内，测试中关闭该判定以便命中缓存
+    monkeypatch.setattr(dirindex_module, 'RACY_WINDOW', 0.0)
+    for rel_dir in ('', 'sub', os.path.join('sub', 'deep')):
+        (tmp_path / rel_dir).mkdir(exist_ok=True)
+        for size, name in enumerate(NAMES):
+            (tmp_path / rel_dir / name).write_bytes(b'x' * size)
+    return tmp_path
+
+
+@pytest.mark.parametrize('extensions', [None, ['.txt'], ['.jpg', '.txt', '.gz'], ['.zip']])
+@pytest.mark.parametrize('recursive', [False, True])
+def test_index_table_matches_scan(tree, extensions, recursive):
+    index = DirectoryIndex(None)
+    expected = list(FileTable.scan(tree, extensions, recursive=recursive, sort='-size'))
+    listed = FileTable.scan(tree, extensions, recursive=recursive, sort='-size', index=index)
+    cached = FileTable.scan(tree, extensions, recursive=recursive, sort='-size', index=index)
+    assert list(listed) == list(cached) == expected
+    # 刚列出的目录已经 stat 过；取自缓存的行需要重新 stat
+    assert not listed.stale_stats
+    assert cached.stale_stats == bool(expected)
+
+
+def test_index_hit_restats_only_cached_rows(tree):
+    index = DirectoryIndex(None)
+    output = tree.parent / 'out'
+    stats = RunStats()
+    list(FileProcessor(str(tree), str(output), [], stats=stats, index=index).plan('b', {'type': 'size'}))
+    # 源目录: 目录 stat 两次 + 每个文件一次，不再为按大小命名重复 stat
+    assert stats.counters['stat_calls'] == len(NAMES) + 2
+
+    # 缓存命中后文件被追加写入：按大小命名使用当前大小
+    with open(tree / 'a.txt', 'ab') as f:
+        f.write(b'x' * 5000)
+    stats = RunStats()
+    plan = list(FileProcessor(str(tree), str(output), [], stats=stats, index=index).plan('b', {'type': 'size'}))
+    assert stats.counters['stat_calls'] == len(NAMES) + 1
+    assert {op.source.name: op.destination.name for op in plan}['a.txt'] == '4.88KB.txt'
@@ -0,0 +1,105 @@
+# tests/test_inplace.py
+
+import os
+from pathlib import Path
+
+import pytest
+
+import src.journal as journal_module
+import src.processor as processor_module
+from src.inplace import TempNamer, schedule_renames
+from src.journal import JobJournal, load_journal, undo_journal
+from src.processor import FileProcessor, RenameOp
+
+
+def _contents(folder: Path) -> dict:
+    return {name: (folder / name).read_text() for name in os.listdir(folder)}
+
+
+def _write(folder: Path, files: dict) -> Path:
+    """在 folder 下建立 files 子目录并写入文件，任务日志放在 folder 中"""
+    folder = folder / 'files'
+    folder.mkdir()
+    for name, text in files.items():
+        (folder / name).write_text(text)
+    return folder
+
+
+def _crash_on_call(monkeypatch, module, name: str, call: int) -> None:
+    """第 call 次调用 module.name 时模拟进程中断"""
+    real = getattr(module, name)
+    calls = [0]
+
+    def crashing(*args):
+        calls[0] += 1
+        if calls[0] == call:
+            raise KeyboardInterrupt
+        return real(*args)
+
+    monkeypatch.setattr(module, name, crashing)
+
+
+def _run_in_place(folder: Path, journal_path: Path, renames) -> None:
+    plan = [RenameOp(folder / src, folder / dst, 'rename') for src, dst in renames]
+    header = {'source': str(folder), 'output': str(folder), 'mode': 'a', 'config': {}, 'in_place': True}
+    with JobJournal(journal_path) as journal:
+        journal.write_plan(header, plan)
+        FileProcessor(str(folder), None, [], in_place=True).execute(plan, lambda record: None, journal=journal)
+
+
+def test_schedule_chain_starts_at_free_end(tmp_path):
+    a, b, c = tmp_path / 'a', tmp_path / 'b', tmp_path / 'c'
+    groups = schedule_renames([(0, a, b), (1, b, c)], TempNamer())
+    assert [[(step.source, step.destination) for step in group] for group in groups] == [[(b, c), (a, b)]]
+
+
+def test_schedule_swap_uses_one_temp_name(tmp_path):
+    a, b = tmp_path / 'a', tmp_path / 'b'
+    (groups,) = schedule_renames([(0, a, b), (1, b, a)], TempNamer([a, b]))
+    assert [step.final for step in groups] == [False, True, True]
+    temp = groups[0].destination
+    assert temp not in (a, b)
+    assert [(step.source, step.destination) for step in groups] == [(a, temp), (b, a), (temp, b)]
+
+
+def test_in_place_swap_and_chain(tmp_path):
+    folder = _write(tmp_path, {'x': 'X', 'y': 'Y', 'a': 'A', 'b': 'B'})
+    _run_in_place(folder, tmp_path / 'job.jsonl', [('x', 'y'), ('y', 'x'), ('a', 'b'), ('b', 'c')])
+    assert _contents(folder) == {'x': 'Y', 'y': 'X', 'b': 'A', 'c': 'B'}
+
+
+def test_undo_after_crash_in_cycle(tmp_path, monkeypatch):
+    # 互换进行到一半中断：一个文件停留在临时名上
+    folder = _write(tmp_path, {'x': 'X', 'y': 'Y'})
+    journal_path = tmp_path / 'job.jsonl'
+    _crash_on_call(monkeypatch, processor_module, 'move_file', 2)
+    with pytest.raises(KeyboardInterrupt):
+        _run_in_place(folder, journal_path, [('x', 'y'), ('y', 'x')])
+    monkeypatch.undo()
+    assert load_journal(journal_path).staged
+
+    undo_journal(journal_path, lambda record: None)
+    assert _contents(folder) == {'x': 'X', 'y': 'Y'}
+    state = load_journal(journal_path)
+    assert not state.done and not state.staged
+    assert undo_journal(journal_path, lambda record: None) == 0
+    assert _contents(folder) == {'x': 'X', 'y': 'Y'}
+
+
+def test_undo_interrupted_then_repeated(tmp_path, monkeypatch):
+    # 撤销互换时中断：再次撤销从临时名继续，第三次撤销无事可做
+    folder = _write(tmp_path, {'x': 'X', 'y': 'Y'})
+    journal_path = tmp_path / 'job.jsonl'
+    _run_in_place(folder, journal_path, [('x', 'y'), ('y', 'x')])
+    assert _contents(folder) == {'x': 'Y', 'y': 'X'}
+
+    _crash_on_call(monkeypatch, journal_module, 'atomic_move', 2)
+    with pytest.raises(KeyboardInterrupt):
+        undo_journal(journal_path, lambda record: None)
+    monkeypatch.undo()
+    assert load_journal(journal_path).staged
+
+    assert undo_journal(journal_path, lambda record: None) == 2
+    assert _contents(folder) == {'x': 'X', 'y': 'Y'}
+    assert undo_journal(journal_path, lambda record: None) == 0
+    assert _contents(folder) == {'x': 'X', 'y': 'Y'}
@@ -0,0 +1,106 @@
+# tests/test_journal.py
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from src.cli import main
+from src.journal import iter_ops, load_journal, undo_journal
+from src.processor import FileProcessor
+
+# 10 个文件：前进、截掉末尾几条完成记录 (模拟批量 fsync 前崩溃)、续跑、撤销
+
+FILE_COUNT = 10
+LOST_RECORDS = 4
+
+
+def _make_files(folder: Path) -> None:
+    folder.mkdir(parents=True)
+    for i in range(FILE_COUNT):
+        (folder / f"f{i}.txt").write_text(str(i))
+
+
+def _drop_done_records(journal_path: Path, count: int) -> None:
+    """删除最后 count 条完成记录：文件已经移动，但日志里没有记下"""
+    lines = journal_path.read_text(encoding='utf-8').splitlines(True)
+    done_lines = [n for n, line in enumerate(lines) if '"type":"done"' in line]
+    dropped = set(done_lines[-count:])
+    journal_path.write_text(''.join(line for n, line in enumerate(lines) if n not in dropped), encoding='utf-8')
+
+
+def _contents(folder: Path) -> dict:
+    return {name: (folder / name).read_text() for name in os.listdir(folder)}
+
+
+@pytest.mark.parametrize('in_place', [False, True])
+def test_resume_after_lost_done_records(tmp_path, in_place):
+    source = tmp_path / 'src'
+    output = source if in_place else tmp_path / 'out'
+    journal_path = tmp_path / 'job.jsonl'
+    _make_files(source)
+    original = _contents(source)
+    if in_place:
+        mode, config = 'rules', {'rules': [{'type': 'affix', 'prefix': 'x_'}]}
+    else:
+        mode, config = 'b', {'type': 'sequence', 'start_num': 1}
+    logs = []
+
+    processor = FileProcessor(str(source), str(output), [], in_place=in_place)
+    assert processor.process_files(mode, config, logs.append, journal_path=str(journal_path)) == FILE_COUNT
+    after_first_run = _contents(output)
+    _drop_done_records(journal_path, LOST_RECORDS)
+    # 最后一个文件模拟在建立硬链接之后、删除源文件之前中断
+    last_op = list(iter_ops(journal_path))[-1]
+    os.link(output / last_op['dst'], source / last_op['src'])
+    assert len(load_journal(journal_path).done) == FILE_COUNT - LOST_RECORDS
+
+    # 续跑时已移动的文件不能被当作失败 (源文件不存在)，而是补记完成记录
+    processor = FileProcessor(str(source), str(output), [], in_place=in_place)
+    processor.process_files(mode, config, logs.append, journal_path=str(journal_path))
+    assert not [record for record in logs if record.level == 'error']
+    assert len(load_journal(journal_path).done) == FILE_COUNT
+    assert _contents(output) == after_first_run
+
+    # 补记之后，撤销能找回全部文件；再次撤销无事可做
+    assert undo_journal(journal_path, logs.append) == FILE_COUNT
+    assert _contents(source) == original
+    assert undo_journal(journal_path, logs.append) == 0
+
+
+@pytest.mark.parametrize('in_place', [False, True])
+def test_dry_run_skips_done_entries(tmp_path, in_place):
+    source = tmp_path / 'src'
+    output = source if in_place else tmp_path / 'out'
+    journal_path = tmp_path / 'job.jsonl'
+    _make_files(source)
+    mode, config = 'rules', {'rules': [{'type': 'affix', 'prefix': 'x_'}]}
+    processor = FileProcessor(str(source), str(output), [], in_place=in_place)
+    assert processor.process_files(mode, config, lambda record: None, journal_path=str(journal_path)) == FILE_COUNT
+    after_first_run = _contents(output)
+
+    # 对已完成的日志预演：日志中已完成的文件被跳过，不能因源文件已不存在而报错
+    logs = []
+    processor = FileProcessor(str(source), str(output), [], in_place=in_place)
+    assert processor.process_files(mode, config, logs.append, journal_path=str(journal_path), dry_run=True) == 0
+    assert not [record for record in logs if record.level == 'error']
+    assert _contents(output) == after_first_run
+
+
+def test_cli_resume_counts_done_entries(tmp_path, capsys):
+    source = tmp_path / 'src'
+    journal_path = tmp_path / 'job.jsonl'
+    _make_files(source)
+    argv = [str(source), '--in-place', '--mode', 'a', '--target', 'f', '--replace', 'g',
+            '--journal', str(journal_path), '--jsonl']
+    assert main(['run'] + argv) == 0
+    _drop_done_records(journal_path, LOST_RECORDS)
+    capsys.readouterr()
+
+    # 续跑已完成的任务：日志中已完成的文件计为成功，退出码为 0
+    assert main(['run'] + argv) == 0
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    done = [event for event in events if event['event'] == 'done'][-1]
+    assert done['success'] == done['total'] == FILE_COUNT
+    assert done['resumed'] == FILE_COUNT - LOST_RECORDS
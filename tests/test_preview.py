@@ -0,0 +1,47 @@
+# tests/test_preview.py
+
+import os
+from pathlib import Path
+
+import pytest
+
+from src import preview
+from src.preview import SORTING_PLACEHOLDER, PreviewModel
+from src.processor import FileProcessor
+
+TOP_N = 5
+CONFIG = {'type': 'sequence', 'start_num': 1}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    # 各子目录中文件同名，大小与修改时间大量重复：并列时按子目录与文件名区分，降序时子目录顺序同样反转
+    source = tmp_path / 'src'
+    for folder in (source, source / 'sub', source / 'sub' / 'deep'):
+        folder.mkdir(parents=True)
+        for i in range(12):
+            path = folder / f'img{(i * 7) % 12}.jpg'
+            path.write_bytes(b'x' * (i % 4))
+            os.utime(path, (1e9 + i % 3, 1e9 + i % 3))
+    return source
+
+
+@pytest.mark.parametrize('sort', ['name', '-name', 'natural', '-natural', 'size', '-size', 'mtime', '-mtime'])
+def test_top_rows_match_full_sort(tree, monkeypatch, sort):
+    # 调小阈值，让 36 个文件也走"先选出前 TOP_N 行、完整排序留给后台"的路径
+    monkeypatch.setattr(preview, 'TOP_N_MIN', TOP_N)
+    monkeypatch.setattr(preview, 'TOP_N_FULL_RATIO', 1)
+    output = tree.parent / 'out'
+    plan = FileProcessor(str(tree), str(output), [], recursive=True, sort=sort).plan('b', CONFIG)
+    expected = [(i + 1, os.path.relpath(op.source, tree), os.path.relpath(op.destination, output))
+                for i, op in enumerate(plan)]
+
+    model = PreviewModel(str(tree), [], recursive=True, sort=sort)
+    model.configure('b', CONFIG)
+    assert not model.sorted
+    assert model.rows(0, TOP_N) == expected[:TOP_N]
+    assert model.rows(TOP_N, TOP_N + 1) == [(TOP_N + 1, SORTING_PLACEHOLDER, '')]
+
+    model.sort_all()
+    assert model.sorted
+    assert model.rows(0, len(model)) == expected
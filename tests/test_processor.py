@@ -0,0 +1,60 @@
+# tests/test_processor.py
+
+import os
+from pathlib import Path
+
+import pytest
+
+from src.processor import FileProcessor
+
+# 大小写不同的名字在模式 A 下映射到同一目标，输出目录中已有同名文件：两者都要分配冲突后缀
+NAMES = ['IMG_1.txt', 'img_1.TXT', 'IMG_2.txt', 'photo.txt', 'IMG_3.jpg', 'note.md', 'IMG_10.txt', 'img_2.txt']
+CONFIG = {'target': 'img', 'replace': 'pic', 'scope': '1'}
+
+
+def _make_tree(root: Path) -> Path:
+    source = root / 'src'
+    for folder in (source, source / 'sub'):
+        folder.mkdir(parents=True)
+        for i, name in enumerate(NAMES):
+            (folder / name).write_text(f'{folder.name}{i}' * (i + 1))
+    output = root / 'out'
+    (output / 'sub').mkdir(parents=True)
+    (output / 'pic_1.txt').write_text('existing')
+    (output / 'sub' / 'pic_2.txt').write_text('existing')
+    return source
+
+
+def _tree(folder: Path) -> dict:
+    return {os.path.relpath(os.path.join(parent, name), folder): Path(parent, name).read_text()
+            for parent, _, names in os.walk(folder) for name in names}
+
+
+@pytest.mark.parametrize('workers, use_processes', [(4, False), (3, True)])
+def test_parallel_run_matches_serial(tmp_path, workers, use_processes):
+    results = []
+    for run, options in (('serial', {}), ('parallel', dict(workers=workers, use_processes=use_processes))):
+        source = _make_tree(tmp_path / run)
+        processor = FileProcessor(str(source), str(tmp_path / run / 'out'), [], recursive=True, sort='-size')
+        plan = [(op.source.name, op.destination and op.destination.name, op.reason)
+                for op in processor.plan('a', CONFIG)]
+        logs = []
+        assert processor.process_files('a', CONFIG, logs.append, **options) == len(NAMES) * 2
+        records = [(record.index, record.event, record.old_name, record.new_name) for record in logs
+                   if record.index >= 0]
+        results.append((plan, records, _tree(tmp_path / run / 'out')))
+    assert results[0] == results[1]
+
+
+def test_streaming_plan_matches_batch_plan(tmp_path):
+    source = _make_tree(tmp_path)
+    for mode, config in (('a', CONFIG), ('b', {'type': 'sequence', 'start_num': 7}), ('b', {'type': 'size'})):
+        processor = FileProcessor(str(source), str(tmp_path / 'out'), [], recursive=True, sort='name')
+        batch = processor.plan(mode, config)
+        assert list(processor.iter_plan(mode, config)) == batch
+
+    # 流式执行按计划顺序逐个移动，得到的文件名与完整计划一致
+    logs = []
+    processor.process_files(mode, config, logs.append)
+    moved = [(record.index, record.new_name) for record in logs if record.index >= 0]
+    assert moved == [(i, os.path.relpath(op.destination, tmp_path / 'out')) for i, op in enumerate(batch)]
@@ -0,0 +1,97 @@
+# tests/test_rules.py
+
+import os
+from pathlib import Path
+
+import pytest
+
+from src.processor import FileProcessor
+from src.rules import compile_rules, rules_for_mode
+from src.scanner import FileRecord, split_suffix
+from src.utils import case_insensitive_replace, format_size
+
+
+def _record(name: str, suffix: str) -> FileRecord:
+    return FileRecord(name, suffix, 0, 0.0)
+
+
+@pytest.mark.parametrize('rule, name, suffix', [
+    ({'type': 'affix', 'prefix': '../'}, 'a.txt', '.txt'),
+    ({'type': 'affix', 'suffix': '/x'}, 'a.txt', '.txt'),
+    ({'type': 'regex', 'pattern': '.*', 'replace': '', 'count': 'first'}, 'a.txt', '.txt'),
+    ({'type': 'regex', 'pattern': '^a$', 'replace': '..'}, 'a', ''),
+    ({'type': 'regex', 'pattern': '^a$', 'replace': '.'}, 'a', ''),
+])
+def test_invalid_names_are_rejected(rule, name, suffix):
+    build_name = compile_rules([rule], 1)
+    with pytest.raises(ValueError):
+        build_name(_record(name, suffix), 0)
+
+
+def test_invalid_name_is_a_per_file_error(tmp_path):
+    source = tmp_path / 'src'
+    output = tmp_path / 'out'
+    source.mkdir()
+    (source / 'a.txt').write_text('a')
+    (source / 'b.txt').write_text('b')
+    processor = FileProcessor(str(source), str(output), [])
+    # 只有 a 的主体被正则清空
+    plan = list(processor.plan('rules', {'rules': [{'type': 'regex', 'pattern': '^a$', 'replace': ''}]}))
+    assert [(op.source.name, op.reason) for op in plan] == [('a.txt', 'error'), ('b.txt', 'archive')]
+
+    # 前缀含路径分隔符：文件不能被移出输出目录
+    logs = []
+    moved = processor.process_files('rules', {'rules': [{'type': 'affix', 'prefix': '../'}]}, logs.append)
+    assert moved == 0
+    assert sorted(os.listdir(source)) == ['a.txt', 'b.txt']
+    assert not (tmp_path / 'a.txt').exists()
+    assert len([record for record in logs if record.level == 'error']) == 2
+
+
+@pytest.mark.parametrize('rule', [
+    {'type': 'replace', 'target': 'a', 'replace': 'b'},
+    {'type': 'regex', 'pattern': 'a', 'replace': 'b'},
+])
+def test_replace_and_regex_share_count_default(rule):
+    record = _record('aaa.txt', '.txt')
+    assert compile_rules([rule], 1)(record, 0) == 'baa.txt'
+    assert compile_rules([dict(rule, count='all')], 1)(record, 0) == 'bbb.txt'
+
+
+# 编译后的规则链必须与旧版模式 A/B 逐个文件拼接名字的结果完全一致
+LEGACY_NAMES = ['IMG_001.JPG', 'img.img.jpg', 'a.tar.gz', '.bashrc', 'name.', 'x.IMG', 'no_match.txt',
+                'Img (1).png', '报告_img.docx']
+SIZES = [0, 1023, 1024, 1536, 1024 * 1024 - 1, 5 * 1024 * 1024, 7, 123456789, 2048]
+
+
+def _legacy_name(mode: str, config: dict, path: Path, size: int, index: int, total: int) -> str:
+    """旧版 process_files 中的命名逻辑"""
+    stem, suffix = path.stem, path.suffix
+    if mode == 'a':
+        new_stem, new_suffix = stem, suffix
+        if config['scope'] in ['1', '3']:
+            new_stem = case_insensitive_replace(stem, config['target'], config['replace'])
+        if config['scope'] in ['2', '3']:
+            new_suffix = case_insensitive_replace(suffix, config['target'], config['replace'])
+        return f"{new_stem}{new_suffix}"
+    if config['type'] == 'size':
+        return f"{format_size(size)}{suffix}"
+    start_num = config.get('start_num', 1)
+    padding = len(str(total + start_num - 1))
+    return f"{str(start_num + index).zfill(padding)}_{stem}{suffix}"
+
+
+@pytest.mark.parametrize('mode, config', [
+    ('a', {'target': 'img', 'replace': 'pic', 'scope': '1'}),
+    ('a', {'target': 'IMG', 'replace': '', 'scope': '2'}),
+    ('a', {'target': '.', 'replace': r'\1', 'scope': '3'}),
+    ('b', {'type': 'size'}),
+    ('b', {'type': 'sequence', 'start_num': 1}),
+    ('b', {'type': 'sequence', 'start_num': 95}),
+])
+def test_compiled_pipeline_matches_legacy_modes(mode, config):
+    total = len(LEGACY_NAMES)
+    build_name = compile_rules(rules_for_mode(mode, config), total)
+    for index, (name, size) in enumerate(zip(LEGACY_NAMES, SIZES)):
+        record = FileRecord(name, split_suffix(name), size, 0.0)
+        assert build_name(record, index) == _legacy_name(mode, config, Path(name), size, index, total)
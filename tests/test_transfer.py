@@ -0,0 +1,30 @@
+# tests/test_transfer.py
+
+import errno
+import os
+
+from src import transfer
+
+
+def test_cached_devices_need_no_stat(tmp_path):
+    src = tmp_path / 'a.txt'
+    src.write_text('a')
+    dev = os.stat(tmp_path).st_dev
+    result = transfer.transfer_file(src, tmp_path / 'b.txt', dst_dev=dev, src_dev=dev)
+    assert result == transfer.TransferResult('rename', 0, 0)
+    assert (tmp_path / 'b.txt').read_text() == 'a' and not src.exists()
+
+
+def test_other_mount_falls_back_to_copy(tmp_path, monkeypatch):
+    # 源目录下的文件实际位于另一挂载点：按缓存的设备号改名会因 EXDEV 失败，改为复制
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(transfer, 'atomic_move', cross_device)
+    monkeypatch.setattr(transfer.os, 'rename', cross_device)
+    src = tmp_path / 'a.txt'
+    src.write_text('a')
+    dev = os.stat(tmp_path).st_dev
+    result = transfer.transfer_file(src, tmp_path / 'b.txt', verify=True, dst_dev=dev, src_dev=dev)
+    assert result.method == 'copy'
+    assert (tmp_path / 'b.txt').read_text() == 'a' and not src.exists()
@@ -0,0 +1,63 @@
+# tests/test_utils.py
+
+import os
+
+import pytest
+
+from src.utils import atomic_move, finish_interrupted_move
+
+
+def test_atomic_move_missing_source_leaves_no_placeholder(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        atomic_move(tmp_path / 'missing.txt', tmp_path / 'dst.txt')
+    assert os.listdir(tmp_path) == []
+
+
+def test_atomic_move_refuses_to_overwrite(tmp_path):
+    (tmp_path / 'a.txt').write_text('a')
+    (tmp_path / 'b.txt').write_text('b')
+    with pytest.raises(FileExistsError):
+        atomic_move(tmp_path / 'a.txt', tmp_path / 'b.txt')
+    assert (tmp_path / 'a.txt').read_text() == 'a'
+    assert (tmp_path / 'b.txt').read_text() == 'b'
+
+
+def test_atomic_move_same_entry_keeps_file(tmp_path):
+    # 同一个目录项的两种写法：不能把唯一的一份当作多余的硬链接删除
+    folder = tmp_path / 'd'
+    folder.mkdir()
+    (folder / 'x.txt').write_text('x')
+    atomic_move(folder / '.' / 'x.txt', folder / 'x.txt')
+    assert (folder / 'x.txt').read_text() == 'x'
+
+
+def test_atomic_move_keeps_existing_hard_link(tmp_path):
+    # 目标是同一文件的另一个硬链接 (例如用户自己建立的)：不能当作上次中断的移动删除源文件
+    (tmp_path / 'a.txt').write_text('a')
+    os.link(tmp_path / 'a.txt', tmp_path / 'b.txt')
+    with pytest.raises(FileExistsError):
+        atomic_move(tmp_path / 'a.txt', tmp_path / 'b.txt')
+    assert sorted(os.listdir(tmp_path)) == ['a.txt', 'b.txt']
+
+
+def test_atomic_move_symlink_onto_its_target(tmp_path):
+    # samefile 会跟随符号链接；按 lstat 比较时二者不同，不能把链接改名到真实文件上
+    (tmp_path / 'real.txt').write_text('data')
+    os.symlink('real.txt', tmp_path / 'link.txt')
+    with pytest.raises(FileExistsError):
+        atomic_move(tmp_path / 'link.txt', tmp_path / 'real.txt')
+    assert (tmp_path / 'real.txt').read_text() == 'data'
+    assert not (tmp_path / 'real.txt').is_symlink()
+
+
+def test_finish_interrupted_move(tmp_path):
+    # 上次在建立硬链接之后、删除源文件之前中断
+    (tmp_path / 'a.txt').write_text('a')
+    os.link(tmp_path / 'a.txt', tmp_path / 'b.txt')
+    assert finish_interrupted_move(tmp_path / 'a.txt', tmp_path / 'b.txt')
+    assert os.listdir(tmp_path) == ['b.txt']
+    assert (tmp_path / 'b.txt').read_text() == 'a'
+
+    (tmp_path / 'c.txt').write_text('c')
+    assert not finish_interrupted_move(tmp_path / 'c.txt', tmp_path / 'b.txt')
+    assert (tmp_path / 'c.txt').read_text() == 'c'